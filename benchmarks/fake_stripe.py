@@ -0,0 +1,374 @@
+import argparse
+import bisect
+import itertools
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlparse
+
+
+# Local stand-in for the parts of the Stripe API the populator uses. Objects
+# are kept in memory, lists support created[gte]/created[lt], starting_after
+# and limit (newest first, like Stripe), and every request can be delayed,
+# throttled with a 429 or failed with a 500. Advanced test clocks stay
+# "advancing" for a while, but nothing is billed.
+
+OBJECT_NAMES = {
+    "customers": "customer",
+    "payment_methods": "payment_method",
+    "products": "product",
+    "prices": "price",
+    "tax_rates": "tax_rate",
+    "subscriptions": "subscription",
+    "subscription_schedules": "subscription_schedule",
+    "events": "event",
+    "test_clocks": "test_helpers.test_clock",
+}
+
+
+# ID prefixes that aren't the first three letters of the kind
+ID_PREFIXES = {"payment_methods": "pm", "test_clocks": "clock"}
+
+
+def parse_latency(spec):
+    # "fixed:SECONDS", "uniform:LOW:HIGH" or "lognormal:MEDIAN:SIGMA"
+    kind, _, values = spec.partition(":")
+    values = [float(value) for value in values.split(":") if value]
+    
+    if kind == "fixed" and len(values) == 1:
+        return lambda rng: values[0]
+    if kind == "uniform" and len(values) == 2:
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "lognormal" and len(values) == 2:
+        return lambda rng: values[0] * rng.lognormvariate(0, values[1])
+    raise ValueError(f"Invalid latency {spec!r}, expected fixed:S, uniform:LOW:HIGH or lognormal:MEDIAN:SIGMA")
+
+
+def parse_form(body):
+    # Stripe's form encoding, e.g. items[0][price]=price_1, into nested
+    # dicts (lists stay dicts keyed by index, which is enough here)
+    params = {}
+    for key, value in parse_qsl(body, keep_blank_values=True):
+        parts = key.replace("]", "").split("[")
+        target = params
+        for part in parts[:-1]:
+            target = target.setdefault(part, {})
+        target[parts[-1]] = value
+    return params
+
+
+class FakeStripe:
+
+    def __init__(self, latency="fixed:0", rate_limit_rate=0.0, error_rate=0.0, seed_customers=0, seed_prices=0, seed=1,
+                 clock_advance_seconds=0.5):
+        self.latency = parse_latency(latency)
+        self.rate_limit_rate = rate_limit_rate
+        self.error_rate = error_rate
+        self.clock_advance_seconds = clock_advance_seconds
+        self.counts = {}
+        self._clocks_ready_at = {}
+        
+        self._objects = {}
+        self._lists = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+        
+        # Seeded objects are spread over the last five years, most of them
+        # recent, like a long-lived test account
+        now = int(time.time())
+        seeded = [
+            ("customers", {"id": f"cus_seed{i:09d}"}) for i in range(seed_customers)
+        ] + [
+            ("prices", self._price(f"price_seed{i:09d}", {"product": f"prod_seed{i:09d}"})) for i in range(seed_prices)
+        ]
+        for kind, obj in seeded:
+            obj["created"] = now - int(self._random.random() ** 3 * 86400 * 365 * 5)
+        for kind, obj in sorted(seeded, key=lambda item: item[1]["created"]):
+            self._add(kind, obj)
+    
+    def _new_id(self, prefix):
+        return f"{prefix}_{next(self._ids):08d}"
+    
+    def _add(self, kind, obj):
+        obj["object"] = OBJECT_NAMES.get(kind, kind)
+        obj.setdefault("created", int(time.time()))
+        obj.setdefault("metadata", {})
+        with self._lock:
+            objects, created = self._lists.setdefault(kind, ([], []))
+            # Objects are nearly always appended in created order
+            index = bisect.bisect_right(created, obj["created"])
+            objects.insert(index, obj)
+            created.insert(index, obj["created"])
+            self._objects[obj["id"]] = obj
+        return obj
+    
+    def _price(self, price_id, params):
+        recurring = params.get("recurring") or {"interval": "month", "interval_count": "1"}
+        return {
+            "id": price_id,
+            "product": params.get("product"),
+            "unit_amount": int(params.get("unit_amount", 1000)),
+            "currency": params.get("currency", "usd"),
+            "active": True,
+            "type": "recurring",
+            "recurring": {"interval": recurring.get("interval"), "interval_count": int(recurring.get("interval_count", 1))},
+            "tax_behavior": params.get("tax_behavior", "unspecified"),
+            "metadata": params.get("metadata") or {},
+        }
+    
+    def _subscription_items(self, items):
+        # The subscription's items as Stripe expands them, with their price.
+        # Form-encoded items arrive keyed by index.
+        return {
+            "object": "list",
+            "data": [
+                {"id": item.get("id") or self._new_id("si"), "object": "subscription_item", "price": self._objects.get(item.get("price"))}
+                for item in (items.values() if isinstance(items, dict) else items)
+            ],
+        }
+    
+    def list(self, kind, query):
+        limit = min(100, int(query.get("limit", 10)))
+        created = query.get("created") or {}
+        gte = int(created.get("gte", 0))
+        lt = int(created.get("lt", 1 << 40))
+        
+        with self._lock:
+            objects, created_values = self._lists.get(kind, ([], []))
+            start = bisect.bisect_left(created_values, gte)
+            end = bisect.bisect_left(created_values, lt)
+            
+            if query.get("starting_after") in self._objects:
+                after = self._objects[query["starting_after"]]
+                end = min(end, bisect.bisect_left(created_values, after["created"]))
+                # Objects created in the same second as the cursor and listed
+                # before it
+                same_second = bisect.bisect_right(created_values, after["created"])
+                tied = objects[end:same_second]
+                position = next((i for i, obj in enumerate(tied) if obj is after), len(tied))
+                end += position
+            
+            page = []
+            index = end - 1
+            while index >= start and len(page) < limit + 1:
+                obj = objects[index]
+                if not obj.get("deleted") and all(
+                    str(obj.get(key)).lower() == str(value).lower()
+                    for key, value in query.items()
+                    if key in ("active", "type", "customer", "status") and value != "all"
+                ):
+                    page.append(obj)
+                index -= 1
+        
+        return {"object": "list", "url": f"/v1/{kind}", "data": page[:limit], "has_more": len(page) > limit}
+    
+    def search(self, kind, query):
+        # Only metadata['KEY']:'VALUE' clauses joined by OR are understood,
+        # optionally narrowed by created>=N and created<N; anything else
+        # matches nothing. Results are not paginated.
+        clauses = re.findall(r"metadata\['([^']*)'\]:'([^']*)'", query.get("query", ""))
+        bounds = dict(re.findall(r"created(>=|<)(\d+)", query.get("query", "")))
+        gte = int(bounds.get(">=", 0))
+        lt = int(bounds.get("<", 1 << 40))
+        with self._lock:
+            objects, _ = self._lists.get(kind, ([], []))
+            data = [
+                obj for obj in reversed(objects)
+                if not obj.get("deleted") and gte <= obj["created"] < lt
+                and any(obj["metadata"].get(key) == value for key, value in clauses)
+            ]
+        return {"object": "search_result", "url": f"/v1/{kind}/search", "data": data, "has_more": False, "next_page": None}
+    
+    def handle(self, method, path, query, params):
+        parts = [part for part in path.split("/") if part][1:]
+        if parts and parts[0] == "test_helpers":
+            parts = parts[1:]
+        kind = parts[0] if parts else ""
+        
+        key = f"{method} {kind}" + ("/" + parts[2] if len(parts) > 2 else "")
+        with self._lock:
+            self.counts[key] = self.counts.get(key, 0) + 1
+        
+        if method == "GET" and parts == ["account"]:
+            return 200, {"object": "account", "id": "acct_fake"}
+        if method == "GET" and len(parts) == 2 and parts[1] == "search":
+            return 200, self.search(kind, query)
+        if method == "GET" and len(parts) == 1:
+            return 200, self.list(kind, query)
+        
+        if method == "POST" and kind == "payment_methods" and parts[2:] == ["attach"]:
+            # Attaching a test token (pm_card_visa) creates a new payment method
+            return 200, self._add("payment_methods", {"id": self._new_id("pm"), "customer": params.get("customer")})
+        
+        if len(parts) >= 2:
+            obj = self._objects.get(parts[1])
+            if obj is None:
+                return 404, {"error": {"type": "invalid_request_error", "code": "resource_missing", "message": f"No such object: '{parts[1]}'"}}
+            
+            if kind == "test_clocks" and self._clocks_ready_at.get(obj["id"], 0) <= time.time():
+                obj["status"] = "ready"
+            
+            if (method == "DELETE" and kind == "subscriptions") or parts[2:] == ["cancel"]:
+                obj["status"] = "canceled"
+            elif method == "POST" and parts[2:] == ["advance"]:
+                obj["frozen_time"] = int(params["frozen_time"])
+                obj["status"] = "advancing"
+                self._clocks_ready_at[obj["id"]] = time.time() + self.clock_advance_seconds
+            elif method == "DELETE" and kind == "test_clocks":
+                # Deleting a clock deletes its customers
+                with self._lock:
+                    for other in self._objects.values():
+                        if other.get("test_clock") == obj["id"]:
+                            other["deleted"] = True
+                obj["deleted"] = True
+                return 200, {"id": obj["id"], "object": obj["object"], "deleted": True}
+            elif method == "DELETE":
+                obj["deleted"] = True
+                return 200, {"id": obj["id"], "object": obj["object"], "deleted": True}
+            elif method == "POST" and kind == "subscriptions" and "items" in params:
+                obj.update({**params, "items": self._subscription_items(params["items"])})
+            elif method == "POST":
+                obj.update(params)
+            return 200, obj
+        
+        if method != "POST" or kind not in OBJECT_NAMES:
+            return 404, {"error": {"type": "invalid_request_error", "message": f"Unrecognized request URL ({method}: {path})"}}
+        
+        obj = {**params, "id": self._new_id(ID_PREFIXES.get(kind, kind[:3]))}
+        if kind == "customers":
+            if "payment_method" in params:
+                obj["invoice_settings"] = {"default_payment_method": self._new_id("pm")}
+        elif kind == "products":
+            obj["active"] = True
+            if "default_price_data" in params:
+                price = self._add("prices", self._price(self._new_id("pri"), {**params["default_price_data"], "product": obj["id"]}))
+                obj["default_price"] = price["id"]
+        elif kind == "prices":
+            obj = self._price(obj["id"], params)
+        elif kind == "tax_rates":
+            obj["inclusive"] = params.get("inclusive") == "true"
+            obj["active"] = True
+        elif kind == "subscriptions":
+            obj["items"] = self._subscription_items(params.get("items", []))
+            obj["schedule"] = None
+            if "trial_end" in params or "trial_period_days" in params:
+                obj["status"] = "trialing"
+            elif params.get("payment_behavior") == "default_incomplete":
+                obj["status"] = "incomplete"
+            else:
+                obj["status"] = "active"
+        elif kind == "subscription_schedules":
+            obj["status"] = "not_started"
+        elif kind == "test_clocks":
+            obj["frozen_time"] = int(params["frozen_time"])
+            obj["status"] = "ready"
+        return 200, self._add(kind, obj)
+    
+    def make_handler(self):
+        fake = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body are written separately; with Nagle's algorithm
+            # every response on a kept-alive connection would wait for the
+            # client's delayed ACK (about 40ms)
+            disable_nagle_algorithm = True
+            
+            def log_message(self, *args):
+                pass
+            
+            def send_json(self, status, body, headers=None):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.send_header("Request-Id", f"req_{fake._random.getrandbits(48):012x}")
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+            
+            def respond(self, method):
+                url = urlparse(self.path)
+                length = int(self.headers.get("Content-Length") or 0)
+                params = parse_form(self.rfile.read(length).decode()) if length else {}
+                
+                if url.path == "/_counts":
+                    return self.send_json(200, fake.counts)
+                
+                time.sleep(max(0.0, fake.latency(fake._random)))
+                
+                roll = fake._random.random()
+                if roll < fake.rate_limit_rate:
+                    return self.send_json(
+                        429,
+                        {"error": {"type": "invalid_request_error", "code": "rate_limit", "message": "Too many requests"}},
+                        {"Stripe-Should-Retry": "true"},
+                    )
+                if roll < fake.rate_limit_rate + fake.error_rate:
+                    return self.send_json(
+                        500,
+                        {"error": {"type": "api_error", "message": "Injected error"}},
+                        {"Stripe-Should-Retry": "true"},
+                    )
+                
+                status, body = fake.handle(method, url.path, parse_form(url.query), params)
+                self.send_json(status, body)
+            
+            def do_GET(self):
+                self.respond("GET")
+            
+            def do_POST(self):
+                self.respond("POST")
+            
+            def do_DELETE(self):
+                self.respond("DELETE")
+        
+        return Handler
+
+
+def make_server(port=0, **options):
+    # Returns (server, fake); the server is not started yet
+    fake = FakeStripe(**options)
+    server = ThreadingHTTPServer(("127.0.0.1", port), fake.make_handler())
+    server.daemon_threads = True
+    server.request_queue_size = 512
+    return server, fake
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Serve a local fake of the Stripe API for benchmarks.")
+    parser.add_argument("--port", type=int, default=12111)
+    parser.add_argument("--latency", default="lognormal:0.03:0.4", help="fixed:S, uniform:LOW:HIGH or lognormal:MEDIAN:SIGMA")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction of requests answered with a 429")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with a retryable 500")
+    parser.add_argument("--seed-customers", type=int, default=0, help="existing customers to start with")
+    parser.add_argument("--seed-prices", type=int, default=0, help="existing recurring prices to start with")
+    parser.add_argument("--clock-advance-seconds", type=float, default=0.5, help="how long an advanced test clock stays advancing")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    server, _ = make_server(
+        args.port,
+        latency=args.latency,
+        rate_limit_rate=args.rate_limit_rate,
+        error_rate=args.error_rate,
+        seed_customers=args.seed_customers,
+        seed_prices=args.seed_prices,
+        clock_advance_seconds=args.clock_advance_seconds,
+    )
+    print(f"Fake Stripe API listening on http://127.0.0.1:{server.server_address[1]}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+import argparse
+import asyncio
+import contextlib
+import glob
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIRECTORY = os.path.join(REPO_ROOT, "benchmarks", "results")
+
+PHASES = ["inventory", "products", "customers", "subscriptions", "pipeline"]
+
+DEFAULT_SCALES = [1000]
+
+# Rate limiter settings for benchmarks. Real Stripe test mode allows about 25
+# requests per second, which would make the benchmark measure Stripe's limit
+# instead of the populator; --stripe-limits keeps the normal RATE_LIMIT.
+BENCHMARK_RATE_LIMIT = {
+    "requests_per_second": 2000,
+    "max_requests_per_second": 10000,
+    "initial_concurrency": 100,
+    "max_concurrency": 100,
+}
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def peak_rss_bytes():
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+async def run_phase(phase, scale, client):
+    from stripe_populator.compiler import compile_plan
+    from stripe_populator.engine import Pipeline, PlannedObjects, Session
+    from stripe_populator.journal import RunJournal
+    from stripe_populator.plan import Plan
+    
+    session = Session(client)
+    journal = RunJournal.start({"benchmark": phase, "scale": scale})
+    
+    if phase == "inventory":
+        from stripe_populator.inventory import fetch_existing_customers
+        from stripe_populator.registry import CustomerRegistry
+        customers = CustomerRegistry()
+        await fetch_existing_customers(session, customers)
+        return len(customers)
+    
+    if phase == "products":
+        from stripe_populator.products import create_products_and_prices
+        tax_rates = {"inclusive": ["txr_bench_inclusive"], "exclusive": ["txr_bench_exclusive"]}
+        compiled = compile_plan(Plan(products=scale), journal.seed)
+        return len(await create_products_and_prices(session, tax_rates, scale, journal, compiled))
+    
+    if phase == "customers":
+        from stripe_populator.customers import create_customers_with_payment_methods
+        compiled = compile_plan(Plan(customers=scale), journal.seed)
+        normal, failing = await create_customers_with_payment_methods(session, scale, journal, compiled)
+        return len(normal) + len(failing)
+    
+    if phase == "subscriptions":
+        from stripe_populator.subscriptions import create_subscriptions
+        # Customers and prices that already exist, so only subscription
+        # requests are measured
+        pipeline = Pipeline()
+        customers = PlannedObjects(pipeline, scale, lambda index: f"cus_bench{index:09d}", [])
+        failing_customers = PlannedObjects(pipeline, max(1, scale // 10), lambda index: f"cus_benchfail{index:09d}", [])
+        products = PlannedObjects(
+            pipeline, 100,
+            lambda index: {"product_id": f"prod_bench{index}", "price_id": f"price_bench{index}", "tax_rates": [], "tax_behavior": "exclusive"},
+            [],
+        )
+        compiled = compile_plan(Plan(subscriptions=scale), journal.seed, len(customers), len(failing_customers), len(products))
+        return len(await create_subscriptions(session, customers, failing_customers, products, scale, journal, compiled))
+    
+    if phase == "pipeline":
+        from stripe_populator.runner import populate_async
+        plan = Plan(products=max(1, scale // 100), customers=max(1, scale // 10), subscriptions=scale)
+        result = await populate_async(plan, client, cache_path=None)
+        return (
+            len(result["products"]) + len(result["customers_normal"]) + len(result["customers_failing"])
+            + len(result["subscriptions"])
+        )
+    
+    raise ValueError(f"Unknown phase {phase!r}")
+
+
+def run_child(args):
+    # Runs one phase at one scale in this process, so peak RSS belongs to that
+    # phase alone, and writes its measurements to args.result
+    from stripe_populator import config
+    if not args.stripe_limits:
+        config.RATE_LIMIT.update(BENCHMARK_RATE_LIMIT)
+    from stripe_populator.client import make_client
+    
+    client = make_client("sk_test_benchmark", base_addresses={"api": f"http://127.0.0.1:{args.port}"})
+    http_client = client.http_client
+    latencies = []
+    request_async = http_client.request_async
+    
+    async def timed_request(*request_args, **request_kwargs):
+        started = time.perf_counter()
+        try:
+            return await request_async(*request_args, **request_kwargs)
+        finally:
+            latencies.append(time.perf_counter() - started)
+    
+    http_client.request_async = timed_request
+    
+    started = time.perf_counter()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        objects = asyncio.run(run_phase(args.child, args.scale, client))
+    seconds = time.perf_counter() - started
+    
+    result = {
+        "phase": args.child,
+        "scale": args.scale,
+        "objects": objects,
+        "seconds": round(seconds, 3),
+        "objects_per_second": round(objects / seconds, 1) if seconds else 0,
+        "api_calls": http_client.requests,
+        "calls_per_object": round(http_client.requests / objects, 2) if objects else 0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+        "peak_rss_mb": round(peak_rss_bytes() / 2 ** 20, 1),
+    }
+    with open(args.result, "w", encoding="utf-8") as result_file:
+        json.dump(result, result_file)
+
+
+def start_fake_server(args, scale):
+    command = [
+        sys.executable, os.path.join(REPO_ROOT, "benchmarks", "fake_stripe.py"),
+        "--port", "0" if not args.port else str(args.port),
+        "--latency", args.latency,
+        "--rate-limit-rate", str(args.rate_limit_rate),
+        "--error-rate", str(args.error_rate),
+        "--seed-customers", str(scale),
+    ]
+    server = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    # The server prints its address once it is listening
+    line = server.stdout.readline()
+    if not line:
+        raise RuntimeError("Fake Stripe server failed to start")
+    return server, int(line.rsplit(":", 1)[1])
+
+
+def git_commit():
+    try:
+        output = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, check=True
+        )
+        return output.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def load_baseline(path, directory):
+    if path is None:
+        previous = sorted(glob.glob(os.path.join(directory, "*.json")))
+        if not previous:
+            return None
+        path = previous[-1]
+    with open(path, encoding="utf-8") as baseline_file:
+        baseline = json.load(baseline_file)
+    baseline["path"] = path
+    return baseline
+
+
+def print_results(results, baseline):
+    baseline_results = {}
+    if baseline:
+        print(f"Compared with {os.path.basename(baseline['path'])} (commit {baseline['commit']})")
+        baseline_results = {(result["phase"], result["scale"]): result for result in baseline["results"]}
+    
+    print(f"{'phase':<14}{'scale':>8}{'objects/s':>11}{'change':>9}{'calls/obj':>11}{'p50 ms':>9}{'p99 ms':>9}{'peak MB':>9}")
+    for result in results:
+        previous = baseline_results.get((result["phase"], result["scale"]))
+        change = ""
+        if previous and previous["objects_per_second"]:
+            change = f"{result['objects_per_second'] / previous['objects_per_second'] - 1:+.0%}"
+        print(
+            f"{result['phase']:<14}{result['scale']:>8}{result['objects_per_second']:>11.1f}{change:>9}"
+            f"{result['calls_per_object']:>11.2f}{result['p50_ms']:>9.1f}{result['p99_ms']:>9.1f}{result['peak_rss_mb']:>9.1f}"
+        )
+
+
+def run_suite(args):
+    baseline = load_baseline(args.baseline, args.output)
+    results = []
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [REPO_ROOT, os.environ.get("PYTHONPATH")]))}
+    
+    for scale in args.scales:
+        server, port = start_fake_server(args, scale)
+        try:
+            for phase in args.phases:
+                print(f"→ {phase} at {scale} objects...", flush=True)
+                # Journals and caches go to a scratch directory per phase
+                with tempfile.TemporaryDirectory() as scratch:
+                    result_path = os.path.join(scratch, "result.json")
+                    command = [
+                        sys.executable, os.path.abspath(__file__), "--child", phase,
+                        "--scale", str(scale), "--port", str(port), "--result", result_path,
+                    ]
+                    if args.stripe_limits:
+                        command.append("--stripe-limits")
+                    completed = subprocess.run(command, cwd=scratch, env=env)
+                    if completed.returncode != 0 or not os.path.exists(result_path):
+                        print(f"✗ {phase} at {scale} objects failed (exit code {completed.returncode})")
+                        continue
+                    with open(result_path, encoding="utf-8") as result_file:
+                        result = json.load(result_file)
+                results.append(result)
+                print(f"✓ {result['objects']} objects in {result['seconds']:.1f}s ({result['objects_per_second']:.1f}/s)")
+        finally:
+            server.terminate()
+            server.wait()
+    
+    report = {
+        "commit": git_commit(),
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "settings": {
+            "latency": args.latency,
+            "rate_limit_rate": args.rate_limit_rate,
+            "error_rate": args.error_rate,
+            "stripe_limits": args.stripe_limits,
+        },
+        "results": results,
+    }
+    os.makedirs(args.output, exist_ok=True)
+    path = os.path.join(args.output, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{report['commit']}.json")
+    with open(path, "w", encoding="utf-8") as report_file:
+        json.dump(report, report_file, indent=2)
+    
+    print()
+    print_results(results, baseline)
+    print(f"\nResults saved to {path}")
+
+
+def parse_list(value, cast=str):
+    return [cast(item) for item in value.split(",") if item]
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Benchmark the populator's phases against a local fake Stripe API.")
+    parser.add_argument("--scales", type=lambda value: parse_list(value, int), default=DEFAULT_SCALES,
+                        help="comma-separated object counts, e.g. 1000,10000,100000")
+    parser.add_argument("--phases", type=parse_list, default=PHASES, help=f"comma-separated phases ({', '.join(PHASES)})")
+    parser.add_argument("--latency", default="lognormal:0.03:0.4", help="fixed:S, uniform:LOW:HIGH or lognormal:MEDIAN:SIGMA")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction of requests answered with a 429")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with a retryable 500")
+    parser.add_argument("--stripe-limits", action="store_true", help="keep the rate limiter at its normal Stripe settings")
+    parser.add_argument("--output", default=RESULTS_DIRECTORY, help="directory the results are saved to")
+    parser.add_argument("--baseline", metavar="FILE", help="results file to compare with (default: the latest in --output)")
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--child", choices=PHASES, help=argparse.SUPPRESS)
+    parser.add_argument("--scale", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.child:
+        run_child(args)
+    else:
+        unknown = set(args.phases) - set(PHASES)
+        if unknown:
+            raise SystemExit(f"Unknown phases: {', '.join(sorted(unknown))}")
+        run_suite(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,16 @@
+from .plan import Plan
+
+
+__all__ = ["Plan", "populate", "populate_async", "populate_sharded"]
+
+
+def __getattr__(name):
+    # The runner pulls in stripe (and, once data is generated, faker), so it is
+    # only imported when populate is actually used
+    if name in ("populate", "populate_async"):
+        from . import runner
+        return getattr(runner, name)
+    if name == "populate_sharded":
+        from . import shards
+        return shards.populate_sharded
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,6 @@
+from .cli import main
+
+
+# Guarded so that worker processes of a sharded run can import this module
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+import asyncio
+import math
+import time
+
+from .compiler import estimate_requests, split_customers
+from .config import TEST_CLOCKS, TIME_BUDGET
+from .metrics import format_duration
+
+
+# Phases whose quotas a time budget scales, in the order their counts are
+# printed. Cancelling or pausing a subscription is part of its cost.
+BUDGET_PHASES = ("products", "customers_normal", "customers_failing", "subscriptions")
+COST_PHASES = {"subscription_followups": "subscriptions"}
+
+
+def planned_costs(plan):
+    # Requests per item of each budgeted phase according to the plan, used
+    # until a phase has completed items of its own to measure
+    requests = estimate_requests(plan, create_tax_rates=False)
+    num_normal, num_failing = split_customers(plan.customers)
+    subscription_requests = sum(
+        requests.get(endpoint, 0)
+        for endpoint in ("Subscription.create", "Subscription.cancel", "Subscription.update", "SubscriptionSchedule.create")
+    )
+    return {
+        # A product comes with its default price, each further price is a request
+        "products": plan.prices_per_product,
+        "customers_normal": (num_normal + requests.get("PaymentMethod.attach", 0)) / num_normal if num_normal else 1,
+        "customers_failing": 1,
+        "subscriptions": subscription_requests / plan.subscriptions,
+    }
+
+
+def advance_steps(plan):
+    return math.ceil(plan.history_months * 30 / TEST_CLOCKS["advance_days"]) if plan.history_months else 0
+
+
+def creation_seconds(plan, seconds):
+    # Part of a time budget for creating objects: TIME_BUDGET["reserve"] of it
+    # is kept for finishing up, and with a billing history also the time
+    # test clocks take to advance, which polling makes at least
+    # poll_interval per step however few clocks there are
+    reserve = seconds * TIME_BUDGET["reserve"] + advance_steps(plan) * TEST_CLOCKS["poll_interval"]
+    return max(0.0, seconds - reserve)
+
+
+def estimate_scale(plan, seconds, requests_per_second):
+    # Share of the plan a run fits into `seconds` at the given request rate
+    total = sum(estimate_requests(plan).values())
+    return min(1.0, creation_seconds(plan, seconds) * requests_per_second / total) if total else 1.0
+
+
+class RunBudget:
+    # Fits a population run into a time budget. Products, customers and
+    # subscriptions are created in index order, so a phase's quota is the
+    # number of its items that may be started; the plan's quantities are the
+    # most a run creates. Every TIME_BUDGET["interval"] seconds after a
+    # warmup, the quotas are scaled by one factor so the remaining items fit
+    # into the time left: each phase's cost is the requests it made per
+    # completed item, and the run's throughput is its peak request rate over
+    # the last TIME_BUDGET["window"] seconds. The scale starts from what fits
+    # at max_rate, the fastest the rate limiter goes, so no phase runs ahead
+    # during the warmup, and goes down or back up as the throughput and
+    # costs show; quotas never drop below the items already started. A phase
+    # beyond its quota waits for it to grow until the deadline, when no new
+    # item is started and the items in progress are finished; the reserve is
+    # left for them, the status follow-ups, advancing test clocks and the
+    # audit. With a billing history, the deadline also leaves time for the
+    # requests advancing the clocks of the customers within the quotas,
+    # which count towards the customers' cost when scaling.
+    
+    def __init__(self, seconds, plan, max_rate):
+        self.seconds = seconds
+        self.started = time.monotonic()
+        self.deadline = self.started + creation_seconds(plan, seconds)
+        self.counts = dict(zip(BUDGET_PHASES, (plan.products, *split_customers(plan.customers), plan.subscriptions)))
+        self.costs = planned_costs(plan)
+        # A retrieve per clock, then an advance and a poll per step, shared by
+        # the clock's customers
+        self.clock_requests = (1 + 2 * advance_steps(plan)) / TEST_CLOCKS["customers_per_clock"] if plan.history_months else 0
+        self.max_rate = max_rate
+        self.scale = estimate_scale(plan, seconds, max_rate)
+        self.expired = False
+        self.taken = {phase: 0 for phase in BUDGET_PHASES}
+        self.done = {phase: 0 for phase in BUDGET_PHASES}
+        self.skipped = {phase: 0 for phase in BUDGET_PHASES}
+        self.requests = {phase: 0 for phase in BUDGET_PHASES}
+        self.total_requests = 0
+        self._samples = [(self.started, 0)]
+        self._checked = self.started
+    
+    def quota(self, phase, count):
+        # How many of the phase's `count` items the run creates as things stand
+        if phase not in self.counts:
+            return count
+        if self.expired:
+            return min(count, self.taken[phase])
+        return min(count, max(self.taken[phase], math.ceil(self.scale * count)))
+    
+    def take(self, phase, index):
+        # Whether item `index` may be started now; items are taken in order
+        if phase not in self.counts:
+            return True
+        self._check()
+        if index >= self.quota(phase, self.counts[phase]):
+            return False
+        self.taken[phase] = max(self.taken[phase], index + 1)
+        return True
+    
+    async def wait(self, allowed):
+        # Waits until allowed() passes, as quotas grow, and returns True, or
+        # returns False once the budget has expired without it passing
+        while not allowed():
+            if self.expired:
+                return False
+            await asyncio.sleep(TIME_BUDGET["interval"])
+        return True
+    
+    def record_request(self, phase):
+        self.total_requests += 1
+        phase = COST_PHASES.get(phase, phase)
+        if phase in self.requests:
+            self.requests[phase] += 1
+    
+    def record_done(self, phase):
+        if phase in self.done:
+            self.done[phase] += 1
+    
+    def record_skipped(self, phase, count):
+        # Items a resumed run found in its journal: already paid for
+        if phase in self.skipped:
+            self.skipped[phase] += count
+    
+    def throughput(self, now):
+        # Requests per second over the sampling window
+        while len(self._samples) > 2 and now - self._samples[1][0] >= TIME_BUDGET["window"]:
+            self._samples.pop(0)
+        first_time, first_requests = self._samples[0]
+        return (self.total_requests - first_requests) / (now - first_time) if now > first_time else 0.0
+    
+    def peak_throughput(self, now):
+        # Highest request rate over any TIME_BUDGET["peak"] seconds of the
+        # sampling window, at most max_rate. While phases wait for their
+        # quotas to grow, the run sends fewer requests than it could, and
+        # scaling by the average would keep it that small.
+        average = self.throughput(now)
+        peak = 0.0
+        start = 0
+        for end_time, end_requests in self._samples:
+            while start + 1 < len(self._samples) and end_time - self._samples[start + 1][0] >= TIME_BUDGET["peak"]:
+                start += 1
+            start_time, start_requests = self._samples[start]
+            if end_time - start_time >= TIME_BUDGET["peak"]:
+                peak = max(peak, (end_requests - start_requests) / (end_time - start_time))
+        return min(self.max_rate, max(average, peak))
+    
+    def _check(self):
+        now = time.monotonic()
+        if self.expired or now - self._checked < TIME_BUDGET["interval"]:
+            return
+        self._checked = now
+        self._samples.append((now, self.total_requests))
+        rate = self.throughput(now)
+        
+        num_customers = self.quota("customers_normal", self.counts["customers_normal"])
+        num_customers += self.quota("customers_failing", self.counts["customers_failing"])
+        advancing = num_customers * self.clock_requests / rate if rate else 0
+        if now >= self.deadline - advancing:
+            self.expired = True
+            print(
+                f"  ⏱ Time budget reached after {format_duration(now - self.started)}, "
+                f"finishing the items in progress ({self.describe()})"
+            )
+            return
+        if now - self.started < min(TIME_BUDGET["warmup"], self.seconds / 10):
+            return
+        
+        # Measured requests per item once a phase has some items done
+        for phase in BUDGET_PHASES:
+            if self.done[phase] >= TIME_BUDGET["min_items"]:
+                self.costs[phase] = self.requests[phase] / self.done[phase]
+        
+        planned = sum(self.counts[phase] * self.costs[phase] for phase in BUDGET_PHASES)
+        planned += (self.counts["customers_normal"] + self.counts["customers_failing"]) * self.clock_requests
+        finished = sum((self.done[phase] + self.skipped[phase]) * self.costs[phase] for phase in BUDGET_PHASES)
+        rate = self.peak_throughput(now)
+        if not planned or not rate:
+            return
+        scale = min(1.0, (rate * (self.deadline - now) + finished) / planned)
+        if abs(scale - self.scale) >= TIME_BUDGET["min_change"] or (scale == 1.0 and self.scale < 1.0):
+            self.scale = scale
+            print(
+                f"  ⏱ {format_duration(self.deadline - now)} left at {rate:.1f} req/s: "
+                f"scaling the plan to {scale:.0%} ({self.describe()})"
+            )
+    
+    def needs_test_clock(self, index):
+        # Whether clock `index` holds a customer within the quotas as they
+        # stand. Customers fill the clocks in order, normal ones first.
+        self._check()
+        first = index * TEST_CLOCKS["customers_per_clock"]
+        last = first + TEST_CLOCKS["customers_per_clock"]
+        num_normal = self.counts["customers_normal"]
+        if first < self.quota("customers_normal", num_normal):
+            return True
+        return last > num_normal and first < num_normal + self.quota("customers_failing", self.counts["customers_failing"])
+    
+    def clock_share(self, index):
+        # Smallest share of its phase any customer on clock `index` sits at.
+        # As the scale grows, clocks become needed in this order, so a phase
+        # taking them in this order never holds back a needed clock.
+        first = index * TEST_CLOCKS["customers_per_clock"]
+        last = first + TEST_CLOCKS["customers_per_clock"]
+        num_normal, num_failing = self.counts["customers_normal"], self.counts["customers_failing"]
+        shares = []
+        if first < num_normal:
+            shares.append(first / num_normal)
+        if last > num_normal and num_failing:
+            shares.append(max(0, first - num_normal) / num_failing)
+        return min(shares, default=1.0)
+    
+    def describe(self):
+        products, normal, failing, subscriptions = (self.quota(phase, self.counts[phase]) for phase in BUDGET_PHASES)
+        return f"{products} products, {normal + failing} customers, {subscriptions} subscriptions"
+    
+    def report(self):
+        return {
+            "seconds": self.seconds,
+            "used_seconds": round(time.monotonic() - self.started, 1),
+            "expired": self.expired,
+            "scale": round(self.scale, 4),
+            "quotas": {phase: self.quota(phase, count) for phase, count in self.counts.items()},
+        }
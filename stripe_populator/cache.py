@@ -0,0 +1,189 @@
+import os
+import sqlite3
+
+from .config import CACHE_PATH
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS customers (
+    account TEXT NOT NULL,
+    id TEXT NOT NULL,
+    type TEXT NOT NULL,
+    created INTEGER,
+    PRIMARY KEY (account, id)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS prices (
+    account TEXT NOT NULL,
+    id TEXT NOT NULL,
+    product_id TEXT NOT NULL,
+    tax_behavior TEXT NOT NULL,
+    created INTEGER,
+    active INTEGER NOT NULL,
+    PRIMARY KEY (account, id)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS tax_rates (
+    account TEXT NOT NULL,
+    id TEXT NOT NULL,
+    inclusive INTEGER NOT NULL,
+    created INTEGER,
+    active INTEGER NOT NULL,
+    PRIMARY KEY (account, id)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS sync_state (
+    account TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    cursor INTEGER NOT NULL,
+    PRIMARY KEY (account, kind)
+) WITHOUT ROWID;
+"""
+
+
+class InventoryCache:
+    # Local SQLite index of an account's customers, recurring prices and tax
+    # rates. Each kind keeps a `created` cursor so the next sync only lists
+    # what was created since; deletions and deactivations are applied from
+    # Stripe events (or webhook payloads) through apply_event().
+    
+    def __init__(self, account_id, path=CACHE_PATH):
+        self.account_id = account_id
+        self.path = path
+        
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Shards of a sharded run share the file from separate processes
+        self._db = sqlite3.connect(path, timeout=60)
+        self._db.executescript(SCHEMA)
+    
+    def close(self):
+        self._db.close()
+    
+    def get_cursor(self, kind):
+        row = self._db.execute(
+            "SELECT cursor FROM sync_state WHERE account = ? AND kind = ?", (self.account_id, kind)
+        ).fetchone()
+        return row[0] if row else None
+    
+    def set_cursor(self, kind, cursor):
+        with self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO sync_state (account, kind, cursor) VALUES (?, ?, ?)",
+                (self.account_id, kind, cursor),
+            )
+    
+    def clear(self):
+        # Drops everything cached for the account, so the next sync is a full one
+        with self._db:
+            for table in ("customers", "prices", "tax_rates", "sync_state"):
+                self._db.execute(f"DELETE FROM {table} WHERE account = ?", (self.account_id,))
+    
+    def add_customers(self, customers, replace=False):
+        # Listed customers never overwrite a known type (e.g. a failing-card
+        # customer this tool created); customers this tool creates do
+        verb = "INSERT OR REPLACE" if replace else "INSERT OR IGNORE"
+        with self._db:
+            cursor = self._db.executemany(
+                f"{verb} INTO customers (account, id, type, created) VALUES (?, ?, ?, ?)",
+                ((self.account_id, customer["id"], customer["type"], customer.get("created")) for customer in customers),
+            )
+        return cursor.rowcount
+    
+    def set_customer_types(self, customers):
+        # Types found for customers the cache already knows, from a registry;
+        # their created timestamps stay as listed
+        with self._db:
+            cursor = self._db.executemany(
+                "UPDATE customers SET type = ? WHERE account = ? AND id = ?",
+                ((customer_type, self.account_id, customer_id) for customer_id, customer_type in customers.items()),
+            )
+        return cursor.rowcount
+    
+    def add_prices(self, prices):
+        with self._db:
+            cursor = self._db.executemany(
+                "INSERT OR IGNORE INTO prices (account, id, product_id, tax_behavior, created, active) "
+                "VALUES (?, ?, ?, ?, ?, 1)",
+                (
+                    (self.account_id, price["price_id"], price["product_id"], price["tax_behavior"], price.get("created"))
+                    for price in prices
+                ),
+            )
+        return cursor.rowcount
+    
+    def add_tax_rates(self, tax_rates):
+        with self._db:
+            cursor = self._db.executemany(
+                "INSERT OR IGNORE INTO tax_rates (account, id, inclusive, created, active) VALUES (?, ?, ?, ?, 1)",
+                ((self.account_id, tax_rate["id"], tax_rate["inclusive"], tax_rate.get("created")) for tax_rate in tax_rates),
+            )
+        return cursor.rowcount
+    
+    def apply_event(self, event):
+        # Accepts Stripe Event objects as well as parsed webhook payloads.
+        # Returns True if the event changed the cache.
+        event_type = event["type"]
+        obj = event["data"]["object"]
+        # Event objects support `in` and [], but not get()
+        active = obj["active"] if "active" in obj else True
+        
+        with self._db:
+            if event_type == "customer.deleted":
+                cursor = self._db.execute(
+                    "DELETE FROM customers WHERE account = ? AND id = ?", (self.account_id, obj["id"])
+                )
+            elif event_type in ("price.updated", "price.deleted"):
+                active = event_type == "price.updated" and active
+                cursor = self._db.execute(
+                    "UPDATE prices SET active = ? WHERE account = ? AND id = ?", (int(bool(active)), self.account_id, obj["id"])
+                )
+            elif event_type == "tax_rate.updated":
+                cursor = self._db.execute(
+                    "UPDATE tax_rates SET active = ? WHERE account = ? AND id = ?",
+                    (int(bool(active)), self.account_id, obj["id"]),
+                )
+            else:
+                return False
+        
+        return cursor.rowcount > 0
+    
+    def load_customers(self, customers, exclude=()):
+        rows = self._db.execute(
+            "SELECT id, type FROM customers WHERE account = ? ORDER BY created DESC", (self.account_id,)
+        )
+        for customer_id, customer_type in rows:
+            if customer_id not in exclude:
+                customers.add(customer_id, customer_type)
+        return customers
+    
+    def load_prices(self, exclude=()):
+        rows = self._db.execute(
+            "SELECT id, product_id, tax_behavior FROM prices WHERE account = ? AND active = 1 ORDER BY created DESC",
+            (self.account_id,),
+        )
+        return [
+            {
+                "product_id": product_id,
+                "price_id": price_id,
+                "tax_rates": [],
+                "tax_behavior": tax_behavior
+            }
+            for price_id, product_id, tax_behavior in rows
+            if price_id not in exclude
+        ]
+    
+    def load_tax_rates(self, exclude=()):
+        tax_rates_by_type = {
+            "inclusive": [],
+            "exclusive": []
+        }
+        rows = self._db.execute(
+            "SELECT id, inclusive FROM tax_rates WHERE account = ? AND active = 1 ORDER BY created DESC",
+            (self.account_id,),
+        )
+        for tax_rate_id, inclusive in rows:
+            if tax_rate_id not in exclude:
+                tax_rates_by_type["inclusive" if inclusive else "exclusive"].append(tax_rate_id)
+        return tax_rates_by_type
@@ -0,0 +1,299 @@
+import asyncio
+import bisect
+import os
+import random
+import time
+from array import array
+
+from .compiler import allocate_quotas, shuffled_codes
+from .config import CACHE_PATH, CHURN, CHURN_MUTATION_DISTRIBUTION, RATE_LIMIT
+from .engine import Session
+from .inventory import list_partitioned
+from .journal import RunJournal
+from .ratelimit import AdaptiveRateLimiter
+from .runner import load_inventory
+
+
+DAY = 24 * 60 * 60
+
+
+# Subscriptions churn can still change. Those managed by a schedule are left
+# alone, since the schedule would undo the change.
+CHURNABLE_STATUSES = ("active", "trialing", "past_due")
+
+
+async def fetch_churn_pools(session, cache_path, sync_events, customer_sample):
+    # Existing customers (for new trials, at most `customer_sample` of them
+    # unless they're cached), recurring prices by currency and sorted by
+    # amount (for upgrades and downgrades), and live subscriptions with their
+    # first item
+    customers, _, _, cache = await load_inventory(session, (), cache_path, sync_events, customer_sample, failing_sample=0)
+    if cache:
+        cache.close()
+    
+    print("\nFetching recurring prices and subscriptions from Stripe...")
+    prices = {}
+    subscriptions = []
+    
+    def add_prices(page):
+        for price in page:
+            if price.recurring and price.unit_amount is not None:
+                prices.setdefault(price.currency, []).append((price.unit_amount, price.id))
+    
+    def add_subscriptions(page):
+        for subscription in page:
+            if subscription.status not in CHURNABLE_STATUSES or subscription.schedule or not subscription["items"].data:
+                continue
+            item = subscription["items"].data[0]
+            subscriptions.append({
+                "id": subscription.id,
+                "item": item.id,
+                "amount": item.price.unit_amount or 0,
+                "currency": item.price.currency,
+            })
+    
+    await list_partitioned(session, session.client.v1.prices.list_async, add_prices, {"active": True, "type": "recurring"})
+    await list_partitioned(session, session.client.v1.subscriptions.list_async, add_subscriptions, {"status": "all"})
+    for currency_prices in prices.values():
+        currency_prices.sort()
+    
+    print(f"✓ Found {sum(len(p) for p in prices.values())} recurring prices and {len(subscriptions)} subscriptions to churn")
+    return customers, prices, subscriptions
+
+
+def latency_percentiles(latencies):
+    ordered = sorted(latencies)
+    if not ordered:
+        return {}
+    return {
+        name: ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+        for name, fraction in (("p50", 0.50), ("p90", 0.90), ("p99", 0.99), ("max", 1.0))
+    }
+
+
+async def churn_async(client, requests_per_second=None, duration=None, mix=None, cache_path=CACHE_PATH, sync_events=True,
+                      seed=None):
+    # Open-loop load generator for webhook consumers: sends lifecycle changes
+    # to existing subscriptions at a fixed rate for `duration` seconds. Each
+    # request is started when it is due, whether or not earlier ones have
+    # answered, so slow responses don't lower the rate; latency is measured
+    # from when a request was due, so time spent queued counts too. The
+    # mutations follow `mix` exactly (CHURN_MUTATION_DISTRIBUTION by default)
+    # in a seeded random order. New trialing subscriptions are tagged with
+    # the churn run's ID, so --purge removes them.
+    requests_per_second = requests_per_second or CHURN["requests_per_second"]
+    duration = duration or CHURN["duration"]
+    mix = {**CHURN_MUTATION_DISTRIBUTION, **(mix or {})}
+    max_in_flight = CHURN["max_in_flight"]
+    
+    # The rate limiter only steps in when Stripe answers 429; pacing is the
+    # schedule's job
+    rate_limiter = AdaptiveRateLimiter(**{
+        **RATE_LIMIT,
+        "requests_per_second": requests_per_second,
+        "max_requests_per_second": max(requests_per_second, RATE_LIMIT["max_requests_per_second"]),
+        "initial_concurrency": max_in_flight,
+        "max_concurrency": max_in_flight,
+    })
+    session = Session(client, rate_limiter=rate_limiter)
+    
+    print("=" * 60)
+    print(f"Churning subscriptions at {requests_per_second:g} requests/s for {duration:g}s")
+    print("=" * 60)
+    print()
+    # Each new trial needs one customer, so no more are sampled than that
+    total = int(requests_per_second * duration)
+    mutations = list(mix)
+    quotas = allocate_quotas(total, list(mix.values()))
+    customers, prices, subscriptions = await fetch_churn_pools(
+        session, cache_path, sync_events, quotas[mutations.index("new_trial")]
+    )
+    if not subscriptions and not (len(customers) and prices):
+        raise ValueError("No subscriptions to change and no customers and prices to start trials with")
+    # Sorted amounts per currency to bisect prices by
+    amounts = {currency: [amount for amount, _ in currency_prices] for currency, currency_prices in prices.items()}
+    
+    journal = RunJournal.start({"churn": {"requests_per_second": requests_per_second, "duration": duration, "mix": mix}, "seed": seed})
+    metrics = session.metrics
+    metrics_prefix = os.path.splitext(journal.path)[0]
+    metrics.set_output(journal.run_id, f"{metrics_prefix}.metrics.json", f"{metrics_prefix}.prom")
+    print(f"\nRun ID: {journal.run_id}")
+    
+    rng = random.Random(f"{journal.seed}:churn")
+    schedule = shuffled_codes(quotas, rng)
+    subscriptions_api = client.v1.subscriptions
+    busy = set()
+    customer_currencies = {}
+    counts = {mutation: 0 for mutation in mutations}
+    failed = {}
+    latencies = array("d")
+    progress = metrics.phase("churn", total)
+    
+    def pick_subscription():
+        # A random live subscription nobody else is changing right now;
+        # cancelled ones are dropped from the pool as they come up
+        for _ in range(8):
+            if not subscriptions:
+                return None
+            index = rng.randrange(len(subscriptions))
+            subscription = subscriptions[index]
+            if subscription.get("canceled"):
+                subscriptions[index] = subscriptions[-1]
+                subscriptions.pop()
+            elif subscription["id"] not in busy:
+                return subscription
+        return None
+    
+    def pick_price(subscription, mutation):
+        # A price in the same currency above or below the current amount
+        currency_prices = prices.get(subscription["currency"], [])
+        currency_amounts = amounts.get(subscription["currency"], [])
+        if mutation == "upgrade":
+            candidates = currency_prices[bisect.bisect_right(currency_amounts, subscription["amount"]):]
+        else:
+            candidates = currency_prices[:bisect.bisect_left(currency_amounts, subscription["amount"])]
+        return rng.choice(candidates) if candidates else None
+    
+    async def customer_currency(customer_id):
+        # Stripe refuses subscriptions in another currency than the one a
+        # customer is already billed in; None for customers never billed
+        if customer_id not in customer_currencies:
+            customer = await session.call(client.v1.customers.retrieve_async, customer_id)
+            customer_currencies[customer_id] = getattr(customer, "currency", None)
+        return customer_currencies[customer_id]
+    
+    async def mutate(i, mutation, due):
+        subscription = None
+        try:
+            options = journal.options("churn", i, mutation)
+            if mutation == "new_trial":
+                if not len(customers) or not prices:
+                    raise ValueError("no customers and prices to start a trial with")
+                customer_id = customers.id_at(rng.randrange(len(customers)))
+                currency = await customer_currency(customer_id) or ("usd" if "usd" in prices else rng.choice(list(prices)))
+                if currency not in prices:
+                    raise ValueError(f"no {currency} price to start a trial for {customer_id} with")
+                amount, price_id = rng.choice(prices[currency])
+                created = await session.call(
+                    subscriptions_api.create_async,
+                    params={
+                        "customer": customer_id,
+                        "items": [{"price": price_id}],
+                        "trial_period_days": rng.randint(7, 30),
+                        "metadata": journal.metadata,
+                    },
+                    options=options,
+                )
+                customer_currencies[customer_id] = currency
+                subscriptions.append({
+                    "id": created.id,
+                    "item": created["items"].data[0].id,
+                    "amount": amount,
+                    "currency": currency,
+                })
+                return True
+            
+            subscription = pick_subscription()
+            if subscription is None:
+                raise ValueError("no subscription available")
+            busy.add(subscription["id"])
+            
+            if mutation in ("upgrade", "downgrade"):
+                price = pick_price(subscription, mutation)
+                if price is None:
+                    raise ValueError(f"no price to {mutation} {subscription['id']} to")
+                await session.call(
+                    subscriptions_api.update_async,
+                    subscription["id"],
+                    params={"items": [{"id": subscription["item"], "price": price[1]}], "proration_behavior": "create_prorations"},
+                    options=options,
+                )
+                subscription["amount"] = price[0]
+            elif mutation == "pause":
+                await session.call(
+                    subscriptions_api.update_async,
+                    subscription["id"],
+                    params={"pause_collection": {"behavior": "keep_as_draft"}},
+                    options=options,
+                )
+            elif mutation == "cancel_at":
+                await session.call(
+                    subscriptions_api.update_async,
+                    subscription["id"],
+                    params={"cancel_at": int(time.time()) + rng.randint(7, 90) * DAY},
+                    options=options,
+                )
+            elif mutation == "cancel":
+                await session.call(subscriptions_api.cancel_async, subscription["id"], options=options)
+                subscription["canceled"] = True
+            return True
+        except Exception as e:
+            failed[mutation] = failed.get(mutation, 0) + 1
+            if sum(failed.values()) <= 10:
+                print(f"  ✗ Error in {mutation} {i+1}: {e}")
+            return False
+        finally:
+            if subscription:
+                busy.discard(subscription["id"])
+            latencies.append(time.monotonic() - due)
+    
+    async def send(i, mutation, due):
+        succeeded = await mutate(i, mutation, due)
+        if succeeded:
+            counts[mutation] += 1
+        progress.advance(succeeded)
+    
+    # The schedule: request i is due at start + i / rate
+    tasks = set()
+    dropped = 0
+    started = time.monotonic()
+    for i, code in enumerate(schedule):
+        due = started + i / requests_per_second
+        delay = due - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if len(tasks) >= max_in_flight:
+            dropped += 1
+            progress.advance(False)
+            continue
+        task = asyncio.create_task(send(i, mutations[code], due))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    sent_seconds = time.monotonic() - started
+    if tasks:
+        await asyncio.gather(*tasks)
+    elapsed = time.monotonic() - started
+    progress.finish()
+    
+    completed = sum(counts.values())
+    percentiles = latency_percentiles(latencies)
+    print("\n" + "=" * 60)
+    print("Churn completed!")
+    print("=" * 60)
+    print(f"Target rate: {requests_per_second:g} requests/s, achieved {(total - dropped) / sent_seconds:.1f} sent/s "
+          f"and {completed / elapsed:.1f} succeeded/s")
+    for mutation in mutations:
+        failures = f", {failed[mutation]} failed" if mutation in failed else ""
+        print(f"  - {mutation}: {counts[mutation]}{failures}")
+    if dropped:
+        print(f"  ⚠ {dropped} requests dropped with {max_in_flight} already in flight")
+    if percentiles:
+        print("Latency from due time: " + ", ".join(f"{name} {seconds * 1000:.0f}ms" for name, seconds in percentiles.items()))
+    print(f"API requests: {rate_limiter.requests} ({rate_limiter.throttled} rate limited, {rate_limiter.retries} retried)")
+    print("=" * 60)
+    
+    return {
+        "run_id": journal.run_id,
+        "target_rate": requests_per_second,
+        "sent_rate": (total - dropped) / sent_seconds if sent_seconds else 0,
+        "achieved_rate": completed / elapsed if elapsed else 0,
+        "mutations": counts,
+        "failed": failed,
+        "dropped": dropped,
+        "latency": percentiles,
+        "api_requests": rate_limiter.requests,
+    }
+
+
+def churn(client, requests_per_second=None, duration=None, mix=None, cache_path=CACHE_PATH, sync_events=True, seed=None):
+    return asyncio.run(churn_async(client, requests_per_second, duration, mix, cache_path, sync_events, seed))
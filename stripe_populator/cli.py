@@ -0,0 +1,430 @@
+import argparse
+import os
+import sys
+
+from .budget import estimate_scale
+from .compiler import estimate_requests
+from .config import CACHE_PATH, CHURN, CHURN_MUTATION_DISTRIBUTION, ESTIMATE_REQUESTS_PER_SECOND, PHASE_CONCURRENCY
+from .metrics import format_duration
+from .plan import PLAN_ENV_VARS, PLAN_MINIMUMS, Plan, read_plan_file
+
+
+# Questions asked for quantities missing from flags, environment and plan file
+PLAN_PROMPTS = {
+    "products": "How many NEW products to create? (0 to skip): ",
+    "customers": "How many NEW customers to create? (0 to skip): ",
+    "subscriptions": "How many NEW subscriptions to create? (min 1): ",
+}
+
+
+def get_positive_integer(prompt, min_value=0):
+    while True:
+        try:
+            value = int(input(prompt))
+            if value >= min_value:
+                return value
+            else:
+                print(f"Please enter a number >= {min_value}")
+        except ValueError:
+            print("That's not a valid integer. Please try again.")
+
+
+def parse_concurrency(value):
+    phase, _, count = value.partition("=")
+    if phase not in PHASE_CONCURRENCY or not count.isdigit() or int(count) < 1:
+        raise argparse.ArgumentTypeError(
+            f"expected PHASE=N with PHASE one of {', '.join(PHASE_CONCURRENCY)} and N >= 1, got {value!r}"
+        )
+    return phase, int(count)
+
+
+def parse_churn_mix(value):
+    mutation, _, weight = value.partition("=")
+    try:
+        weight = float(weight)
+    except ValueError:
+        weight = -1
+    if mutation not in CHURN_MUTATION_DISTRIBUTION or weight < 0:
+        raise argparse.ArgumentTypeError(
+            f"expected MUTATION=WEIGHT with MUTATION one of {', '.join(CHURN_MUTATION_DISTRIBUTION)} and WEIGHT >= 0, got {value!r}"
+        )
+    return mutation, weight
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="stripe-populate",
+        description="Populate a Stripe test account with realistic test data.",
+        epilog=(
+            "Quantities are taken from flags, then from the STRIPE_POPULATE_PRODUCTS, "
+            "STRIPE_POPULATE_CUSTOMERS and STRIPE_POPULATE_SUBSCRIPTIONS environment variables, "
+            "then from the plan file. In an interactive terminal anything still missing is asked for."
+        ),
+    )
+    parser.add_argument("--api-key", help="Stripe test API key (default: $STRIPE_API_KEY)")
+    parser.add_argument("--stripe-account", metavar="ACCOUNT_ID", help="populate this connected account using the platform's API key")
+    parser.add_argument(
+        "--shard", metavar="TARGET", action="append", default=[],
+        help="split the plan across several accounts, one process each: a test API key or a connected account ID; may be repeated",
+    )
+    parser.add_argument("--shards-file", metavar="FILE", help="file with one shard target per line")
+    parser.add_argument("--processes", type=int, help="worker processes for a sharded run (default: one per shard, up to the CPU count)")
+    parser.add_argument("--plan", metavar="FILE", help="JSON plan file with products, customers, subscriptions and concurrency")
+    parser.add_argument("--products", type=int, help="number of NEW products to create")
+    parser.add_argument("--customers", type=int, help="number of NEW customers to create")
+    parser.add_argument("--subscriptions", type=int, help="number of NEW subscriptions to create")
+    parser.add_argument(
+        "--concurrency", metavar="PHASE=N", type=parse_concurrency, action="append", default=[],
+        help=f"items worked on at once in a phase ({', '.join(PHASE_CONCURRENCY)}); may be repeated",
+    )
+    parser.add_argument("--seed", type=int, help="generate the same customer and product attributes as any other run with this seed")
+    parser.add_argument(
+        "--history-months", type=int, metavar="N",
+        help="put new customers on test clocks N months in the past and advance them, generating N months of invoices and dunning",
+    )
+    parser.add_argument(
+        "--prices-per-product", type=int, metavar="N",
+        help="give each new product N prices in different currencies and billing intervals (default: 1)",
+    )
+    parser.add_argument("--no-cache", action="store_true", help="read existing data from Stripe instead of the local inventory cache, sampling only the customers the run needs")
+    parser.add_argument(
+        "--no-cache-events", action="store_true",
+        help="only add newly created objects to the cache, without applying deletions from Stripe events",
+    )
+    parser.add_argument(
+        "--time-budget", type=float, metavar="SECONDS",
+        help="finish within this time, scaling down the quantities (the most that will be created) to what live throughput allows",
+    )
+    parser.add_argument(
+        "--target-rate", type=float, metavar="REQUESTS_PER_SECOND",
+        help="never send more than this many requests per second (also the rate --dry-run estimates with)",
+    )
+    parser.add_argument("--connect-timeout", type=float, metavar="SECONDS", help="timeout for opening a connection to Stripe")
+    parser.add_argument("--read-timeout", type=float, metavar="SECONDS", help="timeout for a Stripe response")
+    parser.add_argument(
+        "--metrics-textfile", metavar="FILE",
+        help="write the Prometheus metrics here, e.g. into node_exporter's textfile directory (default: next to the run journal)",
+    )
+    parser.add_argument(
+        "--purge", metavar="RUN_ID", action="append", default=[],
+        help="delete, cancel or archive everything a run created instead of populating; may be repeated",
+    )
+    parser.add_argument("--purge-all", action="store_true", help="purge everything created by any run of this tool")
+    parser.add_argument(
+        "--manifest", metavar="FILE",
+        help="record every request that builds the dataset here, for --replay; .gz compresses it (default: next to the run journal)",
+    )
+    parser.add_argument(
+        "--replay", metavar="MANIFEST",
+        help="recreate the dataset a run's manifest describes in this account, without generating new data",
+    )
+    parser.add_argument(
+        "--id-map", metavar="FILE",
+        help="where --replay writes the original and new ID of each object (default: next to the replay's journal)",
+    )
+    parser.add_argument(
+        "--churn", action="store_true",
+        help="instead of populating, keep changing existing subscriptions at a fixed rate to generate webhook traffic",
+    )
+    parser.add_argument(
+        "--churn-rate", type=float, metavar="REQUESTS_PER_SECOND", default=CHURN["requests_per_second"],
+        help=f"requests per second --churn sends, however slow Stripe answers (default: {CHURN['requests_per_second']})",
+    )
+    parser.add_argument(
+        "--churn-duration", type=float, metavar="SECONDS", default=CHURN["duration"],
+        help=f"how long --churn runs (default: {CHURN['duration']})",
+    )
+    parser.add_argument(
+        "--churn-mix", metavar="MUTATION=WEIGHT", type=parse_churn_mix, action="append", default=[],
+        help=f"relative weight of a --churn mutation ({', '.join(CHURN_MUTATION_DISTRIBUTION)}); may be repeated",
+    )
+    parser.add_argument("--resume", metavar="RUN_ID", help="continue an interrupted run, skipping work it already completed")
+    parser.add_argument(
+        "--dry-run", action="store_true",
+        help=(
+            "print the resolved plan with its API requests and estimated duration, and exit without calling Stripe "
+            "(with --purge: only count what would be purged)"
+        ),
+    )
+    parser.add_argument(
+        "--estimate-rate", type=float, metavar="REQUESTS_PER_SECOND", default=ESTIMATE_REQUESTS_PER_SECOND,
+        help=f"request rate the --dry-run duration estimate assumes (default: {ESTIMATE_REQUESTS_PER_SECOND}, Stripe's test mode limit)",
+    )
+    return parser
+
+
+def resolve_plan(args, interactive):
+    values = read_plan_file(args.plan) if args.plan else {}
+    
+    for name, env_var in PLAN_ENV_VARS.items():
+        if os.environ.get(env_var):
+            try:
+                values[name] = int(os.environ[env_var])
+            except ValueError:
+                raise ValueError(f"{env_var} must be an integer, got {os.environ[env_var]!r}")
+    
+    for name in PLAN_ENV_VARS:
+        if getattr(args, name) is not None:
+            values[name] = getattr(args, name)
+    
+    missing = [name for name in PLAN_ENV_VARS if name not in values]
+    if missing and not interactive:
+        raise ValueError(f"Missing quantities: {', '.join(missing)} (use flags, environment variables or --plan)")
+    
+    if missing:
+        print("\n" + "=" * 60)
+        print("Configure data quantities (enter 0 to skip creation)")
+        print("=" * 60)
+        for name in missing:
+            values[name] = get_positive_integer(PLAN_PROMPTS[name], min_value=PLAN_MINIMUMS[name])
+        print("=" * 60 + "\n")
+    
+    values["concurrency"] = {**values.get("concurrency", {}), **dict(args.concurrency)}
+    if args.seed is not None:
+        values["seed"] = args.seed
+    if args.history_months is not None:
+        values["history_months"] = args.history_months
+    if args.prices_per_product is not None:
+        values["prices_per_product"] = args.prices_per_product
+    return Plan.from_dict(values)
+
+
+def print_plan(plan):
+    concurrency = {**PHASE_CONCURRENCY, **plan.concurrency}
+    print("=" * 60)
+    print("Dry run - nothing will be created")
+    print("=" * 60)
+    print(f"  - New products with prices: {plan.products}")
+    print(f"  - New customers: {plan.customers}")
+    print(f"  - New subscriptions: {plan.subscriptions}")
+    print(f"  - Concurrency: {', '.join(f'{phase}={count}' for phase, count in concurrency.items())}")
+    if plan.seed is not None:
+        print(f"  - Seed: {plan.seed}")
+    if plan.history_months:
+        print(f"  - Billing history: {plan.history_months} months on test clocks")
+    if plan.prices_per_product > 1:
+        print(f"  - Prices per new product: {plan.prices_per_product}")
+    print("=" * 60)
+
+
+def print_estimate(plan, requests_per_second, time_budget=None):
+    # Assumes a run that creates its own tax rates; listing existing data,
+    # retries and polling test clocks come on top
+    requests = estimate_requests(plan)
+    total = sum(requests.values())
+    polling = ", polling test clocks" if plan.history_months else ""
+    print(f"API requests: {total} (plus listing existing data{polling} and retries)")
+    for endpoint, count in requests.items():
+        print(f"  - {endpoint}: {count}")
+    print(f"Estimated duration at {requests_per_second:g} requests/s: {format_duration(total / requests_per_second)}")
+    if time_budget:
+        # The run measures its actual throughput and scales the plan as it goes
+        scale = estimate_scale(plan, time_budget, requests_per_second)
+        print(
+            f"Time budget {format_duration(time_budget)}: about {scale:.0%} of the plan fits "
+            f"({int(plan.products * scale)} products, {int(plan.customers * scale)} customers, "
+            f"{int(plan.subscriptions * scale)} subscriptions)"
+        )
+    print("=" * 60)
+
+
+def print_manifest(header, records, requests_per_second):
+    requests = {}
+    for record in records:
+        requests[record["endpoint"]] = requests.get(record["endpoint"], 0) + 1
+    print("=" * 60)
+    print(f"Dry run - replaying run {header['run_id']} would send {len(records)} requests")
+    print("=" * 60)
+    for endpoint, count in requests.items():
+        print(f"  - {endpoint}: {count}")
+    print(f"Estimated duration at {requests_per_second:g} requests/s: {format_duration(len(records) / requests_per_second)}")
+    print("=" * 60)
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    interactive = sys.stdin.isatty()
+    if args.estimate_rate <= 0:
+        parser.error("--estimate-rate must be greater than 0")
+    if (args.time_budget is not None and args.time_budget <= 0) or (args.target_rate is not None and args.target_rate <= 0):
+        parser.error("--time-budget and --target-rate must be greater than 0")
+    if (args.time_budget or args.target_rate) and (args.purge or args.purge_all or args.churn or args.replay):
+        parser.error("--time-budget and --target-rate only apply to population runs")
+    # A dry run estimates at the rate the run is held to
+    estimate_rate = args.target_rate or args.estimate_rate
+    
+    if args.resume:
+        from .journal import RunJournal
+        try:
+            journal = RunJournal.load(args.resume)
+            plan = journal.population_plan()
+        except ValueError as e:
+            parser.error(str(e))
+        if args.dry_run:
+            print_plan(plan)
+            print_estimate(plan, estimate_rate, args.time_budget)
+            completed = sum(len(results) for results in journal.completed.values())
+            print(f"Run {journal.run_id} has {completed} completed items")
+            return
+    
+    api_key = args.api_key or os.environ.get("STRIPE_API_KEY")
+    if not api_key and interactive and (not args.dry_run or args.purge or args.purge_all):
+        # Asking user for Stripe API key
+        api_key = input("Please enter your Stripe test API key (starts with 'sk_test_'): ").strip()
+    
+    if args.purge or args.purge_all:
+        if args.resume or args.shard or args.shards_file:
+            parser.error("--purge can't be combined with --resume or shards")
+        from .client import make_client
+        from .purge import purge
+        
+        try:
+            client = make_client(
+                api_key, connect_timeout=args.connect_timeout, read_timeout=args.read_timeout, stripe_account=args.stripe_account
+            )
+        except ValueError as e:
+            parser.error(str(e))
+        purge(
+            client,
+            args.purge,
+            everything=args.purge_all,
+            dry_run=args.dry_run,
+            concurrency=dict(args.concurrency),
+        )
+        return
+    
+    if args.churn:
+        if args.resume or args.shard or args.shards_file or args.dry_run:
+            parser.error("--churn can't be combined with --resume, --dry-run or shards")
+        if args.churn_rate <= 0 or args.churn_duration <= 0 or args.churn_rate * args.churn_duration < 1:
+            parser.error("--churn-rate and --churn-duration must be greater than 0 and allow at least one request")
+        mix = {**CHURN_MUTATION_DISTRIBUTION, **dict(args.churn_mix)}
+        if sum(mix.values()) <= 0:
+            parser.error("--churn-mix leaves no mutation with a weight above 0")
+        from .churn import churn
+        from .client import make_client
+        
+        try:
+            # One connection per request churn may keep in flight
+            client = make_client(
+                api_key, pool_size=CHURN["max_in_flight"], connect_timeout=args.connect_timeout,
+                read_timeout=args.read_timeout, stripe_account=args.stripe_account,
+            )
+            churn(
+                client,
+                args.churn_rate,
+                args.churn_duration,
+                mix,
+                cache_path=None if args.no_cache else CACHE_PATH,
+                sync_events=not args.no_cache_events,
+                seed=args.seed,
+            )
+        except ValueError as e:
+            parser.error(str(e))
+        return
+    
+    if args.replay:
+        if args.resume or args.shard or args.shards_file:
+            parser.error("--replay can't be combined with --resume or shards")
+        from .manifest import read_manifest
+        
+        try:
+            header, records = read_manifest(args.replay)
+        except (OSError, ValueError) as e:
+            parser.error(str(e))
+        if args.dry_run:
+            print_manifest(header, records, args.estimate_rate)
+            return
+        
+        from .client import make_client
+        from .replay import replay
+        
+        try:
+            client = make_client(
+                api_key, connect_timeout=args.connect_timeout, read_timeout=args.read_timeout, stripe_account=args.stripe_account
+            )
+        except ValueError as e:
+            parser.error(str(e))
+        replay(client, args.replay, id_map_path=args.id_map, concurrency=dict(args.concurrency))
+        return
+    
+    targets = list(args.shard)
+    if args.shards_file:
+        from .shards import read_targets_file
+        try:
+            targets += read_targets_file(args.shards_file)
+        except OSError as e:
+            parser.error(str(e))
+    if targets and args.resume:
+        parser.error("--resume continues a single shard; use it with that shard's --api-key or --stripe-account")
+    
+    if not args.resume:
+        try:
+            plan = resolve_plan(args, interactive and not args.dry_run)
+            if targets:
+                from .shards import parse_target
+                shards = [parse_target(target, api_key) for target in targets]
+                shard_plans = plan.split(len(shards))
+        except (OSError, ValueError) as e:
+            parser.error(str(e))
+        
+        if args.dry_run:
+            print_plan(plan)
+            print_estimate(plan, estimate_rate, None if targets else args.time_budget)
+            if targets:
+                # Every shard has its own rate limit and time budget, so the
+                # slowest one sets the duration
+                for index, (shard, shard_plan) in enumerate(zip(shards, shard_plans)):
+                    shard_requests = sum(estimate_requests(shard_plan).values())
+                    fits = (
+                        f", about {estimate_scale(shard_plan, args.time_budget, estimate_rate):.0%} fits the time budget"
+                        if args.time_budget else ""
+                    )
+                    print(
+                        f"  Shard {index + 1} ({shard['label']}): {shard_plan.products} products, "
+                        f"{shard_plan.customers} customers, {shard_plan.subscriptions} subscriptions, "
+                        f"{shard_requests} requests, ~{format_duration(shard_requests / estimate_rate)}{fits}"
+                    )
+            return
+    
+    if targets:
+        from .shards import populate_sharded
+        try:
+            populate_sharded(
+                plan,
+                targets,
+                api_key=api_key,
+                processes=args.processes,
+                cache_path=None if args.no_cache else CACHE_PATH,
+                sync_events=not args.no_cache_events,
+                client_options={"connect_timeout": args.connect_timeout, "read_timeout": args.read_timeout},
+                time_budget=args.time_budget,
+                target_rate=args.target_rate,
+            )
+        except ValueError as e:
+            parser.error(str(e))
+        return
+    
+    # stripe and faker are only imported once a run actually talks to Stripe
+    from .client import make_client
+    from .runner import populate
+    
+    try:
+        client = make_client(
+            api_key, connect_timeout=args.connect_timeout, read_timeout=args.read_timeout, stripe_account=args.stripe_account
+        )
+    except ValueError as e:
+        parser.error(str(e))
+    
+    populate(
+        plan,
+        client,
+        resume_run_id=args.resume,
+        cache_path=None if args.no_cache else CACHE_PATH,
+        sync_events=not args.no_cache_events,
+        metrics_textfile=args.metrics_textfile,
+        manifest_path=args.manifest,
+        time_budget=args.time_budget,
+        target_rate=args.target_rate,
+    )
@@ -0,0 +1,76 @@
+import ssl
+
+import stripe
+
+from .config import HTTP_CLIENT, RATE_LIMIT
+
+
+class PooledHTTPClient(stripe.HTTPXClient):
+    # The Stripe library's httpx client with an explicitly sized keep-alive
+    # pool and separate connect/read timeouts. httpx's trace hook counts how
+    # many requests had to open a new connection (and do a TLS handshake)
+    # instead of reusing one from the pool.
+    
+    def __init__(self, pool_size, connect_timeout, read_timeout, keepalive_expiry, **kwargs):
+        import httpx
+        
+        super().__init__(timeout=httpx.Timeout(read_timeout, connect=connect_timeout), **kwargs)
+        self.pool_size = pool_size
+        self.requests = 0
+        self.connections = 0
+        self.tls_handshakes = 0
+        
+        if self._verify_ssl_certs:
+            verify = ssl.create_default_context(cafile=stripe.ca_bundle_path)
+        else:
+            verify = False
+        self._client_async = httpx.AsyncClient(
+            verify=verify,
+            limits=httpx.Limits(
+                max_connections=pool_size,
+                max_keepalive_connections=pool_size,
+                keepalive_expiry=keepalive_expiry,
+            ),
+        )
+    
+    async def _trace(self, event_name, info):
+        if event_name == "connection.connect_tcp.complete":
+            self.connections += 1
+        elif event_name == "connection.start_tls.complete":
+            self.tls_handshakes += 1
+    
+    def _get_request_args_kwargs(self, method, url, headers, post_data):
+        self.requests += 1
+        args, kwargs = super()._get_request_args_kwargs(method, url, headers, post_data)
+        kwargs["extensions"] = {"trace": self._trace}
+        return args, kwargs
+
+
+class PooledStripeClient(stripe.StripeClient):
+    # StripeClient that keeps a reference to its pooled HTTP client, so a run
+    # can report connection reuse
+    
+    def __init__(self, api_key, http_client, **client_options):
+        super().__init__(api_key, http_client=http_client, **client_options)
+        self.http_client = http_client
+
+
+def validate_api_key(api_key):
+    if not api_key or not api_key.startswith('sk_test_'):
+        raise ValueError("Invalid API key. The key must start with 'sk_test_'")
+    return api_key
+
+
+def make_client(api_key, pool_size=None, connect_timeout=None, read_timeout=None, **client_options):
+    validate_api_key(api_key)
+    # Retries are owned by the rate limiter, so the Stripe library must not
+    # retry (and hide 429s) on its own
+    client_options.setdefault("max_network_retries", 0)
+    
+    http_client = PooledHTTPClient(
+        pool_size=pool_size or HTTP_CLIENT["pool_size"] or RATE_LIMIT["max_concurrency"],
+        connect_timeout=connect_timeout or HTTP_CLIENT["connect_timeout"],
+        read_timeout=read_timeout or HTTP_CLIENT["read_timeout"],
+        keepalive_expiry=HTTP_CLIENT["keepalive_expiry"],
+    )
+    return PooledStripeClient(api_key, http_client, **client_options)
@@ -0,0 +1,140 @@
+import math
+import random
+from array import array
+
+from .config import BILLING_INTERVALS, PAYMENT_METHODS_SUCCESS, SUBSCRIPTION_STATUS_DISTRIBUTION, TAX_TYPES, TEST_CLOCKS
+
+
+# Statuses in the order they are coded in a compiled plan's status array
+STATUSES = list(SUBSCRIPTION_STATUS_DISTRIBUTION)
+
+
+# Choices spread evenly over the planned items
+TAX_BEHAVIORS = ["inclusive", "exclusive"]
+TAX_RATES_PER_PRICE = range(0, 3)
+CARDS_PER_CUSTOMER = range(1, min(4, len(PAYMENT_METHODS_SUCCESS)) + 1)
+
+
+def allocate_quotas(total, weights):
+    # Largest remainder method: integer counts proportional to the weights
+    # that add up to exactly `total`
+    weight_sum = sum(weights)
+    shares = [total * weight / weight_sum for weight in weights]
+    counts = [int(share) for share in shares]
+    largest_remainders = sorted(range(len(weights)), key=lambda i: counts[i] - shares[i])
+    for i in largest_remainders[:total - sum(counts)]:
+        counts[i] += 1
+    return counts
+
+
+def shuffled_codes(counts, rng):
+    # Byte array holding code i counts[i] times, in random order
+    codes = array("B")
+    for code, count in enumerate(counts):
+        codes.extend(array("B", [code]) * count)
+    rng.shuffle(codes)
+    return codes
+
+
+def balanced_indexes(total, pool_size, rng):
+    # `total` indexes into a pool, in random order, each pool entry used
+    # total // pool_size or one more times
+    if pool_size == 0:
+        return array("I")
+    indexes = array("I", range(pool_size)) * (total // pool_size)
+    indexes.extend(rng.sample(range(pool_size), total % pool_size))
+    rng.shuffle(indexes)
+    return indexes
+
+
+def split_customers(num_customers):
+    # (normal, failing): 10% of new customers get the failing card
+    num_failing = int(num_customers * 0.10)
+    return num_customers - num_failing, num_failing
+
+
+def failing_statuses(plan):
+    # Statuses whose subscriptions go to failing-card customers. On test
+    # clocks unpaid ones do too, since only failed renewals make a
+    # subscription unpaid.
+    return ("past_due", "unpaid") if plan.history_months else ("past_due",)
+
+
+def count_statuses(plan):
+    # {status: subscriptions}, exactly as compile_plan allocates them
+    return dict(zip(STATUSES, allocate_quotas(plan.subscriptions, list(SUBSCRIPTION_STATUS_DISTRIBUTION.values()))))
+
+
+def count_test_clocks(plan):
+    return math.ceil(plan.customers / TEST_CLOCKS["customers_per_clock"]) if plan.history_months else 0
+
+
+def clock_index(customer_index):
+    # Customers fill the clocks in order, normal customers first
+    return customer_index // TEST_CLOCKS["customers_per_clock"]
+
+
+def compile_plan(plan, seed, customer_pool=None, failing_pool=None, price_pool=None):
+    # Decides every choice the run makes before any object is created, one
+    # compact array per attribute: statuses follow SUBSCRIPTION_STATUS_DISTRIBUTION
+    # exactly, and each subscription's customer and price are fixed by index
+    # into the pools it picks from (existing objects followed by new ones;
+    # by default only the new ones). The same plan, seed and pool sizes always
+    # compile to the same arrays, so a resumed run makes the same choices.
+    rng = random.Random(f"{seed}:plan")
+    num_normal, num_failing = split_customers(plan.customers)
+    customer_pool = plan.customers if customer_pool is None else customer_pool
+    failing_pool = num_failing if failing_pool is None else failing_pool
+    price_pool = plan.products if price_pool is None else price_pool
+    
+    statuses = shuffled_codes(allocate_quotas(plan.subscriptions, list(SUBSCRIPTION_STATUS_DISTRIBUTION.values())), rng)
+    
+    # Customers are handed out round robin, so the first subscriptions only
+    # wait for the first customers. Failing statuses go to failing customers
+    # when there are any.
+    failing_codes = {STATUSES.index(status) for status in failing_statuses(plan)} if failing_pool else set()
+    customers = array("I", bytes(4 * plan.subscriptions))
+    used = [0, 0]
+    for i, status in enumerate(statuses):
+        failing = status in failing_codes
+        customers[i] = used[failing] % (failing_pool if failing else customer_pool or 1)
+        used[failing] += 1
+    
+    return {
+        "failing_statuses": failing_statuses(plan),
+        "product_intervals": shuffled_codes(allocate_quotas(plan.products, [1] * len(BILLING_INTERVALS)), rng),
+        "product_tax_behaviors": shuffled_codes(allocate_quotas(plan.products, [1] * len(TAX_BEHAVIORS)), rng),
+        "product_tax_counts": shuffled_codes(allocate_quotas(plan.products, [1] * len(TAX_RATES_PER_PRICE)), rng),
+        "customer_cards": shuffled_codes(allocate_quotas(num_normal, [1] * len(CARDS_PER_CUSTOMER)), rng),
+        "subscription_statuses": statuses,
+        "subscription_customers": customers,
+        "subscription_prices": balanced_indexes(plan.subscriptions, price_pool, rng),
+    }
+
+
+def estimate_requests(plan, create_tax_rates=True):
+    # Create, attach, cancel and update calls per endpoint the plan takes.
+    # Quotas are exact, so this matches the compiled plan without building
+    # it; listing existing data, retries and polling test clocks come on top.
+    num_normal, num_failing = split_customers(plan.customers)
+    statuses = count_statuses(plan)
+    cards = allocate_quotas(num_normal, [1] * len(CARDS_PER_CUSTOMER))
+    num_test_clocks = count_test_clocks(plan)
+    
+    requests = {
+        "TestClock.create": num_test_clocks,
+        "TaxRate.create": len(TAX_TYPES) if create_tax_rates and plan.products else 0,
+        "Product.create": plan.products,
+        # Default prices come with their product
+        "Price.create": plan.products * (plan.prices_per_product - 1),
+        "Customer.create": plan.customers,
+        "PaymentMethod.attach": sum((count - 1) * customers for count, customers in zip(CARDS_PER_CUSTOMER, cards)),
+        "Subscription.create": plan.subscriptions - statuses["scheduled"],
+        # On test clocks, canceled subscriptions cancel themselves later on
+        "Subscription.cancel": 0 if plan.history_months else statuses["canceled"],
+        "Subscription.update": statuses["paused"],
+        "SubscriptionSchedule.create": statuses["scheduled"],
+        # At least; more if a step is refused and halved
+        "TestClock.advance": num_test_clocks * math.ceil(plan.history_months * 30 / TEST_CLOCKS["advance_days"]),
+    }
+    return {endpoint: count for endpoint, count in requests.items() if count}
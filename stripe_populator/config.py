@@ -0,0 +1,184 @@
+# Successful payment methods
+PAYMENT_METHODS_SUCCESS = [
+    {"type": "card", "token": "pm_card_visa", "brand": "Visa"},
+    {"type": "card", "token": "pm_card_mastercard", "brand": "Mastercard"},
+    {"type": "card", "token": "pm_card_amex", "brand": "American Express"},
+    {"type": "card", "token": "pm_card_discover", "brand": "Discover"},
+    {"type": "card", "token": "pm_card_diners", "brand": "Diners Club"},
+    {"type": "card", "token": "pm_card_jcb", "brand": "JCB"},
+    {"type": "card", "token": "pm_card_unionpay", "brand": "UnionPay"},
+    {"type": "us_bank_account", "token": "pm_usBankAccount", "brand": "US Bank Account"},
+]
+
+
+# Failing payment method
+PAYMENT_METHOD_FAILING = {"type": "card", "token": "pm_card_chargeCustomerFail", "brand": "Visa (Will Fail)"}
+
+
+# Standard billing intervals
+BILLING_INTERVALS = [
+    {"interval": "day", "interval_count": 1},
+    {"interval": "day", "interval_count": 7},
+    {"interval": "week", "interval_count": 1},
+    {"interval": "week", "interval_count": 2},
+    {"interval": "week", "interval_count": 4},
+    {"interval": "month", "interval_count": 1},
+    {"interval": "month", "interval_count": 2},
+    {"interval": "month", "interval_count": 3},
+    {"interval": "month", "interval_count": 6},
+    {"interval": "year", "interval_count": 1},
+    {"interval": "year", "interval_count": 2},
+]
+
+
+# Currencies of a product's prices. The default price is in the first one,
+# and subscriptions only use that, since Stripe bills a customer in a single
+# currency; the others are there for checkout and pricing table tests.
+CATALOG_CURRENCIES = ["usd", "eur", "gbp"]
+
+
+# Tax types to create
+TAX_TYPES = [
+    {"display_name": "Sales Tax", "percentage": 7.25, "inclusive": False, "description": "US Sales Tax"},
+    {"display_name": "Sales Tax Inclusive", "percentage": 8.5, "inclusive": True, "description": "US Sales Tax (Inclusive)"},
+    {"display_name": "VAT", "percentage": 20, "inclusive": False, "description": "UK VAT"},
+    {"display_name": "VAT Inclusive", "percentage": 19, "inclusive": True, "description": "Germany VAT (Inclusive)"},
+    {"display_name": "GST", "percentage": 5, "inclusive": False, "description": "Canada GST"},
+    {"display_name": "GST Inclusive", "percentage": 10, "inclusive": True, "description": "Australia GST (Inclusive)"},
+]
+
+
+# Subscription status distribution
+SUBSCRIPTION_STATUS_DISTRIBUTION = {
+    "active": 0.35,
+    "active_with_end": 0.10,
+    "trialing": 0.12,
+    "past_due": 0.08,
+    "canceled": 0.12,
+    "unpaid": 0.08,
+    "paused": 0.10,
+    "scheduled": 0.05,
+}
+
+
+# Lifecycle changes --churn makes to existing subscriptions, mixed in these
+# proportions: moving to a more or less expensive price, pausing collection,
+# setting a future cancel_at, cancelling, and starting new trialing
+# subscriptions for existing customers
+CHURN_MUTATION_DISTRIBUTION = {
+    "upgrade": 0.25,
+    "downgrade": 0.15,
+    "pause": 0.10,
+    "cancel_at": 0.15,
+    "cancel": 0.10,
+    "new_trial": 0.25,
+}
+
+
+# Default request rate and duration (seconds) of --churn, and the most
+# requests it keeps in flight; a request due while that many are still
+# waiting for Stripe is dropped and counted instead of delaying the schedule
+CHURN = {
+    "requests_per_second": 10,
+    "duration": 60,
+    "max_in_flight": 200,
+}
+
+
+# Maximum number of items worked on at once in each phase ("inventory" is the
+# number of parallel list workers fetching existing data). The adaptive rate
+# limiter decides how many requests are actually in flight.
+PHASE_CONCURRENCY = {
+    "inventory": 8,
+    "tax_rates": 6,
+    "products": 25,
+    "customers": 25,
+    "subscriptions": 25,
+    "test_clocks": 25,
+    "purge": 25,
+    "replay": 25,
+}
+
+
+# Starting point and bounds for the shared adaptive rate limiter
+RATE_LIMIT = {
+    "requests_per_second": 20,
+    "min_requests_per_second": 1,
+    "max_requests_per_second": 100,
+    "initial_concurrency": 8,
+    "max_concurrency": 50,
+    "additive_increase": 5,
+    "max_retries": 6,
+    "base_backoff": 0.5,
+    "max_backoff": 30,
+}
+
+
+# Test clocks for --history-months: customers per clock (Stripe caps how many
+# a clock can hold), days a clock is moved forward per step (halved when a
+# subscription bills more often than that allows), and seconds between polls
+# while Stripe catches up with an advanced clock
+TEST_CLOCKS = {
+    "customers_per_clock": 3,
+    "advance_days": 30,
+    "poll_interval": 2,
+}
+
+
+# Request rate a dry run's duration estimate assumes unless told otherwise:
+# Stripe's limit in test mode
+ESTIMATE_REQUESTS_PER_SECOND = 25
+
+
+# --time-budget: share of the budget kept for finishing the items in progress,
+# status follow-ups, advancing test clocks and the audit; seconds before the
+# first rescale (at most a tenth of the budget) and between rescales; seconds of requests the throughput is
+# measured over, and the shortest stretch of them its peak is taken over;
+# items a phase completes before its own cost per item is used; and the
+# smallest change in scale that is applied
+TIME_BUDGET = {
+    "reserve": 0.1,
+    "warmup": 10,
+    "interval": 1,
+    "window": 30,
+    "peak": 5,
+    "min_items": 5,
+    "min_change": 0.02,
+}
+
+
+# Keep-alive connection pool and timeouts (seconds) of the HTTP client every
+# Stripe request goes through. The pool defaults to one connection per request
+# the rate limiter can have in flight (max_concurrency).
+HTTP_CLIENT = {
+    "pool_size": None,
+    "connect_timeout": 10,
+    "read_timeout": 80,
+    "keepalive_expiry": 60,
+}
+
+
+# Upper bounds (seconds) of the request latency histogram buckets in the
+# metrics report
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+# Seconds between progress lines of a phase
+PROGRESS_INTERVAL = 2
+
+
+# Metadata key holding the run ID on every object a run creates
+RUN_METADATA_KEY = "populate_run"
+
+
+# Directory holding the append-only journal of each population run
+RUNS_DIRECTORY = ".populate_runs"
+
+
+# Local SQLite index of each account's inventory, synced incrementally
+CACHE_PATH = ".populate_cache/inventory.sqlite3"
+
+
+# Stripe keeps events for 30 days; a cache last synced before that can't be
+# brought up to date from events and is rebuilt instead
+EVENT_RETENTION_SECONDS = 30 * 24 * 60 * 60
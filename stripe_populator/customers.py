@@ -0,0 +1,152 @@
+import asyncio
+
+from .compiler import CARDS_PER_CUSTOMER, clock_index, split_customers
+from .config import PAYMENT_METHOD_FAILING, PAYMENT_METHODS_SUCCESS
+from .engine import run_concurrently
+from .profiles import ProfilePool, build_customer_profile, generate_customer_params, item_random
+
+
+def count_customer_requests(customers):
+    # Customers completed before the single-call builder took create + one
+    # attach per card + a default update
+    return sum(customer.get("requests", len(customer["payment_methods"]) + 2) for customer in customers)
+
+
+async def create_customers_with_payment_methods(session, num_customers, journal, compiled, concurrency=None, pipeline=None,
+                                                test_clocks=None):
+    if num_customers == 0:
+        print("\nSkipping customer creation (0 requested)")
+        return [], []
+    
+    concurrency = concurrency or session.concurrency["customers"]
+    print(f"\nCreating {num_customers} NEW customers with payment methods ({concurrency} in flight)...")
+    
+    num_normal, num_failing = split_customers(num_customers)
+    customers_api = session.client.v1.customers
+    payment_methods_api = session.client.v1.payment_methods
+    
+    def default_payment_method(customer):
+        # The default's ID, or None if Stripe didn't set one
+        default = customer.invoice_settings.default_payment_method if customer.invoice_settings else None
+        return default if default is None or isinstance(default, str) else default.id
+    
+    async def create_customer(phase, i, customer_params, token):
+        # The first card is attached and made the invoice default by the create
+        # call itself, so a customer with one card costs a single request
+        customer_params = {
+            **customer_params,
+            "metadata": {**customer_params.get("metadata", {}), **journal.metadata},
+            "payment_method": token,
+            "invoice_settings": {"default_payment_method": token},
+        }
+        if test_clocks is not None:
+            # test_clocks is a PlannedObjects of this run's clocks
+            test_clock_id = await test_clocks.get(clock_index(i if phase == "customers_normal" else num_normal + i))
+            if test_clock_id is None:
+                raise RuntimeError("its test clock could not be created")
+            customer_params["test_clock"] = test_clock_id
+        
+        customer = await session.call(
+            customers_api.create_async,
+            params=customer_params,
+            options=journal.options(phase, i),
+        )
+        return customer, default_payment_method(customer)
+    
+    async def create_normal_customer(i, _):
+        try:
+            rng = item_random(journal, "customers_normal", i)
+            customer_params = generate_customer_params(await normal_profiles.get(i))
+            num_payment_methods = CARDS_PER_CUSTOMER[compiled["customer_cards"][i]]
+            selected_methods = rng.sample(PAYMENT_METHODS_SUCCESS, k=num_payment_methods)
+            # The create call attaches the default, and a customer whose create
+            # fails is lost, so the default is always a card. Bank accounts are
+            # only attached afterwards, where a failure costs just that method.
+            selected_methods.sort(key=lambda pm_data: pm_data["type"] != "card")
+            
+            customer, default_id = await create_customer("customers_normal", i, customer_params, selected_methods[0]["token"])
+            
+            # Any further cards are attached at the same time
+            extra_methods = selected_methods[1:]
+            attached = await asyncio.gather(
+                *(
+                    session.call(
+                        payment_methods_api.attach_async,
+                        pm_data["token"],
+                        params={"customer": customer.id},
+                        options=journal.options("customers_normal", i, f"attach-{idx}"),
+                    )
+                    for idx, pm_data in enumerate(extra_methods, start=1)
+                ),
+                return_exceptions=True,
+            )
+            
+            attached_payment_methods = [default_id] if default_id else []
+            for pm_data, payment_method in zip(extra_methods, attached):
+                if isinstance(payment_method, Exception):
+                    print(f"  ⚠ Failed to attach {pm_data['brand']}: {payment_method}")
+                else:
+                    attached_payment_methods.append(payment_method.id)
+            
+            return {
+                "id": customer.id,
+                "payment_methods": attached_payment_methods,
+                "type": "normal",
+                "requests": 1 + len(extra_methods),
+            }
+                
+        except Exception as e:
+            print(f"✗ Error creating customer {i+1}: {e}")
+    
+    async def create_failing_customer(i, _):
+        try:
+            customer_params = generate_customer_params(await failing_profiles.get(i), failing=True)
+            
+            # pm_card_chargeCustomerFail attaches fine and only fails when charged
+            customer, default_id = await create_customer(
+                "customers_failing", i, customer_params, PAYMENT_METHOD_FAILING["token"]
+            )
+            
+            return {
+                "id": customer.id,
+                "payment_methods": [default_id] if default_id else [],
+                "type": "failing",
+                "requests": 1,
+            }
+                
+        except Exception as e:
+            print(f"✗ Error creating failing customer {i+1}: {e}")
+    
+    # Both kinds are created side by side, so subscriptions waiting for a
+    # failing customer don't wait for every normal one first
+    print(f"\n→ Creating {num_normal} customers with VALID payment methods...")
+    print(f"→ Creating {num_failing} customers with FAILING payment method (pm_card_chargeCustomerFail)...")
+    normal_profiles = ProfilePool(
+        "customers_normal", build_customer_profile, journal.seed, num_normal, journal.first_pending("customers_normal"),
+        metrics=session.metrics,
+    )
+    failing_profiles = ProfilePool(
+        "customers_failing", build_customer_profile, journal.seed, num_failing, journal.first_pending("customers_failing"),
+        metrics=session.metrics,
+    )
+    try:
+        customers_normal, customers_failing = await asyncio.gather(
+            run_concurrently(
+                range(num_normal), create_normal_customer, concurrency, journal, "customers_normal", pipeline, session.metrics,
+                session.budget,
+            ),
+            run_concurrently(
+                range(num_failing), create_failing_customer, concurrency, journal, "customers_failing", pipeline, session.metrics,
+                session.budget,
+            ),
+        )
+    finally:
+        normal_profiles.close()
+        failing_profiles.close()
+    
+    created = customers_normal + customers_failing
+    num_requests = count_customer_requests(created)
+    if created:
+        print(f"\n✓ {len(created)} customers took {num_requests} API requests ({num_requests / len(created):.2f} per customer)")
+    
+    return customers_normal, customers_failing
@@ -0,0 +1,221 @@
+import asyncio
+import contextvars
+import time
+
+from .config import PHASE_CONCURRENCY, RATE_LIMIT, TIME_BUDGET
+from .metrics import Metrics, endpoint_name
+from .ratelimit import AdaptiveRateLimiter
+
+
+# Phase of the run_concurrently() worker a request is made from, so a time
+# budget can tell what each phase costs
+current_phase = contextvars.ContextVar("current_phase", default=None)
+
+
+# What the pipeline resolves an item to that a time budget left out, as
+# opposed to None for an item that failed
+DROPPED = object()
+
+
+class Session:
+    # The Stripe client, shared rate limiter, per-phase concurrency and
+    # metrics used by every fetch and create function of a population run.
+    # With a manifest, every request that builds the dataset is recorded.
+    # With a RunBudget, the phases it covers are fitted into its time.
+    
+    def __init__(self, client, rate_limiter=None, concurrency=None, metrics=None, manifest=None, budget=None):
+        self.client = client
+        self.rate_limiter = rate_limiter or AdaptiveRateLimiter(**RATE_LIMIT)
+        self.concurrency = {**PHASE_CONCURRENCY, **(concurrency or {})}
+        self.metrics = metrics or Metrics()
+        self.manifest = manifest
+        self.budget = budget
+    
+    async def call(self, method, *args, **kwargs):
+        endpoint = endpoint_name(method)
+        self.metrics.record_call(endpoint)
+        if self.budget is not None:
+            self.budget.record_request(current_phase.get())
+        
+        # Every attempt, including the ones the rate limiter retries, is timed
+        async def attempt(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                result = await method(*args, **kwargs)
+            except Exception as e:
+                self.metrics.record_attempt(endpoint, time.perf_counter() - started, e)
+                raise
+            self.metrics.record_attempt(endpoint, time.perf_counter() - started)
+            return result
+        
+        result = await self.rate_limiter.call(attempt, *args, **kwargs)
+        if self.manifest is not None:
+            self.manifest.record(endpoint, args, kwargs, result)
+        return result
+    
+    async def list_all(self, list_method, params=None):
+        # Pages through a list endpoint with every page request going through
+        # the shared rate limiter, instead of letting auto_paging_iter() fetch
+        # pages behind its back.
+        params = {"limit": 100, **(params or {})}
+        while True:
+            page = await self.call(list_method, params=params)
+            for item in page.data:
+                yield item
+            if not page.has_more or not page.data:
+                return
+            params["starting_after"] = page.data[-1].id
+
+
+class Pipeline:
+    # Results of the objects a run creates, by (phase, index). All phases run
+    # at the same time and an item that needs an object from another phase
+    # (a subscription needs its customer and price) waits for that one object
+    # instead of for the whole phase. run_concurrently() resolves an item as
+    # soon as it finishes or is found in the journal; failed items resolve
+    # to None, and items a time budget left out to DROPPED.
+    
+    def __init__(self):
+        self._futures = {}
+    
+    def _future(self, phase, index):
+        key = (phase, index)
+        if key not in self._futures:
+            self._futures[key] = asyncio.get_running_loop().create_future()
+        return self._futures[key]
+    
+    def resolve(self, phase, index, result):
+        future = self._future(phase, index)
+        if not future.done():
+            future.set_result(result)
+    
+    async def wait(self, phase, index, timeout=None):
+        # Raises asyncio.TimeoutError after `timeout` seconds; the item can
+        # still be waited for again
+        future = self._future(phase, index)
+        if timeout is None:
+            return await future
+        return await asyncio.wait_for(asyncio.shield(future), timeout)
+
+
+class PlannedObjects:
+    # Existing objects followed by the ones this run plans to create, so that
+    # an item can pick by index before the new ones exist. `phases` lists
+    # (phase, count) in order; `field` picks one value out of a new item's
+    # result. With a time budget, only the new objects within their phase's
+    # quota count, and an index beyond them wraps around to one of those.
+    # Quotas change while an object is waited for, so where the index points
+    # is looked up again every TIME_BUDGET["interval"] seconds and once the
+    # object is left out.
+    
+    def __init__(self, pipeline, num_existing, existing_at, phases, field=None, budget=None):
+        self.pipeline = pipeline
+        self.num_existing = num_existing
+        self.existing_at = existing_at
+        self.phases = phases
+        self.field = field
+        self.budget = budget
+    
+    def _counts(self):
+        if self.budget is None:
+            return self.phases
+        return [(phase, self.budget.quota(phase, count)) for phase, count in self.phases]
+    
+    def __len__(self):
+        return self.num_existing + sum(count for _, count in self._counts())
+    
+    async def get(self, index):
+        while True:
+            size = len(self)
+            if size == 0:
+                return None
+            wrapped = index % size
+            if wrapped < self.num_existing:
+                return self.existing_at(wrapped)
+            
+            position = wrapped - self.num_existing
+            for phase, count in self._counts():
+                if position < count:
+                    break
+                position -= count
+            try:
+                result = await self.pipeline.wait(phase, position, TIME_BUDGET["interval"] if self.budget else None)
+            except asyncio.TimeoutError:
+                continue
+            if result is DROPPED:
+                if self.budget is None:
+                    return None
+                continue
+            if result is not None and self.field:
+                return result[self.field]
+            return result
+
+
+async def run_concurrently(items, worker, concurrency, journal=None, phase=None, pipeline=None, metrics=None, budget=None,
+                          order=None):
+    # Keeps up to `concurrency` workers pulling from one shared iterator, so
+    # there are never more than `concurrency` items (and requests) in flight.
+    # Workers handle their own errors and return None for failed items.
+    # Items already completed in the journal are skipped and their recorded
+    # results reused; newly completed ones are recorded as they finish. The
+    # shared iterator is the phase's bounded queue: items are only taken from
+    # it when a worker is free. With metrics, progress is reported as a
+    # periodic line per phase rather than per item. Items are started in
+    # index order, or in `order` (a sequence of indexes) if given. With a
+    # time budget, a worker waits at an item beyond the phase's quota until
+    # the quota grows; once the budget expires, the phase stops there and
+    # the items it left out resolve to DROPPED, as do items whose worker
+    # returns DROPPED because the budget left out what they depend on.
+    results = [None] * len(items)
+    done = journal.completed_in(phase) if journal else {}
+    for index, result in done.items():
+        if index < len(items):
+            results[index] = result
+            if pipeline:
+                pipeline.resolve(phase, index, result)
+    
+    if done:
+        print(f"  ↺ Skipping {len(done)} items already completed in run {journal.run_id}")
+    
+    if order is None:
+        pending = ((index, item) for index, item in enumerate(items) if index not in done)
+    else:
+        pending = ((index, items[index]) for index in order if index not in done)
+    skipped = sum(1 for index in done if index < len(items))
+    progress = metrics.phase(phase, len(items), skipped) if metrics else None
+    dropped = []
+    if budget:
+        budget.record_skipped(phase, skipped)
+    
+    async def consume():
+        current_phase.set(phase)
+        for index, item in pending:
+            if budget and not await budget.wait(lambda: budget.take(phase, index)):
+                dropped.append(index)
+                return
+            result = await worker(index, item)
+            if result is DROPPED:
+                dropped.append(index)
+                if pipeline:
+                    pipeline.resolve(phase, index, DROPPED)
+                continue
+            results[index] = result
+            if journal and results[index] is not None:
+                journal.record(phase, index, results[index])
+            if pipeline:
+                pipeline.resolve(phase, index, results[index])
+            if budget:
+                budget.record_done(phase)
+            if progress:
+                progress.advance(results[index] is not None)
+    
+    num_workers = max(1, min(concurrency, len(items)))
+    await asyncio.gather(*(consume() for _ in range(num_workers)))
+    dropped.extend(index for index, _ in pending)
+    if pipeline:
+        for index in dropped:
+            pipeline.resolve(phase, index, DROPPED)
+    if progress:
+        progress.finish(len(dropped))
+    
+    return [result for result in results if result is not None]
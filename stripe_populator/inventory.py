@@ -0,0 +1,368 @@
+import asyncio
+import random
+import time
+
+from .config import EVENT_RETENTION_SECONDS
+from .registry import CustomerRegistry
+
+
+# No Stripe object is older than this, so it bounds the first `created` window
+EARLIEST_CREATED = 1262304000  # 2010-01-01
+
+
+# Event types that change cached inventory without creating anything
+CACHE_EVENT_TYPES = ["customer.deleted", "price.updated", "price.deleted", "tax_rate.updated"]
+
+
+# The payment_type metadata the populator gives its customers, and the
+# registry type of each
+CUSTOMER_PAYMENT_TYPES = {"card": "normal", "failing_card": "failing"}
+
+
+# Search only sees objects about a minute after they are created, so
+# discovery goes back over the last hour again next time
+SEARCH_DELAY = 3600
+
+
+async def list_partitioned(session, list_method, handle_page, params=None, workers=None, created_after=None):
+    # Lists every object of an endpoint with several workers in parallel,
+    # passing each page to handle_page() as it arrives instead of collecting
+    # the whole list. Work is split by `created` range on demand: a worker
+    # that finds more pages in its window keeps paging the newer half and
+    # queues the older half for an idle worker, so busy periods get spread out
+    # without knowing how the account's objects are distributed over time.
+    workers = workers or session.concurrency["inventory"]
+    windows = asyncio.Queue()
+    windows.put_nowait((created_after or EARLIEST_CREATED, int(time.time()) + 1))
+    errors = []
+    
+    async def fetch_window(start, end):
+        page_params = {"limit": 100, **(params or {}), "created": {"gte": start, "lt": end}}
+        while True:
+            page = await session.call(list_method, params=page_params)
+            if page.data:
+                handle_page(page.data)
+            if not page.has_more or not page.data:
+                return
+            
+            # Pages are newest first, so everything left is older than the last
+            # object. Objects created before `middle` go to another worker.
+            oldest = page.data[-1].created
+            middle = (start + oldest) // 2
+            if middle > start:
+                windows.put_nowait((start, middle))
+                start = middle
+                page_params["created"] = {"gte": start, "lt": end}
+            page_params["starting_after"] = page.data[-1].id
+    
+    async def worker():
+        while True:
+            start, end = await windows.get()
+            try:
+                if not errors:
+                    await fetch_window(start, end)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                windows.task_done()
+    
+    tasks = [asyncio.create_task(worker()) for _ in range(workers)]
+    try:
+        await windows.join()
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    
+    if errors:
+        raise errors[0]
+
+
+async def fetch_existing_customers(session, customers, exclude=()):
+    print("Fetching existing customers from Stripe...")
+    found = len(customers)
+    
+    def add_page(page):
+        for customer in page:
+            if customer.id not in exclude:
+                customers.add(customer.id)
+    
+    try:
+        await list_partitioned(session, session.client.v1.customers.list_async, add_page)
+        
+        found = len(customers) - found
+        print(f"✓ Found {found} existing customers ({customers.memory_size() / 1e6:.1f} MB in memory)")
+    except Exception as e:
+        print(f"✗ Error fetching customers: {e}")
+    
+    return customers
+
+
+async def find_oldest_created(session, list_method, newest, probes=None):
+    # Narrows down when the oldest object was created with rounds of
+    # `probes` parallel limit=1 requests, each asking whether anything was
+    # created before a point of the remaining range. A thousandth of the
+    # account's lifetime is close enough to sample from.
+    probes = probes or session.concurrency["inventory"]
+    low, high = EARLIEST_CREATED, newest
+    while high - low > max(1, (newest - high) // 1000):
+        step = max(1, (high - low) // (probes + 1))
+        points = list(range(low + step, high, step))[:probes]
+        pages = await asyncio.gather(*(
+            session.call(list_method, params={"limit": 1, "created": {"lt": point}}) for point in points
+        ))
+        # Everything before the first point with an older object is empty
+        for point, page in zip(points, pages):
+            if page.data:
+                high = point
+                break
+            low = point
+    return low
+
+
+async def sample_customers(session, customers, count, exclude=(), rng=None, oversample=2):
+    # Adds a random sample of `count` existing customers to the registry
+    # without listing the whole account: pages of up to 100 customers are
+    # read just before random points of the account's lifetime, until
+    # `oversample` times `count` distinct customers have been seen or a
+    # round finds no new ones, and `count` of them are kept by reservoir
+    # sampling. Customers after a quiet period are somewhat more likely to
+    # be picked than under full enumeration, which is the price of reading a
+    # few pages instead of all of them.
+    if count == 0:
+        return customers
+    print(f"Sampling {count} existing customers from Stripe...")
+    rng = rng or random.Random()
+    list_method = session.client.v1.customers.list_async
+    
+    try:
+        first_page = await session.call(list_method, params={"limit": 100})
+        if not first_page.data:
+            print("✓ Found 0 existing customers")
+            return customers
+        newest = first_page.data[0].created + 1
+        oldest = newest if not first_page.has_more else await find_oldest_created(session, list_method, newest)
+        
+        seen = set()
+        reservoir = []
+        
+        def add_page(page):
+            added = 0
+            for customer in page:
+                if customer.id in seen or customer.id in exclude:
+                    continue
+                seen.add(customer.id)
+                added += 1
+                # Algorithm R: the n-th customer seen replaces a random kept
+                # one with probability count / n
+                if len(reservoir) < count:
+                    reservoir.append(customer.id)
+                else:
+                    slot = rng.randrange(len(seen))
+                    if slot < count:
+                        reservoir[slot] = customer.id
+            return added
+        
+        add_page(first_page.data)
+        probes = session.concurrency["inventory"]
+        while first_page.has_more and len(seen) < oversample * count:
+            points = [rng.randint(oldest + 1, newest) for _ in range(probes)]
+            pages = await asyncio.gather(*(
+                session.call(list_method, params={"limit": 100, "created": {"lt": point}}) for point in points
+            ))
+            if not sum(add_page(page.data) for page in pages):
+                break
+        
+        for customer_id in reservoir:
+            customers.add(customer_id)
+        print(f"✓ Sampled {len(reservoir)} existing customers out of {len(seen)} seen")
+    except Exception as e:
+        print(f"✗ Error sampling customers: {e}")
+    
+    return customers
+
+
+async def discover_customers(session, customers, counts, since=None, exclude=(), windows=4):
+    # Finds the customers the populator created earlier, by their
+    # payment_type metadata, with the Search API instead of listing the
+    # account: failing-card customers, which past_due subscriptions can reuse,
+    # and customers with a working default card. Each payment type is
+    # searched in `windows` created ranges at the same time, and every window
+    # stops paging once counts[type] customers of that type are found (None
+    # finds them all). Found customers are added to the registry, working
+    # cards first. Returns whether every window was searched to its end.
+    print("Discovering populated customers with the Search API...")
+    search_method = session.client.v1.customers.search_async
+    now = int(time.time()) + 1
+    start = since or EARLIEST_CREATED
+    step = (now - start) // windows + 1
+    found = {customer_type: CustomerRegistry() for customer_type in CUSTOMER_PAYMENT_TYPES.values()}
+    complete = True
+    
+    def enough(customer_type):
+        count = counts.get(customer_type)
+        return count is not None and len(found[customer_type]) >= count
+    
+    async def search_window(payment_type, low, high):
+        nonlocal complete
+        customer_type = CUSTOMER_PAYMENT_TYPES[payment_type]
+        params = {"query": f"metadata['payment_type']:'{payment_type}' AND created>={low} AND created<{high}", "limit": 100}
+        if enough(customer_type):
+            complete = False
+            return
+        while True:
+            page = await session.call(search_method, params=params)
+            for customer in page.data:
+                if customer.id in exclude:
+                    continue
+                if enough(customer_type):
+                    complete = False
+                    return
+                found[customer_type].add(customer.id, customer_type)
+            if not page.has_more or not page.next_page:
+                return
+            params["page"] = page.next_page
+    
+    try:
+        await asyncio.gather(*(
+            search_window(payment_type, low, min(low + step, now))
+            for payment_type in CUSTOMER_PAYMENT_TYPES
+            for low in range(start, now, step)
+        ))
+        print(f"✓ Discovered {len(found['failing'])} failing-card and {len(found['normal'])} card customers")
+    except Exception as e:
+        print(f"✗ Error discovering customers: {e}")
+        complete = False
+    
+    for customer_type in CustomerRegistry.TYPES:
+        for customer_id in found[customer_type]:
+            customers.add(customer_id, customer_type)
+    return complete
+
+
+async def fetch_existing_products_and_prices(session, exclude=()):
+    print("\nFetching existing products and prices from Stripe...")
+    products_with_prices = []
+    
+    def add_page(page):
+        for price in page:
+            if price.recurring and price.id not in exclude:
+                products_with_prices.append({
+                    "product_id": price.product.id if hasattr(price.product, 'id') else price.product,
+                    "price_id": price.id,
+                    "tax_rates": [],
+                    "tax_behavior": price.tax_behavior or "unspecified"
+                })
+    
+    try:
+        params = {"active": True, "type": "recurring"}
+        await list_partitioned(session, session.client.v1.prices.list_async, add_page, params)
+        
+        print(f"✓ Found {len(products_with_prices)} active recurring prices")
+    except Exception as e:
+        print(f"✗ Error fetching products/prices: {e}")
+    
+    return products_with_prices
+
+
+async def fetch_existing_tax_rates(session, exclude=()):
+    print("\nFetching existing tax rates from Stripe...")
+    tax_rates_by_type = {
+        "inclusive": [],
+        "exclusive": []
+    }
+    
+    try:
+        async for tax_rate in session.list_all(session.client.v1.tax_rates.list_async, {"active": True}):
+            if tax_rate.id in exclude:
+                continue
+            if tax_rate.inclusive:
+                tax_rates_by_type["inclusive"].append(tax_rate.id)
+            else:
+                tax_rates_by_type["exclusive"].append(tax_rate.id)
+        
+        total = len(tax_rates_by_type["inclusive"]) + len(tax_rates_by_type["exclusive"])
+        print(f"✓ Found {total} existing tax rates")
+    except Exception as e:
+        print(f"✗ Error fetching tax rates: {e}")
+    
+    return tax_rates_by_type
+
+
+async def get_account_id(session):
+    account = await session.call(session.client.v1.accounts.retrieve_current_async)
+    return account.id
+
+
+async def sync_inventory_cache(session, cache, apply_events=True):
+    # Brings the local inventory cache up to date: only objects created since
+    # the last sync are listed, and deletions/deactivations since then are
+    # applied from the events API. A cache whose events have expired is
+    # rebuilt from scratch.
+    print(f"Syncing inventory cache for {cache.account_id}...")
+    sync_started = int(time.time())
+    events_cursor = cache.get_cursor("events")
+    applied_events = 0
+    
+    if apply_events:
+        if events_cursor is None or sync_started - events_cursor > EVENT_RETENTION_SECONDS:
+            if cache.get_cursor("customers") is not None:
+                print("  ⚠ Cache is too old to update from events, rebuilding it")
+            cache.clear()
+        else:
+            params = {"created": {"gte": events_cursor}, "types": CACHE_EVENT_TYPES}
+            async for event in session.list_all(session.client.v1.events.list_async, params):
+                applied_events += cache.apply_event(event)
+    
+    added = {}
+    
+    def sync_customers(page):
+        added = cache.add_customers({"id": customer.id, "type": "normal", "created": customer.created} for customer in page)
+        return added, max(customer.created for customer in page)
+    
+    def sync_prices(page):
+        prices = [
+            {
+                "product_id": price.product.id if hasattr(price.product, 'id') else price.product,
+                "price_id": price.id,
+                "tax_behavior": price.tax_behavior or "unspecified",
+                "created": price.created,
+            }
+            for price in page
+            if price.recurring
+        ]
+        return cache.add_prices(prices), max(price.created for price in page)
+    
+    def sync_tax_rates(page):
+        added = cache.add_tax_rates({"id": tax_rate.id, "inclusive": tax_rate.inclusive, "created": tax_rate.created} for tax_rate in page)
+        return added, max(tax_rate.created for tax_rate in page)
+    
+    kinds = [
+        ("customers", session.client.v1.customers.list_async, {}, sync_customers),
+        ("prices", session.client.v1.prices.list_async, {"active": True, "type": "recurring"}, sync_prices),
+        ("tax_rates", session.client.v1.tax_rates.list_async, {"active": True}, sync_tax_rates),
+    ]
+    
+    for kind, list_method, params, sync_page in kinds:
+        cursor = cache.get_cursor(kind)
+        newest = [cursor or 0]
+        added[kind] = 0
+        
+        def handle_page(page):
+            count, page_newest = sync_page(page)
+            added[kind] += count
+            newest[0] = max(newest[0], page_newest)
+        
+        # `gte` rather than `gt`: objects created in the same second as the
+        # cursor after the last sync are listed again and ignored if known
+        await list_partitioned(session, list_method, handle_page, params, created_after=cursor)
+        if newest[0]:
+            cache.set_cursor(kind, newest[0])
+    
+    if apply_events:
+        cache.set_cursor("events", sync_started)
+    
+    print(
+        f"✓ Cache synced: +{added['customers']} customers, +{added['prices']} prices, "
+        f"+{added['tax_rates']} tax rates, {applied_events} changes from events"
+    )
@@ -0,0 +1,126 @@
+import json
+import os
+import time
+import uuid
+from datetime import datetime
+
+from .config import RUN_METADATA_KEY, RUNS_DIRECTORY
+from .plan import Plan
+
+
+class RunJournal:
+    # Append-only JSONL log of a population run. The first line records the
+    # run's plan, every following line one completed item. Reloading it with
+    # --resume <run-id> lets the run skip the items already done.
+    
+    def __init__(self, run_id, plan, started_at, completed=None, existing_customers=None, directory=RUNS_DIRECTORY):
+        self.run_id = run_id
+        self.plan = plan
+        self.started_at = started_at
+        self.completed = completed or {}
+        self.existing_customers = existing_customers
+        self.path = os.path.join(directory, f"{run_id}.jsonl")
+    
+    @classmethod
+    def start(cls, plan, directory=RUNS_DIRECTORY):
+        run_id = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        journal = cls(run_id, plan, time.time(), directory=directory)
+        
+        os.makedirs(directory, exist_ok=True)
+        journal._append({"event": "start", "run_id": run_id, "started_at": journal.started_at, "plan": plan})
+        return journal
+    
+    @classmethod
+    def load(cls, run_id, directory=RUNS_DIRECTORY):
+        path = os.path.join(directory, f"{run_id}.jsonl")
+        if not os.path.exists(path):
+            raise ValueError(f"No journal found for run {run_id} ({path})")
+        
+        header = None
+        completed = {}
+        existing_customers = None
+        with open(path, encoding="utf-8") as journal_file:
+            for line in journal_file:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # The last line may be cut off if the run died while writing it
+                    continue
+                if entry.get("event") == "start":
+                    header = entry
+                elif entry.get("event") == "completed":
+                    completed.setdefault(entry["phase"], {})[entry["index"]] = entry["result"]
+                elif entry.get("event") == "existing_customers":
+                    existing_customers = entry["customers"]
+        
+        if header is None:
+            raise ValueError(f"Journal {path} has no start entry")
+        
+        return cls(run_id, header["plan"], header["started_at"], completed, existing_customers, directory=directory)
+    
+    def population_plan(self):
+        # The plan to continue with --resume. Replay, churn and benchmark runs
+        # keep journals too, but only population runs can be resumed.
+        if "create_tax_rates" not in self.plan:
+            kind = next((kind for kind in ("replay", "churn", "benchmark") if kind in self.plan), None)
+            described = f"a {kind} run" if kind else "not a population run"
+            raise ValueError(f"Run {self.run_id} is {described}; only population runs can be resumed")
+        try:
+            return Plan.from_dict({key: value for key, value in self.plan.items() if key != "create_tax_rates"})
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"Run {self.run_id} can't be resumed, its journal has an invalid plan: {e}")
+    
+    def _append(self, entry):
+        with open(self.path, "a", encoding="utf-8") as journal_file:
+            journal_file.write(json.dumps(entry) + "\n")
+    
+    def record(self, phase, index, result):
+        self.completed.setdefault(phase, {})[index] = result
+        self._append({"event": "completed", "phase": phase, "index": index, "result": result})
+    
+    def record_existing_customers(self, customers):
+        # The existing customers the run hands out, as [id, type] pairs in
+        # registry order. Sampling and listing don't give the same customers
+        # twice, so a resumed run reloads these for the plan's customer
+        # indexes to keep pointing at the same customers.
+        self.existing_customers = [[customer_id, customer_type] for customer_id, customer_type in customers.items()]
+        self._append({"event": "existing_customers", "customers": self.existing_customers})
+    
+    def completed_in(self, phase):
+        return self.completed.get(phase, {})
+    
+    def created_ids(self):
+        ids = set()
+        for results in self.completed.values():
+            for result in results.values():
+                ids.update(value for key, value in result.items() if key.endswith("id"))
+        return ids
+    
+    def idempotency_key(self, phase, index, step="create"):
+        return f"{self.run_id}:{phase}:{index}:{step}"
+    
+    def options(self, phase, index, step="create"):
+        return {"idempotency_key": self.idempotency_key(phase, index, step)}
+    
+    @property
+    def metadata(self):
+        # Stored on every object the run creates, so it can be found and
+        # purged later
+        return {RUN_METADATA_KEY: self.run_id}
+    
+    @property
+    def seed(self):
+        # Runs with the same explicit seed generate the same dataset; without
+        # one, every run generates its own
+        seed = self.plan.get("seed")
+        return self.run_id if seed is None else seed
+    
+    def item_seed(self, phase, index):
+        return f"{self.seed}:{phase}:{index}"
+    
+    def first_pending(self, phase):
+        done = self.completed_in(phase)
+        index = 0
+        while index in done:
+            index += 1
+        return index
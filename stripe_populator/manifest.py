@@ -0,0 +1,103 @@
+import gzip
+import json
+import os
+
+
+# Requests that create or change objects, with the client method each one is
+# replayed through. Replaying them in order rebuilds a run's dataset.
+REPLAYED_ENDPOINTS = {
+    "TestClock.create": "test_helpers.test_clocks.create_async",
+    "TaxRate.create": "tax_rates.create_async",
+    "Product.create": "products.create_async",
+    "Price.create": "prices.create_async",
+    "Customer.create": "customers.create_async",
+    "PaymentMethod.attach": "payment_methods.attach_async",
+    "Subscription.create": "subscriptions.create_async",
+    "Subscription.cancel": "subscriptions.cancel_async",
+    "Subscription.update": "subscriptions.update_async",
+    "SubscriptionSchedule.create": "subscription_schedules.create_async",
+}
+
+
+def open_manifest(path, mode):
+    # A .gz manifest is compressed; it is only complete once closed
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def related_ids(result):
+    # Objects a request creates besides the one it returns
+    ids = []
+    invoice_settings = getattr(result, "invoice_settings", None)
+    default_payment_method = getattr(invoice_settings, "default_payment_method", None) if invoice_settings else None
+    for related in (getattr(result, "default_price", None), default_payment_method):
+        related_id = related if isinstance(related, str) else getattr(related, "id", None)
+        if related_id:
+            ids.append(related_id)
+    return ids
+
+
+class Manifest:
+    # JSONL stream of every request that built a run's dataset: the endpoint,
+    # the object it acted on, the exact parameters sent and the IDs that came
+    # back. Session.call() appends to it as requests complete, so a resumed
+    # run adds to the same file. The first line records the run.
+    
+    def __init__(self, path, run_id, started_at):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        new = not os.path.exists(path)
+        self.path = path
+        self.records = 0
+        self._file = open_manifest(path, "a")
+        if new:
+            self._write({"event": "start", "run_id": run_id, "started_at": started_at})
+    
+    def _write(self, entry):
+        self._file.write(json.dumps(entry, separators=(",", ":")) + "\n")
+        if not self.path.endswith(".gz"):
+            self._file.flush()
+    
+    def record(self, endpoint, args, kwargs, result):
+        if endpoint not in REPLAYED_ENDPOINTS:
+            return
+        entry = {"endpoint": endpoint, "target": args[0] if args else None, "params": kwargs.get("params") or {}, "id": result.id}
+        related = related_ids(result)
+        if related:
+            entry["related"] = related
+        self._write(entry)
+        self.records += 1
+    
+    def close(self):
+        self._file.close()
+
+
+def read_manifest(path):
+    # Returns (header, records). A run that died mid-write may have left a
+    # cut-off last line; a request recorded twice (sent again on resume with
+    # the same idempotency key) is kept once.
+    header = None
+    records = []
+    seen = set()
+    with open_manifest(path, "r") as manifest_file:
+        try:
+            for line in manifest_file:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if entry.get("event") == "start":
+                    header = entry
+                    continue
+                key = (entry["endpoint"], entry["target"], entry["id"])
+                if key not in seen:
+                    seen.add(key)
+                    records.append(entry)
+        except EOFError:
+            pass
+    
+    if header is None:
+        raise ValueError(f"Manifest {path} has no start entry")
+    return header, records
@@ -0,0 +1,238 @@
+import json
+import os
+import time
+
+from .config import LATENCY_BUCKETS, PROGRESS_INTERVAL
+
+
+def strip_suffix(text, suffix):
+    return text[:-len(suffix)] if text.endswith(suffix) else text
+
+
+def endpoint_name(method):
+    # "Customer.create" for client.v1.customers.create_async
+    service = getattr(method, "__self__", None)
+    name = strip_suffix(getattr(method, "__name__", repr(method)), "_async")
+    if service is None:
+        return name
+    return f"{strip_suffix(type(service).__name__, 'Service')}.{name}"
+
+
+def format_duration(seconds):
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}h{seconds % 3600 // 60:02d}m"
+    if seconds >= 60:
+        return f"{seconds // 60}m{seconds % 60:02d}s"
+    return f"{seconds}s"
+
+
+def write_atomically(path, text):
+    # Prometheus' textfile collector may read the file at any moment, so it
+    # must never see a half-written one
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "w", encoding="utf-8") as output_file:
+        output_file.write(text)
+    os.replace(temporary_path, path)
+
+
+class PhaseProgress:
+    # Counts the items of one phase and prints a progress line with
+    # throughput and ETA at most every PROGRESS_INTERVAL seconds, instead of
+    # one line per item
+    
+    def __init__(self, metrics, phase, total, skipped):
+        self.metrics = metrics
+        self.phase = phase
+        self.total = total
+        self.skipped = skipped
+        self.created = 0
+        self.failed = 0
+        self.dropped = 0
+        self.started = time.monotonic()
+        self.seconds = 0.0
+        self._last_print = self.started
+    
+    def advance(self, succeeded):
+        if succeeded:
+            self.created += 1
+        else:
+            self.failed += 1
+        
+        now = time.monotonic()
+        if now - self._last_print >= PROGRESS_INTERVAL:
+            self._last_print = now
+            done = self.created + self.failed
+            remaining = self.total - self.skipped - done
+            rate = done / (now - self.started)
+            eta = format_duration(remaining / rate) if rate > 0 else "?"
+            print(f"  → {self.phase}: {self.skipped + done}/{self.total} ({rate:.1f}/s, ETA {eta})")
+    
+    def finish(self, dropped=0):
+        self.seconds = time.monotonic() - self.started
+        self.dropped = dropped
+        rate = (self.created + self.failed) / self.seconds if self.seconds > 0 else 0
+        failed = f", {self.failed} failed" if self.failed else ""
+        left_out = f", {dropped} left out to fit the time budget" if dropped else ""
+        print(f"✓ {self.phase}: {self.created} completed{failed}{left_out} in {self.seconds:.1f}s ({rate:.1f}/s)")
+        self.metrics.export()
+
+
+class Metrics:
+    # Per-endpoint request counts, retries, error classes and latency
+    # histograms for every Stripe call made through Session.call(), plus
+    # per-phase progress and time spent generating data. export() writes a
+    # JSON report and a Prometheus textfile.
+    
+    def __init__(self):
+        self.run_id = None
+        self.json_path = None
+        self.textfile_path = None
+        self.endpoints = {}
+        self.phases = {}
+        self.generation_seconds = {}
+        self.started = time.monotonic()
+    
+    def set_output(self, run_id, json_path, textfile_path):
+        self.run_id = run_id
+        self.json_path = json_path
+        self.textfile_path = textfile_path
+    
+    def _endpoint(self, endpoint):
+        if endpoint not in self.endpoints:
+            self.endpoints[endpoint] = {
+                "calls": 0,
+                "attempts": 0,
+                "errors": {},
+                "latency_sum": 0.0,
+                "latency_buckets": [0] * (len(LATENCY_BUCKETS) + 1),
+            }
+        return self.endpoints[endpoint]
+    
+    def record_call(self, endpoint):
+        self._endpoint(endpoint)["calls"] += 1
+    
+    def record_attempt(self, endpoint, seconds, error=None):
+        stats = self._endpoint(endpoint)
+        stats["attempts"] += 1
+        stats["latency_sum"] += seconds
+        
+        bucket = 0
+        while bucket < len(LATENCY_BUCKETS) and seconds > LATENCY_BUCKETS[bucket]:
+            bucket += 1
+        stats["latency_buckets"][bucket] += 1
+        
+        if error is not None:
+            error_class = type(error).__name__
+            stats["errors"][error_class] = stats["errors"].get(error_class, 0) + 1
+    
+    def add_generation(self, kind, seconds):
+        self.generation_seconds[kind] = self.generation_seconds.get(kind, 0.0) + seconds
+    
+    def phase(self, phase, total, skipped=0):
+        progress = PhaseProgress(self, phase, total, skipped)
+        self.phases[phase] = progress
+        return progress
+    
+    @staticmethod
+    def quantile(stats, fraction):
+        # Upper bound of the histogram bucket holding the quantile
+        target = stats["attempts"] * fraction
+        seen = 0
+        for bucket, count in enumerate(stats["latency_buckets"]):
+            seen += count
+            if seen >= target and count:
+                return LATENCY_BUCKETS[bucket] if bucket < len(LATENCY_BUCKETS) else float("inf")
+        return 0.0
+    
+    def network_seconds(self):
+        return sum(stats["latency_sum"] for stats in self.endpoints.values())
+    
+    def report(self):
+        return {
+            "run_id": self.run_id,
+            "wall_seconds": round(time.monotonic() - self.started, 3),
+            "network_seconds": round(self.network_seconds(), 3),
+            "generation_seconds": {kind: round(seconds, 3) for kind, seconds in self.generation_seconds.items()},
+            "endpoints": {
+                endpoint: {
+                    "calls": stats["calls"],
+                    "attempts": stats["attempts"],
+                    "retries": stats["attempts"] - stats["calls"],
+                    "errors": stats["errors"],
+                    "latency_mean": round(stats["latency_sum"] / stats["attempts"], 4) if stats["attempts"] else 0,
+                    "latency_p50": self.quantile(stats, 0.50),
+                    "latency_p99": self.quantile(stats, 0.99),
+                    "latency_buckets": dict(zip([str(bound) for bound in LATENCY_BUCKETS] + ["+Inf"], stats["latency_buckets"])),
+                }
+                for endpoint, stats in sorted(self.endpoints.items())
+            },
+            "phases": {
+                phase: {
+                    "total": progress.total,
+                    "created": progress.created,
+                    "failed": progress.failed,
+                    "skipped": progress.skipped,
+                    "dropped": progress.dropped,
+                    "seconds": round(progress.seconds or time.monotonic() - progress.started, 3),
+                }
+                for phase, progress in self.phases.items()
+            },
+        }
+    
+    def prometheus(self):
+        run = f'run_id="{self.run_id}"'
+        lines = []
+        
+        def metric(name, kind, description, samples):
+            lines.append(f"# HELP stripe_populate_{name} {description}")
+            lines.append(f"# TYPE stripe_populate_{name} {kind}")
+            for labels, value in samples:
+                lines.append(f"stripe_populate_{name}{{{','.join([run] + labels)}}} {value}")
+        
+        endpoints = sorted(self.endpoints.items())
+        metric("requests_total", "counter", "Stripe API calls, not counting retries", [
+            ([f'endpoint="{endpoint}"'], stats["calls"]) for endpoint, stats in endpoints
+        ])
+        metric("retries_total", "counter", "Stripe API calls retried", [
+            ([f'endpoint="{endpoint}"'], stats["attempts"] - stats["calls"]) for endpoint, stats in endpoints
+        ])
+        metric("errors_total", "counter", "Failed Stripe API attempts by error class", [
+            ([f'endpoint="{endpoint}"', f'error="{error_class}"'], count)
+            for endpoint, stats in endpoints
+            for error_class, count in sorted(stats["errors"].items())
+        ])
+        
+        lines.append("# HELP stripe_populate_request_duration_seconds Stripe API attempt latency")
+        lines.append("# TYPE stripe_populate_request_duration_seconds histogram")
+        for endpoint, stats in endpoints:
+            labels = f'{run},endpoint="{endpoint}"'
+            cumulative = 0
+            for bound, count in zip([str(bound) for bound in LATENCY_BUCKETS] + ["+Inf"], stats["latency_buckets"]):
+                cumulative += count
+                lines.append(f'stripe_populate_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f"stripe_populate_request_duration_seconds_sum{{{labels}}} {stats['latency_sum']:.6f}")
+            lines.append(f"stripe_populate_request_duration_seconds_count{{{labels}}} {stats['attempts']}")
+        
+        metric("phase_items", "gauge", "Items of each phase by state", [
+            ([f'phase="{phase}"', f'state="{state}"'], getattr(progress, state))
+            for phase, progress in self.phases.items()
+            for state in ("created", "failed", "skipped", "dropped")
+        ])
+        metric("phase_duration_seconds", "gauge", "Time each phase has been running", [
+            ([f'phase="{phase}"'], f"{progress.seconds or time.monotonic() - progress.started:.3f}")
+            for phase, progress in self.phases.items()
+        ])
+        metric("generation_seconds", "gauge", "Time spent generating fake data", [
+            ([f'kind="{kind}"'], f"{seconds:.3f}") for kind, seconds in sorted(self.generation_seconds.items())
+        ])
+        return "\n".join(lines) + "\n"
+    
+    def export(self):
+        if self.json_path:
+            write_atomically(self.json_path, json.dumps(self.report(), indent=2) + "\n")
+        if self.textfile_path:
+            write_atomically(self.textfile_path, self.prometheus())
@@ -0,0 +1,105 @@
+import json
+from dataclasses import asdict, dataclass, field
+from typing import Optional
+
+from .config import BILLING_INTERVALS, CATALOG_CURRENCIES, PHASE_CONCURRENCY
+
+
+# Smallest accepted value for each planned quantity
+PLAN_MINIMUMS = {
+    "products": 0,
+    "customers": 0,
+    "subscriptions": 1,
+}
+
+
+# Environment variables the CLI reads planned quantities from
+PLAN_ENV_VARS = {
+    "products": "STRIPE_POPULATE_PRODUCTS",
+    "customers": "STRIPE_POPULATE_CUSTOMERS",
+    "subscriptions": "STRIPE_POPULATE_SUBSCRIPTIONS",
+}
+
+
+@dataclass
+class Plan:
+    # How much new data a population run creates, how many items each phase
+    # works on at once (phases not listed use PHASE_CONCURRENCY), an optional
+    # seed that makes the generated attributes reproducible, how many
+    # months of billing history to generate on test clocks (0 for none), and
+    # how many prices each new product gets in different currencies and
+    # billing intervals
+    products: int = 0
+    customers: int = 0
+    subscriptions: int = 1
+    concurrency: dict = field(default_factory=dict)
+    seed: Optional[int] = None
+    history_months: int = 0
+    prices_per_product: int = 1
+    
+    def __post_init__(self):
+        for name, minimum in PLAN_MINIMUMS.items():
+            value = getattr(self, name)
+            if not isinstance(value, int) or isinstance(value, bool) or value < minimum:
+                raise ValueError(f"Plan {name} must be an integer >= {minimum}, got {value!r}")
+        
+        for phase, value in self.concurrency.items():
+            if phase not in PHASE_CONCURRENCY:
+                raise ValueError(f"Unknown phase {phase!r} in concurrency (expected one of {', '.join(PHASE_CONCURRENCY)})")
+            if not isinstance(value, int) or value < 1:
+                raise ValueError(f"Concurrency for {phase} must be an integer >= 1, got {value!r}")
+        
+        if self.seed is not None and (not isinstance(self.seed, int) or isinstance(self.seed, bool)):
+            raise ValueError(f"Plan seed must be an integer, got {self.seed!r}")
+        
+        if not isinstance(self.history_months, int) or isinstance(self.history_months, bool) or self.history_months < 0:
+            raise ValueError(f"Plan history_months must be an integer >= 0, got {self.history_months!r}")
+        
+        max_prices = len(CATALOG_CURRENCIES) * len(BILLING_INTERVALS)
+        if (
+            not isinstance(self.prices_per_product, int) or isinstance(self.prices_per_product, bool)
+            or not 1 <= self.prices_per_product <= max_prices
+        ):
+            raise ValueError(f"Plan prices_per_product must be an integer from 1 to {max_prices}, got {self.prices_per_product!r}")
+    
+    @classmethod
+    def from_dict(cls, data):
+        unknown = set(data) - {"products", "customers", "subscriptions", "concurrency", "seed", "history_months", "prices_per_product"}
+        if unknown:
+            raise ValueError(f"Unknown plan fields: {', '.join(sorted(unknown))}")
+        return cls(**data)
+    
+    def to_dict(self):
+        return asdict(self)
+    
+    def split(self, count):
+        # `count` plans whose quantities add up to this one's, as even as
+        # possible. Every part still needs at least one subscription.
+        if self.subscriptions < count:
+            raise ValueError(f"Cannot split {self.subscriptions} subscriptions across {count} shards")
+        
+        def share(total, index):
+            return total // count + (1 if index < total % count else 0)
+        
+        return [
+            Plan(
+                products=share(self.products, index),
+                customers=share(self.customers, index),
+                subscriptions=share(self.subscriptions, index),
+                concurrency=dict(self.concurrency),
+                seed=self.seed,
+                history_months=self.history_months,
+                prices_per_product=self.prices_per_product,
+            )
+            for index in range(count)
+        ]
+
+
+def read_plan_file(path):
+    # Returns the raw values from a JSON plan file, so the CLI can tell which
+    # quantities the file left out and fill them from flags or prompts
+    with open(path, encoding="utf-8") as plan_file:
+        data = json.load(plan_file)
+    if not isinstance(data, dict):
+        raise ValueError(f"Plan file {path} must contain a JSON object")
+    return data
@@ -0,0 +1,118 @@
+import asyncio
+
+from .compiler import TAX_BEHAVIORS, TAX_RATES_PER_PRICE
+from .config import BILLING_INTERVALS, CATALOG_CURRENCIES
+from .engine import run_concurrently
+from .profiles import ProfilePool, build_product_profile, item_random
+
+
+def catalog_price(interval_code, index):
+    # (currency, recurring) of a product's price number `index`. Price 0 is
+    # the default price; the others go through the currencies first, then
+    # on to the following billing intervals, so no two are the same.
+    interval_config = BILLING_INTERVALS[(interval_code + index // len(CATALOG_CURRENCIES)) % len(BILLING_INTERVALS)]
+    recurring = {"interval": interval_config["interval"], "interval_count": interval_config["interval_count"]}
+    return CATALOG_CURRENCIES[index % len(CATALOG_CURRENCIES)], recurring
+
+
+def build_catalog_index(products):
+    # {(interval, interval_count, currency, tax_behavior): [price IDs]} of
+    # new products, to find the prices matching a billing setup without
+    # scanning the catalog
+    index = {}
+    for product in products:
+        for price in product.get("prices", []):
+            key = (price["interval"], price["interval_count"], price["currency"], product["tax_behavior"])
+            index.setdefault(key, []).append(price["price_id"])
+    return index
+
+
+async def create_products_and_prices(session, tax_rates_by_type, num_products, journal, compiled, concurrency=None, pipeline=None,
+                                     prices_per_product=1):
+    if num_products == 0:
+        print("\nSkipping product creation (0 requested)")
+        return []
+    
+    concurrency = concurrency or session.concurrency["products"]
+    prices = f"{prices_per_product} prices each" if prices_per_product > 1 else "prices"
+    print(f"\nCreating {num_products} NEW products and {prices} ({concurrency} in flight)...")
+    profiles = ProfilePool(
+        "products", build_product_profile, journal.seed, num_products, journal.first_pending("products"), metrics=session.metrics
+    )
+    
+    async def create_product(i, _):
+        try:
+            rng = item_random(journal, "products", i)
+            profile = await profiles.get(i)
+            product_name = profile["name"]
+            product_description = profile["description"]
+            currency, recurring = catalog_price(compiled["product_intervals"][i], 0)
+            tax_behavior = TAX_BEHAVIORS[compiled["product_tax_behaviors"][i]]
+            unit_amount = rng.randint(500, 50000)
+            
+            # The product and its default price in one request, then the
+            # catalog's other prices of the product all at once
+            product = await session.call(
+                session.client.v1.products.create_async,
+                params={
+                    "name": product_name,
+                    "description": product_description,
+                    "metadata": journal.metadata,
+                    "default_price_data": {
+                        "unit_amount": unit_amount,
+                        "currency": currency,
+                        "recurring": recurring,
+                        "tax_behavior": tax_behavior,
+                    },
+                },
+                options=journal.options("products", i, "product"),
+            )
+            
+            prices = [{"price_id": product.default_price, "currency": currency, **recurring}]
+            extra_prices = [catalog_price(compiled["product_intervals"][i], j) for j in range(1, prices_per_product)]
+            created_prices = await asyncio.gather(*(
+                session.call(
+                    session.client.v1.prices.create_async,
+                    params={
+                        "product": product.id,
+                        "unit_amount": unit_amount,
+                        "currency": extra_currency,
+                        "recurring": extra_recurring,
+                        "tax_behavior": tax_behavior,
+                        "metadata": journal.metadata,
+                    },
+                    options=journal.options("products", i, f"price{j + 1}"),
+                )
+                for j, (extra_currency, extra_recurring) in enumerate(extra_prices)
+            ))
+            for price, (extra_currency, extra_recurring) in zip(created_prices, extra_prices):
+                prices.append({"price_id": price.id, "currency": extra_currency, **extra_recurring})
+            
+            # Tax rates are only needed for the result, so a run creating them
+            # doesn't hold up the product and price requests
+            tax_rates = await tax_rates_by_type if asyncio.isfuture(tax_rates_by_type) else tax_rates_by_type
+            available_taxes = tax_rates.get(tax_behavior, [])
+            selected_taxes = []
+            if available_taxes:
+                selected_taxes = rng.sample(
+                    available_taxes, 
+                    k=min(TAX_RATES_PER_PRICE[compiled["product_tax_counts"][i]], len(available_taxes))
+                )
+            
+            return {
+                "product_id": product.id,
+                "price_id": product.default_price,
+                "tax_rates": selected_taxes,
+                "tax_behavior": tax_behavior,
+                "prices": prices,
+            }
+                
+        except Exception as e:
+            print(f"✗ Error creating product {i+1}: {e}")
+    
+    try:
+        return await run_concurrently(
+            range(num_products), create_product, concurrency, journal, "products", pipeline, session.metrics, session.budget
+        )
+    finally:
+        profiles.close()
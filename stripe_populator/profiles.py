@@ -0,0 +1,234 @@
+import asyncio
+import queue
+import random
+import threading
+import time
+
+
+# Items generated per batch. A batch is generated from its own RNG stream, so
+# this is part of the dataset definition: changing it changes the data.
+PROFILE_BATCH_SIZE = 256
+
+
+# Entries per precomputed value table
+VALUE_TABLE_SIZE = 2048
+
+
+# Batches generated ahead of the workers consuming them
+PROFILE_PREFETCH_BATCHES = 4
+
+
+_fake = None
+_value_tables = None
+_value_tables_lock = threading.Lock()
+_value_tables_seconds = 0.0
+
+
+def get_faker():
+    # Faker builds all of its locale providers on construction, so it is only
+    # created once something actually needs fake data
+    global _fake
+    if _fake is None:
+        from faker import Faker
+        _fake = Faker()
+    return _fake
+
+
+def get_value_tables():
+    # Pools of different phases start at the same time; only one of them
+    # builds the tables
+    global _value_tables, _value_tables_seconds
+    with _value_tables_lock:
+        if _value_tables is None:
+            started = time.perf_counter()
+            _value_tables = build_value_tables()
+            _value_tables_seconds = time.perf_counter() - started
+    return _value_tables
+
+
+def build_value_tables():
+    # Faker costs about half a millisecond per customer, which becomes the
+    # bottleneck once requests run in parallel. Instead, Faker fills fixed
+    # tables once (with a fixed seed, so they are the same on every machine
+    # with the same Faker version) and profiles are assembled from random
+    # picks out of those tables.
+    fake = get_faker()
+    fake.seed_instance(0)
+    company_provider = next(provider for provider in fake.providers if hasattr(provider, "catch_phrase_words"))
+    
+    def table(generate):
+        return [generate() for _ in range(VALUE_TABLE_SIZE)]
+    
+    return {
+        "first_names": table(fake.first_name),
+        "last_names": table(fake.last_name),
+        "email_domains": [fake.free_email_domain() for _ in range(16)] + [fake.domain_name() for _ in range(48)],
+        "companies": table(fake.company),
+        "building_numbers": table(fake.building_number),
+        "street_names": table(fake.street_name),
+        "secondary_addresses": table(fake.secondary_address),
+        "cities": table(fake.city),
+        "states": table(fake.state_abbr),
+        "postcodes": table(fake.postcode),
+        "catch_phrase_words": [list(words) for words in company_provider.catch_phrase_words],
+        "bs_words": [list(words) for words in company_provider.bsWords],
+    }
+
+
+def build_customer_profile(rng, tables):
+    first_name = rng.choice(tables["first_names"])
+    last_name = rng.choice(tables["last_names"])
+    
+    line1 = f"{rng.choice(tables['building_numbers'])} {rng.choice(tables['street_names'])}"
+    if rng.random() < 0.25:
+        line1 += f" {rng.choice(tables['secondary_addresses'])}"
+    
+    return {
+        "name": f"{first_name} {last_name}",
+        "email": f"{first_name}.{last_name}{rng.randint(1, 999)}@{rng.choice(tables['email_domains'])}".lower(),
+        "phone": str(rng.randrange(10 ** 12, 10 ** 13)),
+        "company": rng.choice(tables["companies"]) if rng.random() < 0.5 else None,
+        "address": {
+            "line1": line1,
+            "city": rng.choice(tables["cities"]),
+            "state": rng.choice(tables["states"]),
+            "postal_code": rng.choice(tables["postcodes"]),
+            "country": "US"
+        },
+    }
+
+
+def build_product_profile(rng, tables):
+    return {
+        "name": " ".join(rng.choice(words) for words in tables["catch_phrase_words"]),
+        "description": " ".join(rng.choice(words) for words in tables["bs_words"]),
+    }
+
+
+class ProfilePool:
+    # Generates profiles for one phase in batches on a background thread and
+    # hands them out by item index through a bounded queue. Batch k always
+    # comes from the RNG stream "<seed>:<kind>:batch-<k>", so item i gets the
+    # same attributes however many workers run, whatever order items finish
+    # in, and whether or not the run was resumed.
+    
+    def __init__(self, kind, builder, seed, count, first_index=0, prefetch=PROFILE_PREFETCH_BATCHES, metrics=None):
+        self.kind = kind
+        self.seed = seed
+        self.metrics = metrics
+        self.generation_seconds = 0.0
+        
+        self._builder = builder
+        self._count = count
+        self._batches = {}
+        self._ready = queue.Queue(maxsize=prefetch)
+        self._fetching = asyncio.Lock()
+        self._closed = threading.Event()
+        self._error = None
+        
+        first_batch = first_index // PROFILE_BATCH_SIZE
+        self._thread = threading.Thread(target=self._produce, args=(first_batch,), daemon=True)
+        self._thread.start()
+    
+    def _produce(self, first_batch):
+        try:
+            tables = get_value_tables()
+            num_batches = -(-self._count // PROFILE_BATCH_SIZE)
+            
+            for batch_number in range(first_batch, num_batches):
+                started = time.perf_counter()
+                rng = random.Random(f"{self.seed}:{self.kind}:batch-{batch_number}")
+                size = min(PROFILE_BATCH_SIZE, self._count - batch_number * PROFILE_BATCH_SIZE)
+                batch = [self._builder(rng, tables) for _ in range(size)]
+                self.generation_seconds += time.perf_counter() - started
+                
+                if not self._put((batch_number, batch)):
+                    return
+        except Exception as e:
+            # Passed on to the items waiting for a batch, which fail instead
+            # of waiting forever
+            self._put((None, e))
+    
+    def _put(self, entry):
+        # False once the pool is closed
+        while not self._closed.is_set():
+            try:
+                self._ready.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+    
+    def _take(self):
+        # Runs on an executor thread, which must not block for good: asyncio.run
+        # waits for executor threads when it shuts down
+        while True:
+            try:
+                return self._ready.get(timeout=0.1)
+            except queue.Empty:
+                if self._closed.is_set():
+                    raise RuntimeError(f"The {self.kind} profile pool was closed")
+                if not self._thread.is_alive() and self._ready.empty():
+                    raise RuntimeError(f"The {self.kind} profile pool has no more profiles")
+    
+    async def get(self, index):
+        batch_number = index // PROFILE_BATCH_SIZE
+        
+        if batch_number not in self._batches:
+            # Only one waiter pulls from the queue at a time; the others find
+            # their batch already stored once they get the lock
+            async with self._fetching:
+                loop = asyncio.get_running_loop()
+                while batch_number not in self._batches:
+                    if self._error is not None:
+                        raise self._error
+                    ready_number, batch = await loop.run_in_executor(None, self._take)
+                    if ready_number is None:
+                        self._error = batch
+                    else:
+                        self._batches[ready_number] = batch
+                
+                # Items are handed out in index order, so batches two behind
+                # the newest one are no longer needed
+                for old_number in [number for number in self._batches if number < batch_number - 2]:
+                    del self._batches[old_number]
+        
+        return self._batches[batch_number][index % PROFILE_BATCH_SIZE]
+    
+    def close(self):
+        self._closed.set()
+        if self.metrics:
+            self.metrics.add_generation(self.kind, self.generation_seconds)
+            self.metrics.generation_seconds["value_tables"] = _value_tables_seconds
+
+
+def item_random(journal, phase, index):
+    # Per-item stream for choices that are not part of the profile (payment
+    # methods, prices, statuses). The same seed, phase and index always make
+    # the same choices, so a retried item sends the same parameters with its
+    # idempotency key.
+    return random.Random(journal.item_seed(phase, index))
+
+
+def generate_customer_params(profile, failing=False):
+    address = dict(profile["address"])
+    
+    customer_params = {
+        "name": profile["name"],
+        "email": profile["email"],
+        "phone": profile["phone"],
+        "description": f"Customer from {address['city']}, {address['state']}",
+        "address": address,
+    }
+    
+    # Lets later runs find these customers with the Search API
+    if failing:
+        customer_params["description"] += " [FAILING CARD]"
+        customer_params["metadata"] = {"payment_type": "failing_card"}
+    else:
+        customer_params["metadata"] = {"payment_type": "card"}
+    
+    if profile["company"]:
+        customer_params.setdefault("metadata", {})["company"] = profile["company"]
+    
+    return customer_params
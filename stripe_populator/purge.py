@@ -0,0 +1,220 @@
+import asyncio
+
+from .config import RUN_METADATA_KEY
+from .engine import Session, run_concurrently
+from .inventory import list_partitioned
+from .journal import RunJournal
+from .test_clocks import clock_run_id
+
+
+# Stripe's search API allows at most 10 clauses per query
+SEARCH_CLAUSES = 10
+
+
+# Subscription and schedule states that need no cancelling
+FINISHED_SUBSCRIPTION_STATUSES = ("canceled", "incomplete_expired")
+CANCELLABLE_SCHEDULE_STATUSES = ("not_started", "active")
+
+
+def is_tagged(obj, run_ids):
+    metadata = obj.metadata or {}
+    return RUN_METADATA_KEY in metadata and (not run_ids or metadata[RUN_METADATA_KEY] in run_ids)
+
+
+async def search_tagged(session, search_method, run_ids):
+    # Search is eventually consistent (objects show up about a minute after
+    # they are created), so it is only used when a run's journal is missing
+    found = {}
+    for start in range(0, len(run_ids), SEARCH_CLAUSES):
+        clauses = [f"metadata['{RUN_METADATA_KEY}']:'{run_id}'" for run_id in run_ids[start:start + SEARCH_CLAUSES]]
+        params = {"query": " OR ".join(clauses), "limit": 100}
+        while True:
+            page = await session.call(search_method, params=params)
+            for obj in page.data:
+                found[obj.id] = obj
+            if not page.has_more or not page.next_page:
+                break
+            params["page"] = page.next_page
+    return found
+
+
+async def list_tagged(session, list_method, run_ids, params=None, created_after=None):
+    found = {}
+    
+    def add_page(page):
+        for obj in page:
+            if is_tagged(obj, run_ids):
+                found[obj.id] = obj
+    
+    await list_partitioned(session, list_method, add_page, params, created_after=created_after)
+    return found
+
+
+async def list_test_clocks(session, run_ids):
+    # Test clocks can't be filtered by creation time and have no metadata;
+    # their names carry the run ID
+    found = {}
+    async for test_clock in session.list_all(session.client.v1.test_helpers.test_clocks.list_async):
+        run_id = clock_run_id(test_clock.name)
+        if run_id is not None and (not run_ids or run_id in run_ids):
+            found[test_clock.id] = test_clock
+    return found
+
+
+async def find_tagged(session, run_ids, everything=False):
+    # Returns {kind: {id: object}} for everything tagged with one of the run
+    # IDs (or with any run ID). When every run's journal is here, listing
+    # can start at the earliest run's start time instead of covering the
+    # whole account, and is consistent right away.
+    v1 = session.client.v1
+    created_after = None
+    use_search = False
+    if not everything:
+        started = []
+        for run_id in run_ids:
+            try:
+                started.append(RunJournal.load(run_id).started_at)
+            except ValueError:
+                use_search = True
+        if started and not use_search:
+            created_after = int(min(started))
+    
+    kinds = {
+        "subscriptions": (v1.subscriptions.list_async, {"status": "all"}, v1.subscriptions.search_async),
+        "subscription_schedules": (v1.subscription_schedules.list_async, {}, None),
+        "customers": (v1.customers.list_async, {}, v1.customers.search_async),
+        "prices": (v1.prices.list_async, {"active": True}, v1.prices.search_async),
+        "products": (v1.products.list_async, {"active": True}, v1.products.search_async),
+        "tax_rates": (v1.tax_rates.list_async, {"active": True}, None),
+        "test_clocks": None,
+    }
+    
+    async def find(kind):
+        if kind == "test_clocks":
+            return kind, await list_test_clocks(session, run_ids)
+        list_method, params, search_method = kinds[kind]
+        if use_search and search_method:
+            return kind, await search_tagged(session, search_method, list(run_ids))
+        return kind, await list_tagged(session, list_method, run_ids, params, created_after)
+    
+    found = dict(await asyncio.gather(*(find(kind) for kind in kinds)))
+    
+    # Default prices are created along with their product, which leaves them
+    # without metadata, so they are found through the product
+    default_price_ids = {
+        product.default_price for product in found["products"].values()
+        if isinstance(getattr(product, "default_price", None), str) and product.default_price not in found["prices"]
+    }
+    default_prices = await asyncio.gather(*(session.call(v1.prices.retrieve_async, price_id) for price_id in default_price_ids))
+    found["prices"].update({price.id: price for price in default_prices if price.active})
+    return found
+
+
+async def purge_async(client, run_ids=(), everything=False, dry_run=False, concurrency=None):
+    # Deletes, cancels or archives everything the given runs created, in
+    # dependency order: test clocks (with everything on them), subscriptions
+    # and schedules, then customers, then products and tax rates, then prices
+    # (which Stripe only lets you archive).
+    # Returns {kind: {"found", "purged", "skipped", "failed"}}.
+    if not run_ids and not everything:
+        raise ValueError("Give the run IDs to purge, or purge everything tagged by any run")
+    
+    session = Session(client, concurrency=concurrency)
+    run_ids = set(run_ids)
+    v1 = client.v1
+    
+    print("=" * 60)
+    print(f"Purging data from {'all runs' if everything else 'runs ' + ', '.join(sorted(run_ids))}")
+    print("=" * 60)
+    
+    found = await find_tagged(session, run_ids, everything)
+    print("Found tagged objects:")
+    for kind, objects in found.items():
+        print(f"  - {kind}: {len(objects)}")
+    
+    summary = {kind: {"found": len(objects), "purged": 0, "skipped": 0, "failed": 0} for kind, objects in found.items()}
+    if dry_run:
+        print("Dry run - nothing was changed")
+        return summary
+    
+    # Deleting a test clock deletes its customers, and deleting a customer
+    # cancels its subscriptions
+    customer_ids = set(found["customers"])
+    test_clock_ids = set(found["test_clocks"])
+    clock_customer_ids = {
+        customer.id for customer in found["customers"].values() if getattr(customer, "test_clock", None) in test_clock_ids
+    }
+    
+    def pending(kind, objects):
+        summary[kind]["skipped"] = summary[kind]["found"] - len(objects)
+        return objects
+    
+    async def purge_kind(kind, objects, action):
+        if not objects:
+            return
+        async def purge_one(_, obj):
+            try:
+                await session.call(action, obj.id)
+                return {"id": obj.id}
+            except Exception as e:
+                print(f"✗ Error purging {obj.id}: {e}")
+        
+        purged = await run_concurrently(
+            objects, purge_one, session.concurrency["purge"], phase=f"purge_{kind}", metrics=session.metrics
+        )
+        summary[kind]["purged"] = len(purged)
+        summary[kind]["failed"] = len(objects) - len(purged)
+    
+    def archive(update_method, **params):
+        async def archive_one(object_id):
+            return await update_method(object_id, params={"active": False, **params})
+        return archive_one
+    
+    # 1. Test clocks, subscriptions and schedules. Only subscriptions of
+    # customers that stay are cancelled here.
+    subscriptions = pending("subscriptions", [
+        subscription for subscription in found["subscriptions"].values()
+        if subscription.status not in FINISHED_SUBSCRIPTION_STATUSES and subscription.customer not in customer_ids
+    ])
+    schedules = pending("subscription_schedules", [
+        schedule for schedule in found["subscription_schedules"].values()
+        if schedule.status in CANCELLABLE_SCHEDULE_STATUSES and schedule.customer not in clock_customer_ids
+    ])
+    await asyncio.gather(
+        purge_kind("test_clocks", list(found["test_clocks"].values()), v1.test_helpers.test_clocks.delete_async),
+        purge_kind("subscriptions", subscriptions, v1.subscriptions.cancel_async),
+        purge_kind("subscription_schedules", schedules, v1.subscription_schedules.cancel_async),
+    )
+    
+    # 2. Customers that weren't on a test clock
+    customers = pending("customers", [
+        customer for customer in found["customers"].values() if customer.id not in clock_customer_ids
+    ])
+    await purge_kind("customers", customers, v1.customers.delete_async)
+    
+    # 3. Products, tax rates and then prices can't be deleted once used, so
+    # they are archived. A product's default price can only be archived
+    # once the product no longer points to it.
+    await asyncio.gather(
+        purge_kind(
+            "products", pending("products", list(found["products"].values())), archive(v1.products.update_async, default_price="")
+        ),
+        purge_kind("tax_rates", pending("tax_rates", list(found["tax_rates"].values())), archive(v1.tax_rates.update_async)),
+    )
+    await purge_kind("prices", pending("prices", list(found["prices"].values())), archive(v1.prices.update_async))
+    
+    rate_limiter = session.rate_limiter
+    print("\n" + "=" * 60)
+    print("Purge completed!")
+    print("=" * 60)
+    for kind, counts in summary.items():
+        failed = f", {counts['failed']} failed" if counts["failed"] else ""
+        print(f"  - {kind}: {counts['purged']} purged, {counts['skipped']} needed nothing{failed}")
+    print(f"API requests: {rate_limiter.requests} ({rate_limiter.throttled} rate limited, {rate_limiter.retries} retried)")
+    print("=" * 60)
+    
+    return summary
+
+
+def purge(client, run_ids=(), everything=False, dry_run=False, concurrency=None):
+    return asyncio.run(purge_async(client, run_ids, everything, dry_run, concurrency))
@@ -0,0 +1,139 @@
+import asyncio
+import random
+import time
+
+import stripe
+
+
+def get_error_header(error, name):
+    headers = getattr(error, "headers", None) or {}
+    for key, value in headers.items():
+        if key.lower() == name.lower():
+            return value
+    return None
+
+
+class AdaptiveRateLimiter:
+    # Token bucket for request pacing plus an AIMD (additive-increase /
+    # multiplicative-decrease) limit on requests in flight. Every Stripe call
+    # goes through call(): successes slowly raise the rate and concurrency,
+    # 429s halve them and the call is retried after Retry-After or a jittered
+    # exponential backoff.
+    
+    def __init__(self, requests_per_second=20, min_requests_per_second=1, max_requests_per_second=100,
+                 initial_concurrency=8, max_concurrency=50, additive_increase=5, max_retries=6, base_backoff=0.5, max_backoff=30):
+        self.rate = float(requests_per_second)
+        self.min_rate = float(min_requests_per_second)
+        self.max_rate = float(max_requests_per_second)
+        self.concurrency = float(initial_concurrency)
+        self.max_concurrency = max_concurrency
+        self.additive_increase = additive_increase
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        
+        self.in_flight = 0
+        self.requests = 0
+        self.throttled = 0
+        self.retries = 0
+        
+        self._tokens = 1.0
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self._slot_freed = None
+        self._random = random.Random()
+    
+    async def _take_token(self):
+        while True:
+            now = time.monotonic()
+            if now < self._paused_until:
+                await asyncio.sleep(self._paused_until - now)
+                continue
+            
+            self._tokens = min(max(self.rate, 1.0), self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+    
+    async def _acquire(self):
+        if self._slot_freed is None:
+            self._slot_freed = asyncio.Event()
+        
+        while self.in_flight >= int(self.concurrency):
+            self._slot_freed.clear()
+            await self._slot_freed.wait()
+        self.in_flight += 1
+        
+        await self._take_token()
+        self.requests += 1
+    
+    def _release(self):
+        self.in_flight -= 1
+        self._slot_freed.set()
+    
+    def _on_success(self):
+        self.concurrency = min(self.max_concurrency, self.concurrency + 1 / self.concurrency)
+        # Roughly +additive_increase req/s for every second of successful calls
+        self.rate = min(self.max_rate, self.rate + self.additive_increase / self.rate)
+    
+    def _on_throttle(self, retry_after):
+        self.throttled += 1
+        now = time.monotonic()
+        
+        if retry_after:
+            self._paused_until = max(self._paused_until, now + retry_after)
+        
+        # A burst of 429s from the same window only counts as one decrease
+        if now - self._last_decrease >= 1:
+            self._last_decrease = now
+            self.concurrency = max(1.0, self.concurrency / 2)
+            self.rate = max(self.min_rate, self.rate / 2)
+            print(f"  ⚠ Rate limited by Stripe, slowing down to {self.rate:.1f} req/s "
+                  f"and {int(self.concurrency)} requests in flight")
+    
+    def _backoff(self, attempt, retry_after):
+        if retry_after:
+            return retry_after + self._random.uniform(0, self.base_backoff)
+        return self._random.uniform(0, min(self.max_backoff, self.base_backoff * 2 ** attempt))
+    
+    async def call(self, func, *args, **kwargs):
+        attempt = 0
+        while True:
+            await self._acquire()
+            try:
+                result = await func(*args, **kwargs)
+            except stripe.StripeError as e:
+                self._release()
+                
+                should_retry = get_error_header(e, "Stripe-Should-Retry")
+                retry_after = get_error_header(e, "Retry-After")
+                try:
+                    retry_after = float(retry_after) if retry_after else None
+                except ValueError:
+                    retry_after = None
+                
+                if isinstance(e, stripe.RateLimitError) or e.http_status == 429:
+                    self._on_throttle(retry_after)
+                    retryable = should_retry != "false"
+                elif should_retry is not None:
+                    retryable = should_retry == "true"
+                else:
+                    retryable = isinstance(e, stripe.APIConnectionError) and getattr(e, "should_retry", False)
+                
+                if not retryable or attempt >= self.max_retries:
+                    raise
+                
+                await asyncio.sleep(self._backoff(attempt, retry_after))
+                attempt += 1
+                self.retries += 1
+                continue
+            except BaseException:
+                self._release()
+                raise
+            
+            self._release()
+            self._on_success()
+            return result
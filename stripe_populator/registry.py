@@ -0,0 +1,78 @@
+from array import array
+
+
+class CustomerRegistry:
+    # Customer IDs packed into one bytearray with an offsets array, plus one
+    # byte per customer for its type. A million existing customers take a few
+    # tens of MB instead of one dict each, and customers are handed out by
+    # index, so nothing is copied or concatenated to pick one.
+    
+    __slots__ = ("_ids", "_offsets", "_types", "_failing")
+    
+    TYPES = ("normal", "failing")
+    
+    def __init__(self, customers=()):
+        self._ids = bytearray()
+        self._offsets = array("Q", [0])
+        self._types = bytearray()
+        self._failing = array("Q")
+        self.extend(customers)
+    
+    def add(self, customer_id, customer_type="normal"):
+        type_code = self.TYPES.index(customer_type)
+        if type_code == 1:
+            self._failing.append(len(self._types))
+        
+        self._ids += customer_id.encode("ascii")
+        self._offsets.append(len(self._ids))
+        self._types.append(type_code)
+    
+    def extend(self, customers):
+        for customer in customers:
+            self.add(customer["id"], customer["type"])
+    
+    def __len__(self):
+        return len(self._types)
+    
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self.id_at(index)
+    
+    def items(self):
+        # (id, type) pairs in registry order
+        for index in range(len(self)):
+            yield self.id_at(index), self.type_at(index)
+    
+    def id_at(self, index):
+        return self._ids[self._offsets[index]:self._offsets[index + 1]].decode("ascii")
+    
+    def type_at(self, index):
+        return self.TYPES[self._types[index]]
+    
+    @property
+    def failing_count(self):
+        return len(self._failing)
+    
+    def failing_id_at(self, index):
+        return self.id_at(self._failing[index])
+    
+    def prefix(self, count, failing_count):
+        # The first `count` customers followed by whichever of the first
+        # `failing_count` failing ones come later: everything a plan handing
+        # out both round robin from the start can reach, at the same indexes
+        prefix = CustomerRegistry()
+        count = min(count, len(self))
+        for index in range(count):
+            prefix.add(self.id_at(index), self.type_at(index))
+        for index in self._failing[:failing_count]:
+            if index >= count:
+                prefix.add(self.id_at(index), "failing")
+        return prefix
+    
+    def memory_size(self):
+        return (
+            len(self._ids)
+            + self._offsets.itemsize * len(self._offsets)
+            + len(self._types)
+            + self._failing.itemsize * len(self._failing)
+        )
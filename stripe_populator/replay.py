@@ -0,0 +1,152 @@
+import asyncio
+import json
+import os
+
+from .engine import Pipeline, Session, run_concurrently
+from .journal import RunJournal
+from .manifest import REPLAYED_ENDPOINTS, read_manifest, related_ids
+from .test_clocks import advance_test_clocks
+
+
+# Parameters holding timestamps, which move by the time between the original
+# run and the replay
+TIME_FIELDS = {"trial_end", "cancel_at", "start_date", "frozen_time"}
+
+
+def referenced_ids(value, known_ids):
+    # Old IDs of objects from the manifest that a request refers to
+    if isinstance(value, dict):
+        return {ref for item in value.values() for ref in referenced_ids(item, known_ids)}
+    if isinstance(value, list):
+        return {ref for item in value for ref in referenced_ids(item, known_ids)}
+    if isinstance(value, str) and value in known_ids:
+        return {value}
+    return set()
+
+
+def translate(value, new_ids, old_run_id, new_run_id, offset, key=None):
+    # The request as it is sent to the new account: manifest IDs swapped for
+    # the new ones, the run ID in tags and names for the replay's, and
+    # timestamps shifted
+    if isinstance(value, dict):
+        return {k: translate(v, new_ids, old_run_id, new_run_id, offset, k) for k, v in value.items()}
+    if isinstance(value, list):
+        return [translate(item, new_ids, old_run_id, new_run_id, offset) for item in value]
+    if isinstance(value, str):
+        if value in new_ids:
+            return new_ids[value]
+        return value.replace(old_run_id, new_run_id)
+    if key in TIME_FIELDS and isinstance(value, int):
+        return value + offset
+    return value
+
+
+async def replay_async(client, manifest_path, id_map_path=None, concurrency=None):
+    # Sends the requests recorded in a manifest to another account, with the
+    # same parameters and no data generation, as many at once as the rate
+    # limiter allows. A request waits only for the objects it refers to.
+    # Objects the original run didn't create (existing customers or prices it
+    # used) can't be replayed, so requests referring to them fail. Test clocks
+    # are advanced once everything is created. Returns a summary with the
+    # old-to-new ID map.
+    header, records = read_manifest(manifest_path)
+    session = Session(client, concurrency=concurrency)
+    journal = RunJournal.start({"replay": manifest_path, "source_run": header["run_id"]})
+    # In whole seconds on both sides, like the time the clocks are advanced
+    # to, so shifted clocks land exactly on it
+    offset = int(journal.started_at) - int(header["started_at"])
+    id_map_path = id_map_path or os.path.join(os.path.dirname(journal.path), f"{journal.run_id}.idmap.jsonl")
+    
+    print("=" * 60)
+    print(f"Replaying {len(records)} requests of run {header['run_id']} from {manifest_path}")
+    print(f"Replay run ID: {journal.run_id}")
+    print("=" * 60)
+    
+    known_ids = set()
+    for record in records:
+        known_ids.add(record["id"])
+        known_ids.update(record.get("related", []))
+    
+    pipeline = Pipeline()
+    new_ids = {}
+    failed = {}
+    
+    with open(id_map_path, "w", encoding="utf-8") as id_map_file:
+        
+        def map_ids(record, result):
+            # Requests waiting for these objects go ahead, or fail if this one did
+            new_related = result["related"] if result else []
+            for position, old_id in enumerate([record["id"]] + record.get("related", [])):
+                if result is None:
+                    new_id = None
+                elif position == 0:
+                    new_id = result["id"]
+                else:
+                    new_id = new_related[position - 1] if position <= len(new_related) else None
+                if new_id and old_id not in new_ids:
+                    new_ids[old_id] = new_id
+                    id_map_file.write(json.dumps({"old": old_id, "new": new_id}) + "\n")
+                pipeline.resolve("ids", old_id, new_id)
+        
+        async def replay_request(i, record):
+            result = None
+            try:
+                for old_id in referenced_ids([record["target"], record["params"]], known_ids):
+                    if await pipeline.wait("ids", old_id) is None:
+                        raise RuntimeError(f"{old_id} could not be replayed")
+                
+                method = client.v1
+                for name in REPLAYED_ENDPOINTS[record["endpoint"]].split("."):
+                    method = getattr(method, name)
+                args = [translate(record["target"], new_ids, header["run_id"], journal.run_id, offset)] if record["target"] else []
+                obj = await session.call(
+                    method,
+                    *args,
+                    params=translate(record["params"], new_ids, header["run_id"], journal.run_id, offset),
+                    options=journal.options("replay", i),
+                )
+                result = {"id": obj.id, "related": related_ids(obj), "endpoint": record["endpoint"]}
+                return result
+            except Exception as e:
+                failed[record["endpoint"]] = failed.get(record["endpoint"], 0) + 1
+                print(f"✗ Error replaying {record['endpoint']} {record['id']}: {e}")
+            finally:
+                map_ids(record, result)
+        
+        replayed = await run_concurrently(
+            records, replay_request, session.concurrency["replay"], phase="replay", metrics=session.metrics
+        )
+    
+    # Clocks end where the original run's did, shifted like everything else
+    test_clocks = [{"id": result["id"]} for result in replayed if result["endpoint"] == "TestClock.create"]
+    await advance_test_clocks(session, test_clocks, int(journal.started_at))
+    
+    counts = {}
+    for result in replayed:
+        counts[result["endpoint"]] = counts.get(result["endpoint"], 0) + 1
+    
+    rate_limiter = session.rate_limiter
+    print("\n" + "=" * 60)
+    print("Replay completed!")
+    print("=" * 60)
+    for endpoint in REPLAYED_ENDPOINTS:
+        if endpoint in counts or endpoint in failed:
+            failures = f", {failed[endpoint]} failed" if endpoint in failed else ""
+            print(f"  - {endpoint}: {counts.get(endpoint, 0)} replayed{failures}")
+    print(f"API requests: {rate_limiter.requests} ({rate_limiter.throttled} rate limited, {rate_limiter.retries} retried)")
+    print(f"ID map: {id_map_path} ({len(new_ids)} objects)")
+    print("=" * 60)
+    
+    return {
+        "run_id": journal.run_id,
+        "source_run_id": header["run_id"],
+        "replayed": counts,
+        "failed": failed,
+        "id_map": new_ids,
+        "id_map_path": id_map_path,
+        "api_requests": rate_limiter.requests,
+    }
+
+
+def replay(client, manifest_path, id_map_path=None, concurrency=None):
+    return asyncio.run(replay_async(client, manifest_path, id_map_path, concurrency))
@@ -0,0 +1,403 @@
+import asyncio
+import os
+import random
+import time
+from datetime import datetime
+
+from .budget import RunBudget
+from .cache import InventoryCache
+from .client import make_client
+from .compiler import (
+    clock_index,
+    compile_plan,
+    count_statuses,
+    count_test_clocks,
+    estimate_requests,
+    failing_statuses,
+    split_customers,
+)
+from .config import CACHE_PATH, CATALOG_CURRENCIES, RATE_LIMIT, TAX_TYPES
+from .customers import count_customer_requests, create_customers_with_payment_methods
+from .engine import DROPPED, Pipeline, PlannedObjects, Session
+from .inventory import (
+    SEARCH_DELAY,
+    discover_customers,
+    fetch_existing_customers,
+    fetch_existing_products_and_prices,
+    fetch_existing_tax_rates,
+    get_account_id,
+    sample_customers,
+    sync_inventory_cache,
+)
+from .journal import RunJournal
+from .manifest import Manifest
+from .metrics import format_duration
+from .products import build_catalog_index, create_products_and_prices
+from .ratelimit import AdaptiveRateLimiter
+from .registry import CustomerRegistry
+from .subscriptions import audit_subscriptions, create_subscriptions
+from .tax_rates import create_tax_rates
+from .test_clocks import advance_test_clocks, create_test_clocks, history_start
+
+
+async def load_inventory(session, exclude, cache_path, sync_events, customer_sample=None, failing_sample=None, rng=None):
+    # Returns (customer registry, existing products, existing tax rates, cache).
+    # Uses the local inventory cache when possible and falls back to listing
+    # everything. Without the cache, a run that only needs `customer_sample`
+    # existing customers samples that many instead of listing them all.
+    # Customers from earlier runs are found with the Search API first (none
+    # when the run uses no existing customers), so their failing or working
+    # cards are known; the search stops at `customer_sample` card and
+    # `failing_sample` failing-card customers. The cache keeps their types
+    # and, once a search got to the end, only searches what is new.
+    customers = CustomerRegistry()
+    cache = None
+    discover = customer_sample != 0
+    discover_counts = {"normal": customer_sample, "failing": failing_sample}
+    if cache_path:
+        try:
+            cache = InventoryCache(await get_account_id(session), cache_path)
+            await sync_inventory_cache(session, cache, apply_events=sync_events)
+            if discover:
+                discovery_started = int(time.time())
+                discovered = CustomerRegistry()
+                complete = await discover_customers(
+                    session, discovered, discover_counts, since=cache.get_cursor("discovery"), exclude=exclude
+                )
+                cache.set_customer_types(discovered)
+                if complete:
+                    cache.set_cursor("discovery", discovery_started - SEARCH_DELAY)
+            
+            cache.load_customers(customers, exclude=exclude)
+            existing_products = cache.load_prices(exclude=exclude)
+            existing_tax_rates = cache.load_tax_rates(exclude=exclude)
+            
+            total_taxes = len(existing_tax_rates["inclusive"]) + len(existing_tax_rates["exclusive"])
+            print(f"✓ Found {len(customers)} existing customers (cached)")
+            print(f"✓ Found {len(existing_products)} active recurring prices (cached)")
+            print(f"✓ Found {total_taxes} existing tax rates (cached)")
+            return customers, existing_products, existing_tax_rates, cache
+        except Exception as e:
+            print(f"✗ Error using inventory cache, fetching everything instead: {e}")
+            if cache:
+                cache.close()
+            customers = CustomerRegistry()
+    
+    # Customers with a working card come first, so round robin hands them
+    # out before any sampled or listed customer
+    if discover:
+        await discover_customers(session, customers, discover_counts, exclude=exclude)
+    exclude = set(exclude) | set(customers)
+    
+    if customer_sample is None:
+        await fetch_existing_customers(session, customers, exclude=exclude)
+    else:
+        num_card_customers = len(customers) - customers.failing_count
+        await sample_customers(session, customers, max(0, customer_sample - num_card_customers), exclude=exclude, rng=rng)
+    existing_products = await fetch_existing_products_and_prices(session, exclude=exclude)
+    existing_tax_rates = await fetch_existing_tax_rates(session, exclude=exclude)
+    return customers, existing_products, existing_tax_rates, None
+
+
+def target_rate_limiter(target_rate):
+    # The shared rate limiter, never sending more than target_rate requests
+    # per second and starting there if that is below its usual start
+    return AdaptiveRateLimiter(**{
+        **RATE_LIMIT,
+        "requests_per_second": min(RATE_LIMIT["requests_per_second"], target_rate),
+        "min_requests_per_second": min(RATE_LIMIT["min_requests_per_second"], target_rate),
+        "max_requests_per_second": target_rate,
+    })
+
+
+async def populate_async(plan, client=None, resume_run_id=None, cache_path=CACHE_PATH, sync_events=True, metrics_textfile=None,
+                         manifest_path=None, time_budget=None, target_rate=None):
+    journal = RunJournal.load(resume_run_id) if resume_run_id else None
+    if journal:
+        plan = journal.population_plan()
+    
+    if client is None:
+        client = make_client(os.environ.get("STRIPE_API_KEY"))
+    # With a time budget, the plan's quantities are the most the run creates
+    # and the budget's clock starts now, listing existing data included
+    session = Session(client, rate_limiter=target_rate_limiter(target_rate) if target_rate else None, concurrency=plan.concurrency)
+    budget = session.budget = RunBudget(time_budget, plan, session.rate_limiter.max_rate) if time_budget else None
+    
+    print("=" * 60)
+    if journal:
+        print(f"Resuming Stripe account population run {journal.run_id}")
+    else:
+        print("Starting Stripe account population")
+    if budget:
+        print(f"Time budget: {format_duration(time_budget)}; the plan's quantities are the most that will be created")
+    if target_rate:
+        print(f"Target request rate: {target_rate:g}/s")
+    print("=" * 60)
+    
+    # 1. Fetch all existing data. Objects created by an interrupted run are
+    # left out here and come back from the journal with their real type.
+    # Subscriptions are handed customers round robin, so they never reach
+    # more existing customers than there are subscriptions, and on test
+    # clocks none at all. Only those are kept, and a resumed run takes them
+    # from the journal instead of sampling again.
+    created_ids = journal.created_ids() if journal else set()
+    resumed_customers = journal.existing_customers if journal else None
+    num_failing_subscriptions = sum(count_statuses(plan)[status] for status in failing_statuses(plan))
+    
+    print()
+    customers, existing_products, existing_tax_rates, cache = await load_inventory(
+        session, created_ids, cache_path, sync_events,
+        customer_sample=0 if plan.history_months or resumed_customers is not None else plan.subscriptions,
+        failing_sample=num_failing_subscriptions,
+        rng=random.Random(f"{plan.seed}:sample") if plan.seed is not None else None,
+    )
+    if resumed_customers is not None:
+        customers = CustomerRegistry()
+        for customer_id, customer_type in resumed_customers:
+            customers.add(customer_id, customer_type)
+        print(f"✓ Reusing the run's {len(customers)} existing customers from its journal")
+    elif plan.history_months:
+        customers = CustomerRegistry()
+    else:
+        customers = customers.prefix(plan.subscriptions, num_failing_subscriptions)
+    num_existing_customers = len(customers)
+    
+    # 2. Start or resume the run journal
+    if journal:
+        create_new_tax_rates = journal.plan["create_tax_rates"]
+    else:
+        # Create new tax rates only if creating products and no existing tax rates
+        has_existing_tax_rates = len(existing_tax_rates["inclusive"]) > 0 or len(existing_tax_rates["exclusive"]) > 0
+        create_new_tax_rates = not has_existing_tax_rates and plan.products > 0
+        
+        journal = RunJournal.start({**plan.to_dict(), "create_tax_rates": create_new_tax_rates})
+    
+    if journal.existing_customers is None:
+        journal.record_existing_customers(customers)
+    print(f"\nRun ID: {journal.run_id} (continue an interrupted run with --resume {journal.run_id})")
+    
+    # The metrics report and Prometheus textfile are rewritten after every phase
+    metrics = session.metrics
+    metrics_prefix = os.path.splitext(journal.path)[0]
+    metrics.set_output(journal.run_id, f"{metrics_prefix}.metrics.json", metrics_textfile or f"{metrics_prefix}.prom")
+    
+    # Every request that builds the dataset is streamed to the manifest, for
+    # other test suites and for --replay. It is closed however the run ends,
+    # since a .gz manifest can't be read until it is.
+    session.manifest = Manifest(manifest_path or f"{metrics_prefix}.manifest.jsonl", journal.run_id, journal.started_at)
+    
+    try:
+        # 3. Determine tax rates strategy. New tax rates are created alongside
+        # everything else; products only need their IDs once their price exists.
+        pipeline = Pipeline()
+        new_tax_rates_created = False
+        
+        if create_new_tax_rates:
+            tax_rates_by_type = asyncio.ensure_future(create_tax_rates(session, journal, pipeline=pipeline))
+            new_tax_rates_created = True
+        elif len(existing_tax_rates["inclusive"]) > 0 or len(existing_tax_rates["exclusive"]) > 0:
+            # Use existing tax rates
+            tax_rates_by_type = existing_tax_rates
+        else:
+            # No tax rates needed
+            tax_rates_by_type = {"inclusive": [], "exclusive": []}
+        
+        # 4. Plan the combined pools subscriptions pick from: existing data
+        # followed by what this run will create. With a billing history, new
+        # customers go on test clocks and subscriptions only use them, since
+        # existing customers aren't on a clock.
+        num_normal, num_failing = split_customers(plan.customers)
+        num_test_clocks = count_test_clocks(plan)
+        clock_start = history_start(journal, plan.history_months) if plan.history_months else None
+        planned_test_clocks = PlannedObjects(pipeline, 0, None, [("test_clocks", num_test_clocks)], field="id")
+        # A time budget shrinks the new part of each pool as it scales the quotas
+        planned_customers = PlannedObjects(
+            pipeline, 0 if plan.history_months else num_existing_customers, customers.id_at,
+            [("customers_normal", num_normal), ("customers_failing", num_failing)], field="id", budget=budget,
+        )
+        planned_failing_customers = PlannedObjects(
+            pipeline, 0 if plan.history_months else customers.failing_count, customers.failing_id_at,
+            [("customers_failing", num_failing)], field="id", budget=budget,
+        )
+        planned_products = PlannedObjects(
+            pipeline, len(existing_products), existing_products.__getitem__, [("products", plan.products)], budget=budget,
+        )
+        
+        # 5. Decide every status, card count, interval and assignment up front,
+        # for the whole plan whatever a time budget makes of it, so a resumed run
+        # makes the same choices
+        num_customers = planned_customers.num_existing + plan.customers
+        num_products = planned_products.num_existing + plan.products
+        started = time.perf_counter()
+        compiled = compile_plan(
+            plan, journal.seed, num_customers, planned_failing_customers.num_existing + num_failing, num_products
+        )
+        metrics.add_generation("plan", time.perf_counter() - started)
+        planned_requests = sum(estimate_requests(plan, create_new_tax_rates).values())
+        
+        print("\n" + "=" * 60)
+        print("Data summary:")
+        print(f"  - Existing customers: {num_existing_customers} ({customers.failing_count} with a failing card)")
+        print(f"  - New normal customers: {num_normal}")
+        print(f"  - New failing customers: {num_failing}")
+        print(f"  - Total customers: {num_customers}")
+        print(f"  - Existing products/prices: {len(existing_products)}")
+        print(f"  - New products/prices: {plan.products}")
+        if plan.prices_per_product > 1:
+            print(f"  - Prices per new product: {plan.prices_per_product} (in {', '.join(CATALOG_CURRENCIES)})")
+        print(f"  - Total products/prices: {num_products}")
+        if create_new_tax_rates:
+            print(f"  - Tax rates (new): {len(TAX_TYPES)}")
+        elif tax_rates_by_type["inclusive"] or tax_rates_by_type["exclusive"]:
+            print(f"  - Tax rates (existing): {len(tax_rates_by_type['inclusive']) + len(tax_rates_by_type['exclusive'])}")
+        if num_test_clocks:
+            print(f"  - Test clocks: {num_test_clocks} (billing history from {datetime.fromtimestamp(clock_start):%Y-%m-%d})")
+        print(f"  - Planned API requests: {planned_requests} (plus listing and retries)")
+        print("=" * 60)
+        
+        # 6. Create products, customers and subscriptions at the same time. Each
+        # subscription starts as soon as its own customer and price exist.
+        test_clocks, new_products, (new_customers_normal, new_customers_failing), subscriptions = await asyncio.gather(
+            create_test_clocks(session, num_test_clocks, clock_start, journal, pipeline),
+            create_products_and_prices(
+                session, tax_rates_by_type, plan.products, journal, compiled, pipeline=pipeline,
+                prices_per_product=plan.prices_per_product,
+            ),
+            create_customers_with_payment_methods(
+                session, plan.customers, journal, compiled, pipeline=pipeline,
+                test_clocks=planned_test_clocks if num_test_clocks else None,
+            ),
+            create_subscriptions(
+                session, planned_customers, planned_failing_customers, planned_products, plan.subscriptions, journal, compiled,
+                history_start=clock_start,
+            ),
+        )
+        
+        # 7. Generate the billing history: every clock is moved up to the start
+        # of the run. Clocks whose customers a time budget left out stay empty
+        # and aren't advanced.
+        clocks_to_advance = test_clocks
+        if budget and test_clocks:
+            used_clocks = {clock_index(i) for i in range(budget.quota("customers_normal", num_normal))}
+            used_clocks |= {clock_index(num_normal + i) for i in range(budget.quota("customers_failing", num_failing))}
+            clocks_to_advance = [await pipeline.wait("test_clocks", k) for k in sorted(used_clocks)]
+            clocks_to_advance = [clock for clock in clocks_to_advance if clock is not None and clock is not DROPPED]
+        await advance_test_clocks(session, clocks_to_advance, int(journal.started_at))
+    finally:
+        session.manifest.close()
+    
+    # 8. Check the statuses the subscriptions actually reached. On test
+    # clocks, objects are created at clock time.
+    audit = await audit_subscriptions(session, journal, subscriptions, clock_start or int(journal.started_at))
+    
+    if new_tax_rates_created:
+        tax_rates_by_type = await tax_rates_by_type
+    total_taxes = len(tax_rates_by_type['inclusive']) + len(tax_rates_by_type['exclusive'])
+    
+    customers.extend(new_customers_normal)
+    customers.extend(new_customers_failing)
+    
+    if cache:
+        # Keep the cache in step with what this run created, including which
+        # customers have a failing card
+        created = int(journal.started_at)
+        cache.add_customers(
+            ({**customer, "created": created} for customer in new_customers_normal + new_customers_failing),
+            replace=True,
+        )
+        cache.add_prices({**product, "created": created} for product in new_products)
+        if new_tax_rates_created:
+            cache.add_tax_rates(
+                {"id": tax_rate_id, "inclusive": tax_type == "inclusive", "created": created}
+                for tax_type, tax_rate_ids in tax_rates_by_type.items()
+                for tax_rate_id in tax_rate_ids
+            )
+        cache.close()
+    
+    rate_limiter = session.rate_limiter
+    print("\n" + "\n" + "=" * 60)
+    print("Completed!")
+    print("=" * 60)
+    print("Created NEW:")
+    if new_tax_rates_created:
+        print(f"  - Tax rates: {total_taxes}")
+    if num_test_clocks:
+        print(f"  - Test clocks: {len(test_clocks)}")
+    print(f"  - Products with prices: {len(new_products)}")
+    catalog = build_catalog_index(new_products)
+    if plan.prices_per_product > 1:
+        print(f"  - Prices: {sum(len(prices) for prices in catalog.values())} in {len(catalog)} interval/currency/tax combinations")
+    print(f"  - Normal customers: {len(new_customers_normal)}")
+    print(f"  - Failing customers: {len(new_customers_failing)}")
+    print(f"  - Subscriptions: {len(subscriptions)}")
+    new_customers = new_customers_normal + new_customers_failing
+    requests_per_customer = count_customer_requests(new_customers) / len(new_customers) if new_customers else 0
+    if new_customers:
+        print(f"Requests per customer: {requests_per_customer:.2f}")
+    print(f"API requests: {rate_limiter.requests} ({rate_limiter.throttled} rate limited, {rate_limiter.retries} retried)")
+    if target_rate:
+        print(f"Request rate: {rate_limiter.requests / (time.monotonic() - metrics.started):.1f}/s (target {target_rate:g}/s)")
+    if budget:
+        budget_report = budget.report()
+        reached = "reached" if budget_report["expired"] else "not reached"
+        print(
+            f"Time budget: {format_duration(budget_report['used_seconds'])} of {format_duration(time_budget)} "
+            f"({reached}), {budget_report['scale']:.0%} of the plan ({budget.describe()})"
+        )
+    print(
+        f"Time generating data: {sum(metrics.generation_seconds.values()):.1f}s "
+        f"(requests: {metrics.network_seconds():.1f}s summed over all requests)"
+    )
+    for endpoint, stats in metrics.report()["endpoints"].items():
+        retried = f", {stats['retries']} retried" if stats["retries"] else ""
+        print(
+            f"  - {endpoint}: {stats['calls']} calls, p50 ≤ {stats['latency_p50'] * 1000:.0f}ms, "
+            f"p99 ≤ {stats['latency_p99'] * 1000:.0f}ms{retried}"
+        )
+    http_client = getattr(client, "http_client", None)
+    if http_client is not None and http_client.requests:
+        reused = 1 - http_client.connections / http_client.requests
+        print(
+            f"Connections: {http_client.connections} opened for {http_client.requests} requests "
+            f"({reused:.0%} reused, {http_client.tls_handshakes} TLS handshakes, pool of {http_client.pool_size})"
+        )
+    metrics.export()
+    print(f"Metrics: {metrics.json_path}, {metrics.textfile_path}")
+    print(f"Manifest: {session.manifest.path} ({session.manifest.records} requests)")
+    print("=" * 60)
+    
+    return {
+        "run_id": journal.run_id,
+        "tax_rates": tax_rates_by_type if new_tax_rates_created else {"inclusive": [], "exclusive": []},
+        "test_clocks": test_clocks,
+        "products": new_products,
+        "catalog": catalog,
+        "customers_normal": new_customers_normal,
+        "customers_failing": new_customers_failing,
+        "subscriptions": subscriptions,
+        "audit": audit,
+        "existing": {
+            "customers": num_existing_customers,
+            "products": len(existing_products),
+            "tax_rates": 0 if new_tax_rates_created else total_taxes,
+        },
+        "api_requests": rate_limiter.requests,
+        "requests_per_customer": requests_per_customer,
+        "budget": budget.report() if budget else None,
+        "manifest": session.manifest.path,
+    }
+
+
+def populate(plan, client=None, resume_run_id=None, cache_path=CACHE_PATH, sync_events=True, metrics_textfile=None,
+             manifest_path=None, time_budget=None, target_rate=None):
+    # Synchronous entry point for scripts and test harnesses. Returns the
+    # summary dict of populate_async(), including the IDs that were created.
+    # Pass cache_path=None to always list the account instead of using the
+    # local inventory cache. With time_budget (seconds), the plan is scaled
+    # down as needed to finish in time; target_rate caps the requests per
+    # second.
+    return asyncio.run(
+        populate_async(
+            plan, client, resume_run_id, cache_path, sync_events, metrics_textfile, manifest_path, time_budget, target_rate
+        )
+    )
@@ -0,0 +1,162 @@
+import contextlib
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+from .config import CACHE_PATH, RUNS_DIRECTORY
+from .plan import Plan
+
+
+def parse_target(target, api_key=None):
+    # A shard target is its own test API key, or a connected account ID that
+    # is reached with the platform's key and the Stripe-Account header
+    if target.startswith("acct_"):
+        if not api_key:
+            raise ValueError(f"Connected account {target} needs a platform API key (--api-key or STRIPE_API_KEY)")
+        return {"api_key": api_key, "stripe_account": target, "label": target}
+    if target.startswith("sk_test_"):
+        return {"api_key": target, "stripe_account": None, "label": f"sk_test_…{target[-4:]}"}
+    raise ValueError(f"Invalid shard {target!r}: expected a test API key (sk_test_...) or a connected account ID (acct_...)")
+
+
+def read_targets_file(path):
+    # One target per line; blank lines and # comments are ignored
+    with open(path, encoding="utf-8") as targets_file:
+        lines = [line.split("#", 1)[0].strip() for line in targets_file]
+    return [line for line in lines if line]
+
+
+def run_shard(shard):
+    # Runs in a worker process with its own client, rate limiter and event
+    # loop. Output goes to the shard's log file instead of being interleaved
+    # with the other shards.
+    from .client import make_client
+    from .runner import populate
+    
+    started = time.monotonic()
+    with open(shard["log_path"], "w", encoding="utf-8") as log_file, contextlib.redirect_stdout(log_file):
+        try:
+            client = make_client(shard["api_key"], stripe_account=shard["stripe_account"], **shard["client_options"])
+            result = populate(
+                Plan.from_dict(shard["plan"]),
+                client,
+                cache_path=shard["cache_path"],
+                sync_events=shard["sync_events"],
+                time_budget=shard["time_budget"],
+                target_rate=shard["target_rate"],
+            )
+        except Exception as e:
+            print(f"✗ Shard failed: {e}")
+            return {"error": f"{type(e).__name__}: {e}", "seconds": time.monotonic() - started}
+    
+    return {**result, "seconds": time.monotonic() - started}
+
+
+def populate_sharded(plan, targets, api_key=None, processes=None, cache_path=CACHE_PATH, sync_events=True,
+                     client_options=None, log_directory=None, time_budget=None, target_rate=None):
+    # Splits the plan's quotas across the targets and populates each one in a
+    # separate process, so every account's own rate limit is used in full.
+    # A time budget and target rate apply to each shard on its own. Returns
+    # an aggregate report with one entry per shard.
+    shards = [parse_target(target, api_key) for target in targets]
+    if not shards:
+        raise ValueError("No shards given")
+    
+    log_directory = log_directory or os.path.join(RUNS_DIRECTORY, f"shards-{datetime.now().strftime('%Y%m%d-%H%M%S')}")
+    os.makedirs(log_directory, exist_ok=True)
+    
+    for index, (shard, shard_plan) in enumerate(zip(shards, plan.split(len(shards)))):
+        shard.update({
+            "index": index,
+            "plan": shard_plan.to_dict(),
+            "log_path": os.path.join(log_directory, f"shard-{index + 1}.log"),
+            "cache_path": cache_path,
+            "sync_events": sync_events,
+            "client_options": client_options or {},
+            "time_budget": time_budget,
+            "target_rate": target_rate,
+        })
+    
+    processes = processes or min(len(shards), os.cpu_count() or 1)
+    print("=" * 60)
+    print(f"Populating {len(shards)} shards in {processes} processes")
+    print("=" * 60)
+    for shard in shards:
+        shard_plan = shard["plan"]
+        print(
+            f"  → Shard {shard['index'] + 1} ({shard['label']}): {shard_plan['products']} products, "
+            f"{shard_plan['customers']} customers, {shard_plan['subscriptions']} subscriptions"
+        )
+    print(f"Shard logs: {log_directory}")
+    
+    started = time.monotonic()
+    results = [None] * len(shards)
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = {executor.submit(run_shard, shard): shard for shard in shards}
+        for future in as_completed(futures):
+            shard = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {"error": f"{type(e).__name__}: {e}", "seconds": 0}
+            results[shard["index"]] = result
+            
+            if "error" in result:
+                print(f"✗ Shard {shard['index'] + 1} ({shard['label']}) failed: {result['error']} (see {shard['log_path']})")
+            else:
+                print(
+                    f"✓ Shard {shard['index'] + 1} ({shard['label']}) finished in {result['seconds']:.1f}s "
+                    f"(run {result['run_id']}, {result['api_requests']} API requests)"
+                )
+    
+    return merge_shard_results(shards, results, time.monotonic() - started)
+
+
+def merge_shard_results(shards, results, seconds):
+    totals = {"tax_rates": 0, "products": 0, "customers_normal": 0, "customers_failing": 0, "subscriptions": 0, "api_requests": 0}
+    report = []
+    for shard, result in zip(shards, results):
+        entry = {"shard": shard["index"] + 1, "target": shard["label"], "log": shard["log_path"], "seconds": round(result["seconds"], 1)}
+        if "error" in result:
+            entry["error"] = result["error"]
+        else:
+            counts = {
+                "tax_rates": len(result["tax_rates"]["inclusive"]) + len(result["tax_rates"]["exclusive"]),
+                "products": len(result["products"]),
+                "customers_normal": len(result["customers_normal"]),
+                "customers_failing": len(result["customers_failing"]),
+                "subscriptions": len(result["subscriptions"]),
+                "api_requests": result["api_requests"],
+            }
+            for key, value in counts.items():
+                totals[key] += value
+            entry.update({"run_id": result["run_id"], **counts})
+        report.append(entry)
+    
+    failed = [entry for entry in report if "error" in entry]
+    print("\n" + "=" * 60)
+    print(f"Completed {len(report) - len(failed)}/{len(report)} shards in {seconds:.1f}s")
+    print("=" * 60)
+    print("Created NEW (all shards):")
+    print(f"  - Tax rates: {totals['tax_rates']}")
+    print(f"  - Products with prices: {totals['products']}")
+    print(f"  - Normal customers: {totals['customers_normal']}")
+    print(f"  - Failing customers: {totals['customers_failing']}")
+    print(f"  - Subscriptions: {totals['subscriptions']}")
+    print(f"API requests: {totals['api_requests']} ({totals['api_requests'] / seconds:.1f}/s across all shards)")
+    print("Per shard:")
+    for entry in report:
+        if "error" in entry:
+            print(f"  ✗ {entry['shard']}. {entry['target']}: {entry['error']}")
+        else:
+            print(
+                f"  ✓ {entry['shard']}. {entry['target']}: run {entry['run_id']}, {entry['products']} products, "
+                f"{entry['customers_normal'] + entry['customers_failing']} customers, {entry['subscriptions']} subscriptions "
+                f"in {entry['seconds']}s"
+            )
+    if failed:
+        print("Resume a failed shard with --resume <run-id> and its key (run IDs are in the shard logs)")
+    print("=" * 60)
+    
+    return {**totals, "seconds": round(seconds, 1), "shards": report}
@@ -0,0 +1,219 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from .compiler import STATUSES
+from .config import SUBSCRIPTION_STATUS_DISTRIBUTION
+from .engine import DROPPED, Pipeline, run_concurrently
+from .profiles import item_random
+from .purge import list_tagged
+
+
+async def create_subscriptions(session, customers, failing_customers, products_with_prices, num_subscriptions, journal, compiled,
+                               concurrency=None, history_start=None):
+    # The customer and product pools are PlannedObjects: existing objects plus
+    # the ones other phases are still creating. Each subscription's status,
+    # customer and price index come from the compiled plan, and it waits only
+    # for the customer and price it was given. With history_start, customers
+    # are on test clocks frozen at that time, and subscriptions are set up to
+    # reach their status while the clocks are advanced to the run's start.
+    concurrency = concurrency or session.concurrency["subscriptions"]
+    print(f"\nCreating {num_subscriptions} NEW subscriptions with different statuses ({concurrency} in flight)...")
+    
+    if len(customers) == 0:
+        print("✗ No customers available. Cannot create subscriptions.")
+        return []
+    
+    if len(products_with_prices) == 0:
+        print("✗ No products/prices available. Cannot create subscriptions.")
+        return []
+    
+    # Dates are relative to the start of the run, so a resumed item sends the
+    # same parameters as the original attempt
+    run_started = datetime.fromtimestamp(journal.started_at)
+    clock_started = datetime.fromtimestamp(history_start) if history_start else None
+    history_days = (run_started - clock_started).days if history_start else 0
+    subscriptions_api = session.client.v1.subscriptions
+    
+    async def create_subscription(i, _):
+        try:
+            rng = item_random(journal, "subscriptions", i)
+            desired_status = STATUSES[compiled["subscription_statuses"][i]]
+            
+            if desired_status in compiled["failing_statuses"] and len(failing_customers) > 0:
+                customer_id = await failing_customers.get(compiled["subscription_customers"][i])
+            else:
+                customer_id = await customers.get(compiled["subscription_customers"][i])
+            
+            product_data = await products_with_prices.get(compiled["subscription_prices"][i])
+            
+            if customer_id is None or product_data is None:
+                print(f"✗ Error creating subscription {i+1}: its customer or price could not be created")
+                return None
+            
+            # Handle scheduled subscriptions with Subscription Schedules
+            if desired_status == "scheduled":
+                start_date = int((run_started + timedelta(days=rng.randint(7, 30))).timestamp())
+                
+                schedule = await session.call(
+                    session.client.v1.subscription_schedules.create_async,
+                    params={
+                        "customer": customer_id,
+                        "start_date": start_date,
+                        "end_behavior": "release",
+                        "metadata": journal.metadata,
+                        "phases": [
+                            {
+                                "items": [{"price": product_data["price_id"]}],
+                                "default_tax_rates": product_data["tax_rates"] if product_data["tax_rates"] else [],
+                                # Tags the subscription the schedule starts
+                                "metadata": journal.metadata,
+                            }
+                        ],
+                    },
+                    options=journal.options("subscriptions", i),
+                )
+                
+                return {"id": schedule.id, "status": desired_status}
+            
+            # Regular subscription creation for all other statuses
+            subscription_params = {
+                "customer": customer_id,
+                "items": [{"price": product_data["price_id"]}],
+                "metadata": journal.metadata,
+            }
+            
+            if product_data["tax_rates"]:
+                subscription_params["default_tax_rates"] = product_data["tax_rates"]
+            
+            if clock_started and desired_status in ("past_due", "unpaid"):
+                # Renewals start failing on the customer's failing card after a
+                # short trial, and Stripe's dunning moves the subscription on
+                trial_end = int((clock_started + timedelta(days=rng.randint(1, 7))).timestamp())
+                subscription_params["trial_end"] = trial_end
+            elif clock_started and desired_status == "canceled":
+                # Cancels itself partway through the history
+                cancel_at = int((clock_started + timedelta(days=rng.randint(min(30, history_days - 1), history_days - 1))).timestamp())
+                subscription_params["cancel_at"] = cancel_at
+            elif desired_status == "active":
+                pass
+            elif desired_status == "active_with_end":
+                cancel_at = int((run_started + timedelta(days=rng.randint(30, 90))).timestamp())
+                subscription_params["cancel_at"] = cancel_at
+            elif desired_status == "trialing":
+                trial_end = int((run_started + timedelta(days=rng.randint(7, 30))).timestamp())
+                subscription_params["trial_end"] = trial_end
+            elif desired_status == "canceled":
+                pass
+            elif desired_status == "past_due":
+                subscription_params["payment_behavior"] = "default_incomplete"
+            elif desired_status == "unpaid":
+                subscription_params["payment_behavior"] = "default_incomplete"
+            elif desired_status == "paused":
+                pass
+            
+            subscription = await session.call(
+                subscriptions_api.create_async,
+                params=subscription_params,
+                options=journal.options("subscriptions", i),
+            )
+            
+            return {"id": subscription.id, "status": desired_status}
+            
+        except Exception as e:
+            print(f"✗ Error creating subscription {i+1}: {e}")
+    
+    # Stripe can't create a subscription canceled or paused, so those take a
+    # second request. It runs as a phase of its own that waits for each
+    # subscription through the pipeline, so creating workers go straight on
+    # to the next subscription instead of waiting for the follow-up.
+    def needs_follow_up(i):
+        status = STATUSES[compiled["subscription_statuses"][i]]
+        return status == "paused" or (status == "canceled" and not clock_started)
+    
+    async def follow_up(_, i):
+        try:
+            subscription = await pipeline.wait("subscriptions", i)
+            if subscription is None or subscription is DROPPED:
+                return subscription
+            
+            if subscription["status"] == "canceled":
+                await session.call(
+                    subscriptions_api.cancel_async,
+                    subscription["id"],
+                    options=journal.options("subscriptions", i, "cancel"),
+                )
+            else:
+                await session.call(
+                    subscriptions_api.update_async,
+                    subscription["id"],
+                    params={"pause_collection": {"behavior": "keep_as_draft"}},
+                    options=journal.options("subscriptions", i, "pause"),
+                )
+            return {"id": subscription["id"]}
+            
+        except Exception as e:
+            print(f"✗ Error setting the status of subscription {i+1}: {e}")
+    
+    pipeline = Pipeline()
+    subscriptions, _ = await asyncio.gather(
+        run_concurrently(
+            range(num_subscriptions), create_subscription, concurrency, journal, "subscriptions", pipeline, session.metrics,
+            session.budget,
+        ),
+        run_concurrently(
+            [i for i in range(num_subscriptions) if needs_follow_up(i)], follow_up, concurrency, journal,
+            "subscription_followups", metrics=session.metrics,
+        ),
+    )
+    
+    return subscriptions
+
+
+def observed_status(obj):
+    # Which of SUBSCRIPTION_STATUS_DISTRIBUTION's statuses a subscription or
+    # schedule actually has in Stripe
+    if obj.object == "subscription_schedule":
+        return "scheduled" if obj.status == "not_started" else f"schedule_{obj.status}"
+    if obj.status == "active" and getattr(obj, "pause_collection", None):
+        return "paused"
+    if obj.status == "active" and getattr(obj, "cancel_at", None):
+        return "active_with_end"
+    return obj.status
+
+
+async def audit_subscriptions(session, journal, planned, created_after):
+    # Lists what the run created (tagged with its run ID, created since
+    # created_after) with partitioned listing in parallel, a request per 100
+    # subscriptions, and compares the statuses Stripe reports with
+    # SUBSCRIPTION_STATUS_DISTRIBUTION and with what the run planned.
+    print("\nAuditing subscription statuses in Stripe...")
+    v1 = session.client.v1
+    run_ids = {journal.run_id}
+    subscriptions, schedules = await asyncio.gather(
+        list_tagged(session, v1.subscriptions.list_async, run_ids, {"status": "all"}, created_after),
+        list_tagged(session, v1.subscription_schedules.list_async, run_ids, created_after=created_after),
+    )
+    
+    observed = {}
+    for obj in list(subscriptions.values()) + list(schedules.values()):
+        status = observed_status(obj)
+        observed[status] = observed.get(status, 0) + 1
+    
+    intended = {}
+    for subscription in planned:
+        intended[subscription["status"]] = intended.get(subscription["status"], 0) + 1
+    
+    total = sum(observed.values())
+    unexpected = sorted(set(observed) - set(SUBSCRIPTION_STATUS_DISTRIBUTION))
+    
+    print("\n" + "=" * 60)
+    print(f"Subscription status distribution in Stripe ({total} found, {len(planned)} created):")
+    for status in list(SUBSCRIPTION_STATUS_DISTRIBUTION) + unexpected:
+        count = observed.get(status, 0)
+        percentage = (count / total * 100) if total > 0 else 0
+        target = SUBSCRIPTION_STATUS_DISTRIBUTION.get(status, 0) * 100
+        marker = "✓" if count == intended.get(status, 0) else "⚠"
+        print(f"  {marker} {status}: {count} ({percentage:.1f}%, target {target:.0f}%, planned {intended.get(status, 0)})")
+    print("=" * 60)
+    
+    return observed
@@ -0,0 +1,38 @@
+from .config import TAX_TYPES
+from .engine import run_concurrently
+
+
+async def create_tax_rates(session, journal, concurrency=None, pipeline=None):
+    concurrency = concurrency or session.concurrency["tax_rates"]
+    print("\nCreating tax rates...")
+    tax_rates_by_type = {
+        "inclusive": [],
+        "exclusive": []
+    }
+    
+    async def create_tax_rate(i, tax):
+        try:
+            tax_rate = await session.call(
+                session.client.v1.tax_rates.create_async,
+                params={
+                    "display_name": tax["display_name"],
+                    "description": tax["description"],
+                    "percentage": tax["percentage"],
+                    "inclusive": tax["inclusive"],
+                    "metadata": journal.metadata,
+                },
+                options=journal.options("tax_rates", i),
+            )
+            
+            print(f"✓ Created tax rate: {tax['display_name']}")
+            return {"id": tax_rate.id, "inclusive": tax["inclusive"]}
+        except Exception as e:
+            print(f"✗ Error creating tax rate {tax['display_name']}: {e}")
+    
+    for tax_rate in await run_concurrently(TAX_TYPES, create_tax_rate, concurrency, journal, "tax_rates", pipeline, session.metrics):
+        if tax_rate["inclusive"]:
+            tax_rates_by_type["inclusive"].append(tax_rate["id"])
+        else:
+            tax_rates_by_type["exclusive"].append(tax_rate["id"])
+    
+    return tax_rates_by_type
@@ -0,0 +1,121 @@
+import asyncio
+from datetime import datetime
+
+import stripe
+
+from .config import RUN_METADATA_KEY, TEST_CLOCKS
+from .engine import DROPPED, run_concurrently
+
+
+DAY = 24 * 60 * 60
+
+
+def history_start(journal, months):
+    # Clocks start this far before the run and are advanced up to its start,
+    # so the history ends in the present. Months count as 30 days.
+    return int(journal.started_at) - months * 30 * DAY
+
+
+def clock_name(run_id, index):
+    # Test clocks have no metadata, so the run ID goes in the name for --purge
+    return f"{RUN_METADATA_KEY} {run_id} #{index + 1}"
+
+
+def clock_run_id(name):
+    parts = (name or "").split(" ")
+    return parts[1] if len(parts) == 3 and parts[0] == RUN_METADATA_KEY else None
+
+
+async def create_test_clocks(session, num_clocks, frozen_time, journal, pipeline=None):
+    if num_clocks == 0:
+        return []
+    
+    concurrency = session.concurrency["test_clocks"]
+    print(
+        f"\nCreating {num_clocks} test clocks frozen at {datetime.fromtimestamp(frozen_time):%Y-%m-%d} "
+        f"({concurrency} in flight)..."
+    )
+    test_clocks_api = session.client.v1.test_helpers.test_clocks
+    
+    async def create_test_clock(i, _):
+        if session.budget and not await session.budget.wait(lambda: session.budget.needs_test_clock(i)):
+            # Its customers were left out to fit the time budget
+            return DROPPED
+        try:
+            test_clock = await session.call(
+                test_clocks_api.create_async,
+                params={"frozen_time": frozen_time, "name": clock_name(journal.run_id, i)},
+                options=journal.options("test_clocks", i),
+            )
+            return {"id": test_clock.id}
+        except Exception as e:
+            print(f"✗ Error creating test clock {i+1}: {e}")
+    
+    # With a time budget, clocks are created in the order its quotas come to
+    # need them, so waiting for one never holds back another
+    order = sorted(range(num_clocks), key=session.budget.clock_share) if session.budget else None
+    return await run_concurrently(
+        range(num_clocks), create_test_clock, concurrency, journal, "test_clocks", pipeline, session.metrics, order=order
+    )
+
+
+async def advance_test_clock(session, test_clock_id, target):
+    # Moves the clock to `target` one step at a time and waits after each step
+    # until Stripe has generated the invoices, charges and dunning transitions
+    # of the time skipped. Stripe refuses steps longer than two billing
+    # intervals of the shortest subscription on the clock, so a refused step
+    # is halved. Returns the number of steps taken.
+    test_clocks_api = session.client.v1.test_helpers.test_clocks
+    step = TEST_CLOCKS["advance_days"] * DAY
+    test_clock = await session.call(test_clocks_api.retrieve_async, test_clock_id)
+    steps = 0
+    
+    while test_clock.status == "advancing" or test_clock.frozen_time < target:
+        if test_clock.status != "advancing":
+            try:
+                test_clock = await session.call(
+                    test_clocks_api.advance_async,
+                    test_clock_id,
+                    params={"frozen_time": min(test_clock.frozen_time + step, target)},
+                )
+            except stripe.InvalidRequestError:
+                if step <= DAY:
+                    raise
+                step //= 2
+                continue
+            steps += 1
+        
+        while test_clock.status == "advancing":
+            await asyncio.sleep(TEST_CLOCKS["poll_interval"])
+            test_clock = await session.call(test_clocks_api.retrieve_async, test_clock_id)
+        
+        if test_clock.status != "ready":
+            raise RuntimeError(f"test clock is {test_clock.status}")
+    
+    return steps
+
+
+async def advance_test_clocks(session, test_clocks, target):
+    # All clocks advance at the same time; each one only waits for itself
+    if not test_clocks:
+        return []
+    
+    concurrency = session.concurrency["test_clocks"]
+    print(
+        f"\nAdvancing {len(test_clocks)} test clocks to {datetime.fromtimestamp(target):%Y-%m-%d} "
+        f"({concurrency} in flight)..."
+    )
+    
+    async def advance(i, test_clock):
+        try:
+            steps = await advance_test_clock(session, test_clock["id"], target)
+            return {"id": test_clock["id"], "steps": steps}
+        except Exception as e:
+            print(f"✗ Error advancing test clock {test_clock['id']}: {e}")
+    
+    advanced = await run_concurrently(
+        test_clocks, advance, concurrency, phase="advance_test_clocks", metrics=session.metrics
+    )
+    steps = sum(test_clock["steps"] for test_clock in advanced)
+    print(f"✓ Advanced {len(advanced)} test clocks in {steps} steps")
+    return advanced
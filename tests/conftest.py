@@ -0,0 +1,35 @@
+import os
+import sys
+import threading
+
+import pytest
+
+from stripe_populator.client import make_client
+
+# benchmarks/ isn't a package
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+
+@pytest.fixture
+def fake_stripe(tmp_path, monkeypatch):
+    # Starts the benchmarks' fake Stripe API in a thread: fake_stripe(**options)
+    # takes FakeStripe's options and returns the fake, whose client() makes a
+    # Stripe client for it. Each asyncio.run() needs its own client. Journals
+    # and manifests land in the test's temporary directory.
+    monkeypatch.chdir(tmp_path)
+    servers = []
+    
+    def start(**options):
+        from fake_stripe import make_server
+        
+        server, fake = make_server(**options)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        address = f"http://127.0.0.1:{server.server_address[1]}"
+        fake.client = lambda: make_client("sk_test_fake", base_addresses={"api": address})
+        return fake
+    
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
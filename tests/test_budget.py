@@ -0,0 +1,154 @@
+import asyncio
+
+import pytest
+
+from stripe_populator import budget as budget_module
+from stripe_populator.budget import RunBudget, estimate_scale
+from stripe_populator.config import TIME_BUDGET
+from stripe_populator.plan import Plan
+
+
+PLAN = Plan(products=10, customers=100, subscriptions=200)
+
+
+class FakeTime:
+    # Stands in for the time module the budget reads its clock from
+    def __init__(self):
+        self.now = 1000.0
+    
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeTime()
+    monkeypatch.setattr(budget_module, "time", fake)
+    return fake
+
+
+def make_budget(scale, plan=PLAN, max_rate=25):
+    # While the clock stands still the budget never rescales, so these
+    # tests set the scale themselves
+    budget = RunBudget(60, plan, max_rate)
+    budget.scale = scale
+    return budget
+
+
+def test_quota_scales_every_phase(clock):
+    budget = make_budget(0.5)
+    assert budget.counts == {"products": 10, "customers_normal": 90, "customers_failing": 10, "subscriptions": 200}
+    assert {phase: budget.quota(phase, count) for phase, count in budget.counts.items()} == {
+        "products": 5, "customers_normal": 45, "customers_failing": 5, "subscriptions": 100,
+    }
+    # Phases outside the budget are never cut
+    assert budget.quota("tax_rates", 2) == 2
+
+
+def test_take_in_order_up_to_the_quota(clock):
+    budget = make_budget(0.5)
+    assert all(budget.take("products", index) for index in range(5))
+    assert not budget.take("products", 5)
+    assert budget.taken["products"] == 5
+    assert budget.take("tax_rates", 100)
+
+
+def test_quota_never_drops_below_items_taken(clock):
+    budget = make_budget(0.5)
+    for index in range(5):
+        budget.take("products", index)
+    budget.scale = 0.1
+    assert budget.quota("products", 10) == 5
+    assert not budget.take("products", 5)
+
+
+def test_quota_grows_back_up_to_the_plan(clock):
+    budget = make_budget(0.2)
+    assert not budget.take("subscriptions", 40)
+    budget.scale = 0.5
+    assert budget.take("subscriptions", 40)
+    budget.scale = 1.0
+    assert budget.quota("subscriptions", 200) == 200
+    assert not budget.take("subscriptions", 200)
+
+
+def test_wait(clock, monkeypatch):
+    monkeypatch.setitem(TIME_BUDGET, "interval", 0.01)
+    budget = make_budget(0.5)
+    assert asyncio.run(budget.wait(lambda: budget.take("products", 0)))
+    
+    # The deadline passes while a phase waits for its quota
+    async def expire():
+        await asyncio.sleep(0.05)
+        clock.now = budget.deadline
+        budget.take("products", 1)
+    
+    async def run():
+        return await asyncio.gather(budget.wait(lambda: budget.take("products", 9)), expire())
+    
+    assert asyncio.run(run())[0] is False
+    assert budget.expired
+
+
+def test_expired_budget_keeps_what_was_taken(clock):
+    budget = make_budget(0.5)
+    for index in range(3):
+        budget.take("products", index)
+    clock.now = budget.deadline
+    assert budget.take("products", 2)
+    assert budget.expired
+    assert budget.quota("products", 10) == 3
+    assert not budget.take("products", 3)
+    assert budget.report()["quotas"]["products"] == 3
+
+
+def test_scale_follows_the_measured_throughput(clock):
+    budget = RunBudget(60, PLAN, 25)
+    assert budget.scale == estimate_scale(PLAN, 60, 25)
+    
+    # Two requests a second fit far less than the plan into the time left
+    for _ in range(10):
+        clock.now += 1
+        for _ in range(2):
+            budget.record_request("customers_normal")
+        budget.take("customers_normal", 0)
+    slow_scale = budget.scale
+    assert slow_scale < estimate_scale(PLAN, 60, 25)
+    
+    # Speeding up to the limiter's maximum grows the quotas back
+    for _ in range(10):
+        clock.now += 1
+        for _ in range(25):
+            budget.record_request("customers_normal")
+        budget.take("customers_normal", 0)
+    assert budget.scale > slow_scale
+    assert not budget.expired
+
+
+def test_test_clocks_are_needed_in_clock_share_order(clock):
+    plan = Plan(customers=100, subscriptions=200, history_months=2)
+    budget = make_budget(0.0, plan)
+    order = sorted(range(34), key=budget.clock_share)
+    for step in range(21):
+        budget.scale = step / 20
+        needed = [budget.needs_test_clock(index) for index in order]
+        # Needed clocks always come first
+        assert needed == sorted(needed, reverse=True)
+    assert all(needed)
+
+
+def test_peak_throughput(clock):
+    budget = make_budget(0.5, max_rate=100)
+    start = clock.now
+    # Idle for five seconds, then 40 requests per second
+    for second in range(1, 11):
+        clock.now = start + second
+        if second > 5:
+            for _ in range(40):
+                budget.record_request("products")
+        budget.take("products", 0)
+    
+    assert budget.throughput(clock.now) == 20
+    assert budget.peak_throughput(clock.now) == 40
+    budget.max_rate = 30
+    assert budget.peak_throughput(clock.now) == 30
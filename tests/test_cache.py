@@ -0,0 +1,82 @@
+import asyncio
+
+from stripe_populator.cache import InventoryCache
+from stripe_populator.engine import Session
+from stripe_populator.inventory import sync_inventory_cache
+from stripe_populator.registry import CustomerRegistry
+
+
+def make_cache(tmp_path):
+    cache = InventoryCache("acct_test", str(tmp_path / "inventory.sqlite3"))
+    cache.add_customers([{"id": "cus_a", "type": "normal", "created": 1}, {"id": "cus_b", "type": "failing", "created": 2}])
+    cache.add_prices([
+        {"price_id": "price_a", "product_id": "prod_a", "tax_behavior": "exclusive", "created": 1},
+        {"price_id": "price_b", "product_id": "prod_b", "tax_behavior": "inclusive", "created": 2},
+    ])
+    cache.add_tax_rates([{"id": "txr_a", "inclusive": True, "created": 1}])
+    return cache
+
+
+def event(event_type, **obj):
+    return {"type": event_type, "data": {"object": obj}}
+
+
+def test_apply_event(tmp_path):
+    cache = make_cache(tmp_path)
+    
+    assert cache.apply_event(event("customer.deleted", id="cus_b"))
+    assert list(cache.load_customers(CustomerRegistry()).items()) == [("cus_a", "normal")]
+    
+    assert cache.apply_event(event("price.updated", id="price_a", active=False))
+    assert cache.apply_event(event("price.deleted", id="price_b"))
+    assert cache.load_prices() == []
+    assert cache.apply_event(event("price.updated", id="price_a", active=True))
+    assert [price["price_id"] for price in cache.load_prices()] == ["price_a"]
+    
+    assert cache.apply_event(event("tax_rate.updated", id="txr_a", active=False))
+    assert cache.load_tax_rates() == {"inclusive": [], "exclusive": []}
+    
+    # Events about objects the cache doesn't know, or of other types, change nothing
+    assert not cache.apply_event(event("customer.deleted", id="cus_unknown"))
+    assert not cache.apply_event(event("customer.created", id="cus_c"))
+
+
+def test_listed_customers_keep_their_known_type(tmp_path):
+    cache = make_cache(tmp_path)
+    assert cache.add_customers([{"id": "cus_b", "type": "normal"}, {"id": "cus_c", "type": "normal", "created": 3}]) == 1
+    assert cache.set_customer_types(CustomerRegistry([{"id": "cus_a", "type": "failing"}])) == 1
+    assert list(cache.load_customers(CustomerRegistry()).items()) == [("cus_c", "normal"), ("cus_b", "failing"), ("cus_a", "failing")]
+
+
+def test_sync_lists_only_what_is_new(fake_stripe, tmp_path):
+    fake = fake_stripe(seed_customers=300, seed_prices=20)
+    cache = InventoryCache("acct_fake", str(tmp_path / "inventory.sqlite3"))
+    
+    def sync():
+        async def run():
+            await sync_inventory_cache(Session(fake.client()), cache)
+        
+        asyncio.run(run())
+    
+    sync()
+    assert len(cache.load_customers(CustomerRegistry())) == 300
+    assert len(cache.load_prices()) == 20
+    
+    async def change_account():
+        client = fake.client()
+        for i in range(10):
+            await client.v1.customers.create_async(params={"name": f"new {i}"})
+    
+    asyncio.run(change_account())
+    fake.handle("POST", "/v1/events", {}, event("customer.deleted", id="cus_seed000000007"))
+    fake.handle("POST", "/v1/events", {}, event("price.updated", id="price_seed000000003", active=False))
+    
+    listed = fake.counts["GET customers"]
+    sync()
+    # One page from the cursor on, instead of the whole account
+    assert fake.counts["GET customers"] - listed == 1
+    customers = set(cache.load_customers(CustomerRegistry()))
+    assert len(customers) == 309
+    assert "cus_seed000000007" not in customers
+    assert "price_seed000000003" not in {price["price_id"] for price in cache.load_prices()}
+    cache.close()
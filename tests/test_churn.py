@@ -0,0 +1,75 @@
+import asyncio
+
+from stripe_populator.churn import churn_async, fetch_churn_pools
+from stripe_populator.compiler import allocate_quotas
+from stripe_populator.config import CHURN_MUTATION_DISTRIBUTION
+from stripe_populator.engine import Session
+
+
+EUR_CUSTOMERS = {f"cus_seed{i:09d}" for i in range(0, 50, 2)}
+
+
+def set_up_account(fake, subscriptions=0):
+    # Recurring prices in usd and eur, half of the 50 seeded customers billed
+    # in eur and `subscriptions` usd subscriptions in the middle of the range
+    async def create():
+        client = fake.client()
+        prices = {}
+        for currency, amounts in (("usd", range(500, 5500, 500)), ("eur", (800, 1600))):
+            for amount in amounts:
+                price = await client.v1.prices.create_async(params={
+                    "currency": currency, "unit_amount": amount, "product": "prod_churn", "recurring": {"interval": "month"},
+                })
+                prices[price.id] = price
+        for customer_id in EUR_CUSTOMERS:
+            await client.v1.customers.update_async(customer_id, params={"currency": "eur"})
+        middle = next(price.id for price in prices.values() if price.currency == "usd" and price.unit_amount == 2500)
+        for i in range(subscriptions):
+            await client.v1.subscriptions.create_async(params={"customer": f"cus_seed{i % 50 * 2 + 1:09d}", "items": [{"price": middle}]})
+        return prices
+    
+    return asyncio.run(create())
+
+
+def test_churn_follows_the_mix_exactly(fake_stripe):
+    fake = fake_stripe(seed_customers=50)
+    set_up_account(fake, subscriptions=200)
+    
+    result = asyncio.run(churn_async(fake.client(), requests_per_second=60, duration=1, cache_path=None, seed=1))
+    quotas = allocate_quotas(60, list(CHURN_MUTATION_DISTRIBUTION.values()))
+    sent = {mutation: count + result["failed"].get(mutation, 0) for mutation, count in result["mutations"].items()}
+    assert sent == dict(zip(CHURN_MUTATION_DISTRIBUTION, quotas))
+    assert result["dropped"] == 0
+    # Only a subscription already at the top or bottom price can't be moved
+    assert set(result["failed"]) <= {"upgrade", "downgrade"}
+    
+    subscriptions = fake.list("subscriptions", {"limit": 100, "status": "canceled"})["data"]
+    assert len(subscriptions) == result["mutations"]["cancel"]
+
+
+def test_new_trials_are_billed_in_the_customers_currency(fake_stripe):
+    fake = fake_stripe(seed_customers=50)
+    prices = set_up_account(fake)
+    mix = {mutation: 0 for mutation in CHURN_MUTATION_DISTRIBUTION}
+    
+    result = asyncio.run(churn_async(fake.client(), 40, 1, {**mix, "new_trial": 1}, cache_path=None, seed=1))
+    assert result["mutations"]["new_trial"] == 40
+    assert result["failed"] == {}
+    
+    trials = fake.list("subscriptions", {"limit": 100, "status": "trialing"})["data"]
+    assert len(trials) == 40
+    for trial in trials:
+        price = prices[trial["items"]["data"][0]["price"]["id"]]
+        # Customers never billed get usd prices
+        assert price.currency == ("eur" if trial["customer"] in EUR_CUSTOMERS else "usd")
+        assert trial["metadata"]["populate_run"] == result["run_id"]
+
+
+def test_only_customers_for_new_trials_are_sampled(fake_stripe):
+    fake = fake_stripe(seed_customers=300)
+    
+    async def fetch():
+        return await fetch_churn_pools(Session(fake.client()), None, False, 5)
+    
+    customers, _, _ = asyncio.run(fetch())
+    assert len(customers) == 5
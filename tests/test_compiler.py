@@ -0,0 +1,80 @@
+import asyncio
+import random
+from collections import Counter
+
+from stripe_populator.compiler import (
+    STATUSES,
+    allocate_quotas,
+    balanced_indexes,
+    compile_plan,
+    count_statuses,
+    estimate_requests,
+    failing_statuses,
+    split_customers,
+)
+from stripe_populator.manifest import read_manifest
+from stripe_populator.plan import Plan
+from stripe_populator.runner import populate_async
+
+
+PLAN = Plan(products=40, customers=300, subscriptions=1000)
+
+
+def test_allocate_quotas_adds_up_to_total():
+    assert allocate_quotas(10, [1, 1, 1]) == [4, 3, 3]
+    assert allocate_quotas(0, [1, 2]) == [0, 0]
+    for total in (1, 7, 999, 1000):
+        assert sum(allocate_quotas(total, [35, 10, 12, 8, 12, 8, 10, 5])) == total
+
+
+def test_compile_plan_is_deterministic():
+    # A resumed run compiles the plan again and must make the same choices
+    first = compile_plan(PLAN, "seed", 500, 40, 60)
+    second = compile_plan(PLAN, "seed", 500, 40, 60)
+    assert first == second
+    
+    other = compile_plan(PLAN, "other seed", 500, 40, 60)
+    assert other["subscription_statuses"] != first["subscription_statuses"]
+
+
+def test_compile_plan_statuses_follow_quotas_exactly():
+    compiled = compile_plan(PLAN, 1)
+    counts = Counter(STATUSES[code] for code in compiled["subscription_statuses"])
+    assert {status: counts[status] for status in STATUSES} == count_statuses(PLAN)
+    
+    num_normal, _ = split_customers(PLAN.customers)
+    assert len(compiled["customer_cards"]) == num_normal
+    assert len(compiled["product_intervals"]) == PLAN.products
+
+
+def test_compile_plan_hands_out_customers_round_robin():
+    customer_pool, failing_pool = 7, 3
+    compiled = compile_plan(PLAN, 1, customer_pool, failing_pool)
+    failing_codes = {STATUSES.index(status) for status in failing_statuses(PLAN)}
+    
+    normal = [c for s, c in zip(compiled["subscription_statuses"], compiled["subscription_customers"]) if s not in failing_codes]
+    failing = [c for s, c in zip(compiled["subscription_statuses"], compiled["subscription_customers"]) if s in failing_codes]
+    assert normal == [i % customer_pool for i in range(len(normal))]
+    assert failing == [i % failing_pool for i in range(len(failing))]
+
+
+def test_compile_plan_without_failing_customers():
+    # Failing statuses fall back to the normal pool
+    compiled = compile_plan(PLAN, 1, 5, 0)
+    assert list(compiled["subscription_customers"]) == [i % 5 for i in range(PLAN.subscriptions)]
+
+
+def test_balanced_indexes():
+    indexes = balanced_indexes(23, 5, random.Random(1))
+    assert len(indexes) == 23
+    assert sorted(Counter(indexes).values()) == [4, 4, 5, 5, 5]
+    assert len(balanced_indexes(10, 0, random.Random(1))) == 0
+
+
+def test_estimate_matches_the_requests_a_run_sends(fake_stripe):
+    fake = fake_stripe()
+    plan = Plan(products=5, customers=30, subscriptions=100, prices_per_product=3, seed=1)
+    result = asyncio.run(populate_async(plan, fake.client(), cache_path=None))
+    
+    _, records = read_manifest(result["manifest"])
+    assert Counter(record["endpoint"] for record in records) == estimate_requests(plan)
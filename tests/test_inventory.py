@@ -0,0 +1,209 @@
+import asyncio
+import random
+import time
+from collections import Counter
+
+from stripe_populator.cache import InventoryCache
+from stripe_populator.engine import Session
+from stripe_populator.inventory import (
+    EARLIEST_CREATED,
+    discover_customers,
+    fetch_existing_customers,
+    list_partitioned,
+    sample_customers,
+)
+from stripe_populator.journal import RunJournal
+from stripe_populator.plan import Plan
+from stripe_populator.ratelimit import AdaptiveRateLimiter
+from stripe_populator.registry import CustomerRegistry
+from stripe_populator.runner import load_inventory, populate_async
+
+
+def list_customers(fake, workers, created_after=None):
+    # (id, created) of every customer handed to handle_page, and the created
+    # windows listed
+    async def run():
+        session = Session(fake.client())
+        windows = set()
+        seen = []
+        
+        async def list_method(params):
+            windows.add((params["created"]["gte"], params["created"]["lt"]))
+            return await session.client.v1.customers.list_async(params=params)
+        
+        await list_partitioned(
+            session, list_method, lambda page: seen.extend((customer.id, customer.created) for customer in page),
+            workers=workers, created_after=created_after,
+        )
+        return seen, windows
+    
+    return asyncio.run(run())
+
+
+def test_list_partitioned_sees_every_object_once(fake_stripe):
+    fake = fake_stripe(seed_customers=1500)
+    seen, windows = list_customers(fake, workers=8)
+    assert len(seen) == 1500
+    assert set(Counter(seen).values()) == {1}
+    # Busy windows were split in halves for other workers
+    assert len(windows) > 1
+    assert min(start for start, _ in windows) == EARLIEST_CREATED
+
+
+def test_list_partitioned_after_a_point_in_time(fake_stripe):
+    fake = fake_stripe(seed_customers=500)
+    since = int(time.time()) - 86400 * 365
+    everything, _ = list_customers(fake, workers=4)
+    seen, windows = list_customers(fake, workers=4, created_after=since)
+    assert min(start for start, _ in windows) == since
+    assert len(seen) == len(set(seen)) > 0
+    assert set(seen) == {(customer_id, created) for customer_id, created in everything if created >= since}
+
+
+def test_fetch_existing_customers_skips_excluded(fake_stripe):
+    fake = fake_stripe(seed_customers=300)
+    excluded = {f"cus_seed{i:09d}" for i in range(100)}
+    
+    async def run():
+        customers = CustomerRegistry()
+        await fetch_existing_customers(Session(fake.client()), customers, exclude=excluded)
+        return customers
+    
+    customers = asyncio.run(run())
+    assert len(customers) == 200
+    assert not excluded & set(customers)
+
+
+def fast_session(fake):
+    # Without Stripe's pace, so reading many pages stays quick
+    return Session(fake.client(), rate_limiter=AdaptiveRateLimiter(requests_per_second=1000, max_requests_per_second=1000))
+
+
+def sample(fake, count, exclude=(), seed=None):
+    async def run():
+        customers = CustomerRegistry()
+        rng = random.Random(seed) if seed is not None else None
+        await sample_customers(fast_session(fake), customers, count, exclude=exclude, rng=rng)
+        return list(customers)
+    
+    return asyncio.run(run())
+
+
+def test_sample_customers_reads_a_few_pages(fake_stripe):
+    fake = fake_stripe(seed_customers=10000)
+    excluded = {f"cus_seed{i:09d}" for i in range(0, 10000, 2)}
+    sampled = sample(fake, 50, exclude=excluded)
+    assert len(set(sampled)) == 50
+    assert not excluded & set(sampled)
+    assert all(customer_id.startswith("cus_seed") for customer_id in sampled)
+    # Listing all 10,000 would take 100 pages
+    assert fake.counts["GET customers"] < 50
+    
+    # A seeded sample of the same account is the same
+    assert sample(fake, 50, seed=1) == sample(fake, 50, seed=1)
+    assert sample(fake, 50, seed=1) != sample(fake, 50, seed=2)
+
+
+def test_sample_of_a_small_account_takes_everyone(fake_stripe):
+    fake = fake_stripe(seed_customers=30)
+    assert len(set(sample(fake, 50))) == 30
+    assert sample(fake_stripe(), 50) == []
+
+
+def test_resumed_run_reuses_its_sampled_customers(fake_stripe):
+    fake = fake_stripe(seed_customers=500, seed_prices=5)
+    plan = Plan(subscriptions=20, seed=1)
+    first = asyncio.run(populate_async(plan, fake.client(), cache_path=None))
+    assert first["existing"]["customers"] == 20
+    sampled = RunJournal.load(first["run_id"]).existing_customers
+    assert len({customer_id for customer_id, _ in sampled}) == 20
+    
+    listed = fake.counts["GET customers"]
+    resumed = asyncio.run(populate_async(plan, fake.client(), resume_run_id=first["run_id"], cache_path=None))
+    assert fake.counts["GET customers"] == listed
+    assert resumed["existing"]["customers"] == 20
+    assert RunJournal.load(first["run_id"]).existing_customers == sampled
+    subscribed = {subscription["customer"] for subscription in fake.list("subscriptions", {"limit": 100, "status": "all"})["data"]}
+    # Round robin may not reach the last one
+    assert subscribed <= {customer_id for customer_id, _ in sampled}
+    assert len(subscribed) >= 19
+
+
+def add_populated_customers(fake, normal, failing):
+    # Customers as earlier runs leave them, tagged with their payment type
+    async def create():
+        customers = fake.client().v1.customers
+        ids = {"normal": [], "failing": []}
+        for customer_type, payment_type, count in (("normal", "card", normal), ("failing", "failing_card", failing)):
+            for _ in range(count):
+                customer = await customers.create_async(params={"metadata": {"payment_type": payment_type}})
+                ids[customer_type].append(customer.id)
+        return ids
+    
+    return asyncio.run(create())
+
+
+def discover(fake, counts, exclude=()):
+    async def run():
+        customers = CustomerRegistry()
+        complete = await discover_customers(fast_session(fake), customers, counts, exclude=exclude)
+        return customers, complete
+    
+    return asyncio.run(run())
+
+
+def test_discover_customers_by_payment_type(fake_stripe):
+    fake = fake_stripe(seed_customers=50)
+    ids = add_populated_customers(fake, 30, 10)
+    
+    customers, complete = discover(fake, {"normal": None, "failing": None}, exclude=ids["failing"][:2])
+    assert complete
+    assert {customer_id for customer_id, customer_type in customers.items() if customer_type == "normal"} == set(ids["normal"])
+    assert {customer_id for customer_id, customer_type in customers.items() if customer_type == "failing"} == set(ids["failing"][2:])
+    
+    # Working cards come first
+    customers, complete = discover(fake, {"normal": 5, "failing": 3})
+    assert not complete
+    assert [customer_type for _, customer_type in customers.items()] == ["normal"] * 5 + ["failing"] * 3
+    
+    customers, complete = discover(fake, {"normal": 0, "failing": 0})
+    assert (len(customers), complete) == (0, False)
+
+
+def test_inventory_discovers_before_sampling(fake_stripe, tmp_path):
+    fake = fake_stripe(seed_customers=300)
+    ids = add_populated_customers(fake, 4, 6)
+    cache_path = str(tmp_path / "inventory.sqlite3")
+    
+    def load(cache_path, customer_sample, failing_sample):
+        async def run():
+            customers, _, _, cache = await load_inventory(
+                fast_session(fake), (), cache_path, True, customer_sample, failing_sample
+            )
+            if cache:
+                cache.close()
+            return customers
+        
+        return asyncio.run(run())
+    
+    # Without the cache: 4 discovered card customers, 3 failing ones and 6
+    # more sampled
+    customers = load(None, 10, 3)
+    assert len(customers) == 13
+    assert list(customers.items())[:4] == [(customer_id, "normal") for customer_id in reversed(ids["normal"])]
+    assert {customers.failing_id_at(i) for i in range(customers.failing_count)} <= set(ids["failing"])
+    assert customers.failing_count == 3
+    
+    # The cache keeps the types, and only remembers how far discovery got
+    # once a search reached the end
+    customers = load(cache_path, 10, 3)
+    assert customers.failing_count == 3
+    cache = InventoryCache("acct_fake", cache_path)
+    assert cache.get_cursor("discovery") is None
+    cache.close()
+    customers = load(cache_path, None, None)
+    assert customers.failing_count == 6
+    assert len(customers) == 310
+    cache = InventoryCache("acct_fake", cache_path)
+    assert cache.get_cursor("discovery") is not None
+    cache.close()
@@ -0,0 +1,97 @@
+import pytest
+
+from stripe_populator.compiler import compile_plan
+from stripe_populator.journal import RunJournal
+from stripe_populator.plan import Plan
+from stripe_populator.registry import CustomerRegistry
+
+
+PLAN = Plan(products=10, customers=50, subscriptions=200)
+
+
+def test_resume_compiles_the_same_plan(tmp_path):
+    journal = RunJournal.start({**PLAN.to_dict(), "create_tax_rates": False}, directory=tmp_path)
+    resumed = RunJournal.load(journal.run_id, directory=tmp_path)
+    
+    # Without a plan seed, the run ID seeds the run
+    assert resumed.seed == journal.seed == journal.run_id
+    assert compile_plan(PLAN, resumed.seed, 80, 9, 30) == compile_plan(PLAN, journal.seed, 80, 9, 30)
+
+
+def test_explicit_seed_is_shared_across_runs(tmp_path):
+    plan = {**PLAN.to_dict(), "seed": 42}
+    first = RunJournal.start(plan, directory=tmp_path)
+    second = RunJournal.start(plan, directory=tmp_path)
+    assert first.run_id != second.run_id
+    assert first.seed == second.seed == 42
+    assert first.item_seed("customers_normal", 3) == second.item_seed("customers_normal", 3)
+
+
+def test_resume_keeps_completed_items_and_idempotency_keys(tmp_path):
+    journal = RunJournal.start(PLAN.to_dict(), directory=tmp_path)
+    journal.record("customers_normal", 0, {"id": "cus_a", "type": "normal"})
+    journal.record("customers_normal", 1, {"id": "cus_b", "type": "normal"})
+    journal.record("subscriptions", 5, {"subscription_id": "sub_a", "customer_id": "cus_a"})
+    
+    resumed = RunJournal.load(journal.run_id, directory=tmp_path)
+    assert resumed.completed_in("customers_normal") == {0: {"id": "cus_a", "type": "normal"}, 1: {"id": "cus_b", "type": "normal"}}
+    assert resumed.first_pending("customers_normal") == 2
+    assert resumed.first_pending("subscriptions") == 0
+    assert resumed.created_ids() == {"cus_a", "cus_b", "sub_a"}
+    
+    # A retried request after a resume reuses the original key
+    assert resumed.options("customers_normal", 2) == journal.options("customers_normal", 2)
+    assert resumed.idempotency_key("customers_normal", 2, "attach-1") == journal.idempotency_key("customers_normal", 2, "attach-1")
+    keys = {
+        journal.idempotency_key(phase, index, step)
+        for phase in ("customers_normal", "customers_failing")
+        for index in range(3)
+        for step in ("create", "attach-1")
+    }
+    assert len(keys) == 12
+
+
+def test_load_skips_a_cut_off_last_line(tmp_path):
+    journal = RunJournal.start(PLAN.to_dict(), directory=tmp_path)
+    journal.record("products", 0, {"product_id": "prod_a", "price_id": "price_a"})
+    with open(journal.path, "a", encoding="utf-8") as journal_file:
+        journal_file.write('{"event": "completed", "phase": "products", "ind')
+    
+    resumed = RunJournal.load(journal.run_id, directory=tmp_path)
+    assert list(resumed.completed_in("products")) == [0]
+
+
+def test_load_unknown_run(tmp_path):
+    with pytest.raises(ValueError):
+        RunJournal.load("20200101-000000-abcdef", directory=tmp_path)
+
+
+def test_only_population_runs_can_be_resumed(tmp_path):
+    journal = RunJournal.start({**PLAN.to_dict(), "create_tax_rates": True}, directory=tmp_path)
+    assert RunJournal.load(journal.run_id, directory=tmp_path).population_plan() == PLAN
+    
+    churn = RunJournal.start({"churn": {"requests_per_second": 5, "duration": 10, "mix": {}}, "seed": None}, directory=tmp_path)
+    with pytest.raises(ValueError, match="churn run"):
+        RunJournal.load(churn.run_id, directory=tmp_path).population_plan()
+    
+    replay = RunJournal.start({"replay": "run.manifest.jsonl", "source_run": journal.run_id}, directory=tmp_path)
+    with pytest.raises(ValueError, match="replay run"):
+        RunJournal.load(replay.run_id, directory=tmp_path).population_plan()
+    
+    broken = RunJournal.start({"products": -1, "create_tax_rates": True}, directory=tmp_path)
+    with pytest.raises(ValueError, match="invalid plan"):
+        RunJournal.load(broken.run_id, directory=tmp_path).population_plan()
+
+
+def test_existing_customers_survive_a_resume(tmp_path):
+    customers = CustomerRegistry([
+        {"id": "cus_a", "type": "normal"},
+        {"id": "cus_b", "type": "failing"},
+        {"id": "cus_c", "type": "normal"},
+    ])
+    journal = RunJournal.start(PLAN.to_dict(), directory=tmp_path)
+    assert journal.existing_customers is None
+    journal.record_existing_customers(customers)
+    
+    resumed = RunJournal.load(journal.run_id, directory=tmp_path)
+    assert resumed.existing_customers == [["cus_a", "normal"], ["cus_b", "failing"], ["cus_c", "normal"]]
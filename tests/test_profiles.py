@@ -0,0 +1,63 @@
+import asyncio
+import threading
+
+import pytest
+
+from stripe_populator.profiles import PROFILE_BATCH_SIZE, ProfilePool, build_customer_profile, build_product_profile
+
+
+def take(pool, indexes):
+    async def get_all():
+        try:
+            return [await pool.get(index) for index in indexes]
+        finally:
+            pool.close()
+    
+    return asyncio.run(get_all())
+
+
+def test_profiles_depend_only_on_seed_and_index():
+    count = PROFILE_BATCH_SIZE * 3 + 10
+    profiles = take(ProfilePool("customers", build_customer_profile, 7, count), range(count))
+    assert len({profile["email"] for profile in profiles}) > count * 0.9
+    assert take(ProfilePool("customers", build_customer_profile, 7, count), range(count)) == profiles
+    
+    # A resumed run starts at its first pending item and gets the same profiles
+    first_index = PROFILE_BATCH_SIZE + 100
+    resumed = take(ProfilePool("customers", build_customer_profile, 7, count, first_index=first_index), range(first_index, count))
+    assert resumed == profiles[first_index:]
+    
+    assert take(ProfilePool("customers", build_customer_profile, 8, count), range(count)) != profiles
+    # Each kind has its own streams
+    assert take(ProfilePool("products", build_product_profile, 7, 10), range(10)) != profiles[:10]
+
+
+def test_producer_errors_fail_the_waiting_item():
+    def broken(rng, tables):
+        raise RuntimeError("no profile")
+    
+    pool = ProfilePool("customers", broken, 1, 10)
+    with pytest.raises(RuntimeError, match="no profile"):
+        take(pool, [0])
+
+
+def test_close_fails_a_pending_get():
+    release = threading.Event()
+    
+    def slow(rng, tables):
+        release.wait()
+        return {}
+    
+    pool = ProfilePool("customers", slow, 1, 10)
+    
+    async def close_while_waiting():
+        pending = asyncio.ensure_future(pool.get(0))
+        await asyncio.sleep(0.2)
+        pool.close()
+        with pytest.raises(RuntimeError, match="closed"):
+            await pending
+    
+    try:
+        asyncio.run(close_while_waiting())
+    finally:
+        release.set()
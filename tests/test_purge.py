@@ -0,0 +1,70 @@
+import asyncio
+import os
+
+from stripe_populator.config import RUNS_DIRECTORY
+from stripe_populator.plan import Plan
+from stripe_populator.purge import purge
+from stripe_populator.runner import populate_async
+
+
+PLAN = Plan(products=3, customers=10, subscriptions=15, seed=1)
+
+
+def populate(fake, plan=PLAN):
+    return asyncio.run(populate_async(plan, fake.client(), cache_path=None))
+
+
+def live_ids(fake, kind, **query):
+    return {obj["id"] for obj in fake.list(kind, {"limit": 100, **query})["data"]}
+
+
+def created_customers(result):
+    return {customer["id"] for customer in result["customers_normal"] + result["customers_failing"]}
+
+
+def test_purge_removes_only_the_given_run(fake_stripe):
+    fake = fake_stripe()
+    first = populate(fake)
+    second = populate(fake)
+    
+    dry_run = purge(fake.client(), [first["run_id"]], dry_run=True)
+    assert dry_run["customers"] == {"found": 10, "purged": 0, "skipped": 0, "failed": 0}
+    assert dry_run["products"]["found"] == 3
+    assert live_ids(fake, "customers") == created_customers(first) | created_customers(second)
+    
+    summary = purge(fake.client(), [first["run_id"]])
+    assert summary["customers"] == {"found": 10, "purged": 10, "skipped": 0, "failed": 0}
+    # Deleting the customers cancels their subscriptions; schedules are
+    # cancelled first
+    assert summary["subscriptions"]["found"] + summary["subscription_schedules"]["found"] == 15
+    assert summary["subscriptions"]["skipped"] == summary["subscriptions"]["found"]
+    assert summary["subscription_schedules"]["purged"] == summary["subscription_schedules"]["found"]
+    # Default prices are found through their product
+    assert summary["products"]["purged"] == summary["prices"]["purged"] == 3
+    
+    assert live_ids(fake, "customers") == created_customers(second)
+    assert live_ids(fake, "products", active=True) == {product["product_id"] for product in second["products"]}
+    assert live_ids(fake, "prices", active=True) == {product["price_id"] for product in second["products"]}
+
+
+def test_purge_without_a_journal_searches(fake_stripe):
+    fake = fake_stripe()
+    result = populate(fake)
+    os.remove(os.path.join(RUNS_DIRECTORY, f"{result['run_id']}.jsonl"))
+    
+    summary = purge(fake.client(), [result["run_id"]])
+    assert summary["customers"]["purged"] == 10
+    assert summary["products"]["purged"] == 3
+    assert live_ids(fake, "customers") == set()
+
+
+def test_purge_deletes_test_clocks_with_their_customers(fake_stripe):
+    fake = fake_stripe(clock_advance_seconds=0)
+    result = populate(fake, Plan(customers=4, subscriptions=4, history_months=1, seed=1))
+    assert result["test_clocks"]
+    
+    summary = purge(fake.client(), [result["run_id"]])
+    assert summary["test_clocks"]["purged"] == len(result["test_clocks"])
+    # Their customers go with the clocks
+    assert summary["customers"] == {"found": 4, "purged": 0, "skipped": 4, "failed": 0}
+    assert live_ids(fake, "customers") == set()
@@ -0,0 +1,120 @@
+import asyncio
+
+import pytest
+import stripe
+
+from stripe_populator.ratelimit import AdaptiveRateLimiter
+
+
+def make_limiter(**kwargs):
+    return AdaptiveRateLimiter(**{
+        "requests_per_second": 20, "max_requests_per_second": 30, "initial_concurrency": 8, "max_concurrency": 10,
+        "additive_increase": 5, "base_backoff": 0.001, **kwargs,
+    })
+
+
+def rate_limit_error():
+    return stripe.RateLimitError("Too many requests", http_status=429, headers={"Retry-After": "0"})
+
+
+def throttled_once(result="ok"):
+    # A request that is rate limited on its first attempt
+    attempts = []
+    
+    async def request():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise rate_limit_error()
+        return result
+    
+    return request
+
+
+async def succeed():
+    return "ok"
+
+
+def test_successes_increase_additively_up_to_the_maximum():
+    limiter = make_limiter(requests_per_second=200, max_requests_per_second=210, additive_increase=50)
+    
+    async def run():
+        await limiter.call(succeed)
+        assert limiter.rate == pytest.approx(200 + 50 / 200)
+        assert limiter.concurrency == pytest.approx(8 + 1 / 8)
+        for _ in range(100):
+            await limiter.call(succeed)
+    
+    asyncio.run(run())
+    assert limiter.rate == 210
+    assert limiter.concurrency == 10
+
+
+def test_throttling_halves_once_per_burst():
+    limiter = make_limiter(min_requests_per_second=4, additive_increase=0)
+    
+    async def run():
+        # Three requests rate limited at the same time count as one decrease
+        await asyncio.gather(*(limiter.call(throttled_once()) for _ in range(3)))
+        assert (limiter.throttled, limiter.rate) == (3, 10)
+        assert limiter.concurrency < 5
+        
+        # Later 429s halve again, down to the minimum
+        for rate in (5, 4):
+            await asyncio.sleep(1.05)
+            await limiter.call(throttled_once())
+            assert limiter.rate == rate
+    
+    asyncio.run(run())
+    assert limiter.throttled == 5
+
+
+def test_call_retries_rate_limited_requests():
+    limiter = make_limiter()
+    attempts = []
+    
+    async def request():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise rate_limit_error()
+        return "ok"
+    
+    assert asyncio.run(limiter.call(request)) == "ok"
+    assert len(attempts) == 3
+    assert (limiter.requests, limiter.throttled, limiter.retries) == (3, 2, 2)
+    assert limiter.in_flight == 0
+
+
+def test_call_gives_up_after_max_retries():
+    limiter = make_limiter(max_retries=2)
+    
+    async def request():
+        raise rate_limit_error()
+    
+    with pytest.raises(stripe.RateLimitError):
+        asyncio.run(limiter.call(request))
+    assert limiter.requests == 3
+    assert limiter.in_flight == 0
+
+
+def test_call_does_not_retry_invalid_requests():
+    limiter = make_limiter()
+    
+    async def request():
+        raise stripe.InvalidRequestError("No such customer", "customer", http_status=400)
+    
+    with pytest.raises(stripe.InvalidRequestError):
+        asyncio.run(limiter.call(request))
+    assert (limiter.requests, limiter.retries) == (1, 0)
+
+
+def test_requests_get_through_a_rate_limited_server(fake_stripe):
+    fake = fake_stripe(rate_limit_rate=0.3)
+    limiter = make_limiter(min_requests_per_second=20, max_retries=20)
+    
+    async def create_customers():
+        customers = fake.client().v1.customers
+        return await asyncio.gather(*(limiter.call(customers.create_async, params={"name": f"c{i}"}) for i in range(20)))
+    
+    assert len({customer.id for customer in asyncio.run(create_customers())}) == 20
+    assert limiter.throttled == limiter.retries > 0
+    assert limiter.requests == 20 + limiter.retries
@@ -0,0 +1,40 @@
+from stripe_populator.registry import CustomerRegistry
+
+
+def test_add_and_look_up():
+    customers = CustomerRegistry()
+    customers.add("cus_a")
+    customers.add("cus_bb", "failing")
+    customers.extend([{"id": "cus_ccc", "type": "normal"}, {"id": "cus_d", "type": "failing"}])
+    
+    assert len(customers) == 4
+    assert list(customers) == ["cus_a", "cus_bb", "cus_ccc", "cus_d"]
+    assert [customers.type_at(i) for i in range(4)] == ["normal", "failing", "normal", "failing"]
+    assert customers.id_at(2) == "cus_ccc"
+    assert customers.failing_count == 2
+    assert [customers.failing_id_at(i) for i in range(2)] == ["cus_bb", "cus_d"]
+    assert list(customers.items()) == [("cus_a", "normal"), ("cus_bb", "failing"), ("cus_ccc", "normal"), ("cus_d", "failing")]
+
+
+def test_memory_size_is_compact():
+    customers = CustomerRegistry({"id": f"cus_{i:014d}", "type": "normal"} for i in range(1000))
+    # 18 bytes of ID, 8 of offset and 1 of type per customer
+    assert customers.memory_size() == 1000 * 27 + 8
+
+
+def test_prefix_keeps_reachable_customers_at_their_indexes():
+    customers = CustomerRegistry()
+    for customer_id, customer_type in [
+        ("c0", "normal"), ("f0", "failing"), ("c1", "normal"), ("c2", "normal"), ("f1", "failing"), ("f2", "failing"),
+    ]:
+        customers.add(customer_id, customer_type)
+    
+    prefix = customers.prefix(3, 2)
+    assert list(prefix.items()) == [("c0", "normal"), ("f0", "failing"), ("c1", "normal"), ("f1", "failing")]
+    for index in range(3):
+        assert prefix.id_at(index) == customers.id_at(index)
+    for index in range(2):
+        assert prefix.failing_id_at(index) == customers.failing_id_at(index)
+    
+    assert list(customers.prefix(10, 10).items()) == list(customers.items())
+    assert len(customers.prefix(0, 0)) == 0
@@ -0,0 +1,92 @@
+import asyncio
+import gzip
+from types import SimpleNamespace
+
+from stripe_populator.config import RUN_METADATA_KEY, TEST_CLOCKS
+from stripe_populator.journal import RunJournal
+from stripe_populator.manifest import Manifest, read_manifest
+from stripe_populator.plan import Plan
+from stripe_populator.replay import replay_async, translate
+from stripe_populator.runner import populate_async
+
+
+def test_read_manifest_keeps_each_request_once(tmp_path):
+    path = str(tmp_path / "run.manifest.jsonl.gz")
+    manifest = Manifest(path, "run-1", 1700000000.5)
+    product = SimpleNamespace(id="prod_1", default_price="price_1")
+    manifest.record("Product.create", (), {"params": {"name": "Basic"}}, product)
+    manifest.record("Customer.retrieve", ("cus_1",), {}, SimpleNamespace(id="cus_1"))
+    manifest.close()
+    
+    # A resumed run appends to the same manifest and may send a request again
+    resumed = Manifest(path, "run-1", 1700000000.5)
+    resumed.record("Product.create", (), {"params": {"name": "Basic"}}, product)
+    resumed.record("Subscription.cancel", ("sub_1",), {}, SimpleNamespace(id="sub_1"))
+    resumed.close()
+    
+    header, records = read_manifest(path)
+    assert (header["run_id"], header["started_at"]) == ("run-1", 1700000000.5)
+    assert records == [
+        {"endpoint": "Product.create", "target": None, "params": {"name": "Basic"}, "id": "prod_1", "related": ["price_1"]},
+        {"endpoint": "Subscription.cancel", "target": "sub_1", "params": {}, "id": "sub_1"},
+    ]
+
+
+def test_read_manifest_of_a_run_that_died(tmp_path):
+    path = str(tmp_path / "run.manifest.jsonl.gz")
+    manifest = Manifest(path, "run-1", 1700000000)
+    manifest.record("Customer.create", (), {"params": {}}, SimpleNamespace(id="cus_1"))
+    manifest.close()
+    with gzip.open(path, "at", encoding="utf-8") as manifest_file:
+        manifest_file.write('{"endpoint": "Customer.create", "tar')
+    
+    _, records = read_manifest(path)
+    assert [record["id"] for record in records] == ["cus_1"]
+
+
+def test_translate():
+    request = {
+        "customer": "cus_old",
+        "items": [{"price": "price_old"}, {"price": "price_existing"}],
+        "trial_end": 1000,
+        "quantity": 1000,
+        "metadata": {RUN_METADATA_KEY: "run-old"},
+        "description": "Customer of run-old",
+    }
+    assert translate(request, {"cus_old": "cus_new", "price_old": "price_new"}, "run-old", "run-new", 50) == {
+        "customer": "cus_new",
+        "items": [{"price": "price_new"}, {"price": "price_existing"}],
+        "trial_end": 1050,
+        "quantity": 1000,
+        "metadata": {RUN_METADATA_KEY: "run-new"},
+        "description": "Customer of run-new",
+    }
+
+
+def test_replay_rebuilds_the_dataset_in_another_account(fake_stripe, monkeypatch):
+    monkeypatch.setitem(TEST_CLOCKS, "poll_interval", 0.01)
+    source = fake_stripe(clock_advance_seconds=0.05)
+    target = fake_stripe(clock_advance_seconds=0.05)
+    plan = Plan(products=2, customers=7, subscriptions=7, history_months=2, seed=1)
+    original = asyncio.run(populate_async(plan, source.client(), cache_path=None))
+    
+    result = asyncio.run(replay_async(target.client(), original["manifest"]))
+    assert result["failed"] == {}
+    _, records = read_manifest(original["manifest"])
+    assert sum(result["replayed"].values()) == len(records)
+    
+    # Every object refers to the replayed copies of the others
+    customers = target.list("customers", {"limit": 100})["data"]
+    clock_ids = {clock["id"] for clock in target.list("test_clocks", {"limit": 100})["data"]}
+    assert {customer["test_clock"] for customer in customers} == clock_ids
+    assert {customer["metadata"][RUN_METADATA_KEY] for customer in customers} == {result["run_id"]}
+    subscriptions = target.list("subscriptions", {"limit": 100, "status": "all"})["data"]
+    assert {subscription["customer"] for subscription in subscriptions} <= {customer["id"] for customer in customers}
+    assert set(result["id_map"].values()) >= {customer["id"] for customer in customers} | clock_ids
+    
+    # Shifted clock times line up with the replay's start, so each clock
+    # takes as many steps as in the original run
+    started_at = int(RunJournal.load(result["run_id"]).started_at)
+    clocks = target.list("test_clocks", {"limit": 100})["data"]
+    assert {clock["frozen_time"] for clock in clocks} == {started_at}
+    assert target.counts["POST test_clocks/advance"] == source.counts["POST test_clocks/advance"] == 6
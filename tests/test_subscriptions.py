@@ -0,0 +1,45 @@
+import asyncio
+from types import SimpleNamespace
+
+from stripe_populator.compiler import count_statuses
+from stripe_populator.engine import Session
+from stripe_populator.journal import RunJournal
+from stripe_populator.plan import Plan
+from stripe_populator.runner import populate_async
+from stripe_populator.subscriptions import audit_subscriptions, observed_status
+
+
+def subscription(status, **fields):
+    return SimpleNamespace(object="subscription", status=status, **fields)
+
+
+def test_observed_status():
+    assert observed_status(subscription("active")) == "active"
+    assert observed_status(subscription("active", pause_collection={"behavior": "keep_as_draft"}, cancel_at=None)) == "paused"
+    assert observed_status(subscription("active", pause_collection=None, cancel_at=1900000000)) == "active_with_end"
+    assert observed_status(subscription("trialing", cancel_at=1900000000)) == "trialing"
+    assert observed_status(SimpleNamespace(object="subscription_schedule", status="not_started")) == "scheduled"
+    assert observed_status(SimpleNamespace(object="subscription_schedule", status="released")) == "schedule_released"
+
+
+def test_audit_counts_what_each_run_created(fake_stripe):
+    fake = fake_stripe()
+    plan = Plan(products=3, customers=10, subscriptions=50, seed=1)
+    first = asyncio.run(populate_async(plan, fake.client(), cache_path=None))
+    
+    # Every status is set by the create request, or a second one, except
+    # that without a billing history past_due and unpaid subscriptions are
+    # created incomplete, which the audit reports as unexpected
+    expected = {status: count for status, count in count_statuses(plan).items() if count}
+    expected["incomplete"] = expected.pop("past_due") + expected.pop("unpaid")
+    assert first["audit"] == expected
+    
+    # Another run's subscriptions aren't counted
+    second = asyncio.run(populate_async(Plan(products=1, customers=2, subscriptions=10, seed=2), fake.client(), cache_path=None))
+    assert sum(second["audit"].values()) == 10
+    
+    async def audit_first():
+        journal = RunJournal.load(first["run_id"])
+        return await audit_subscriptions(Session(fake.client()), journal, first["subscriptions"], int(journal.started_at))
+    
+    assert asyncio.run(audit_first()) == expected
@@ -0,0 +1,43 @@
+import asyncio
+from collections import Counter
+
+from stripe_populator.config import RUN_METADATA_KEY, TEST_CLOCKS
+from stripe_populator.journal import RunJournal
+from stripe_populator.plan import Plan
+from stripe_populator.runner import populate_async
+from stripe_populator.test_clocks import clock_name, clock_run_id
+
+
+def test_clock_run_id_reads_clock_name():
+    run_id = "20260101-120000-abc123"
+    assert clock_run_id(clock_name(run_id, 0)) == run_id
+    assert clock_run_id(clock_name(run_id, 41)) == run_id
+
+
+def test_clock_run_id_ignores_other_clocks():
+    assert clock_run_id(None) is None
+    assert clock_run_id("") is None
+    assert clock_run_id("My test clock") is None
+    assert clock_run_id(f"{RUN_METADATA_KEY} 20260101-120000-abc123") is None
+    assert clock_run_id("other 20260101-120000-abc123 #1") is None
+
+
+def test_history_ends_when_the_run_started(fake_stripe, monkeypatch):
+    monkeypatch.setitem(TEST_CLOCKS, "poll_interval", 0.01)
+    fake = fake_stripe(clock_advance_seconds=0.05)
+    plan = Plan(customers=7, subscriptions=7, history_months=2, seed=1)
+    result = asyncio.run(populate_async(plan, fake.client(), cache_path=None))
+    started_at = int(RunJournal.load(result["run_id"]).started_at)
+    
+    clocks = fake.list("test_clocks", {"limit": 100})["data"]
+    assert len(clocks) == 3
+    assert {clock["frozen_time"] for clock in clocks} == {started_at}
+    assert {clock_run_id(clock["name"]) for clock in clocks} == {result["run_id"]}
+    # Two steps of 30 days each
+    assert fake.counts["POST test_clocks/advance"] == 6
+    
+    # New customers fill the clocks in order, and only they get subscriptions
+    customers = fake.list("customers", {"limit": 100})["data"]
+    assert sorted(Counter(customer["test_clock"] for customer in customers).values()) == [1, 3, 3]
+    subscribed = {subscription["customer"] for subscription in fake.list("subscriptions", {"limit": 100, "status": "all"})["data"]}
+    assert subscribed <= {customer["id"] for customer in customers}